@@ -4,6 +4,8 @@ Feel free to add to this file.  If a function is so specific that only one bot
 will use it, however, then it doesn't belong here."""
 
 from hanabi_classes import *
+import itertools as _itertools
+import random
 
 def names(cards):
     """Returns the names of a list of cards"""
@@ -200,6 +202,255 @@ def inverse_card_set(cardset, r):
                 inverse_set.append(newCard)
     return inverse_set
 
+def get_card_identities(r):
+    """All different card names of the game, in the order of the deck"""
+    numbers = sorted(set(SUIT_CONTENTS))
+    return [number + suit for suit in r.suits for number in numbers]
+
+def get_unseen_card_counts(player, r):
+    """Returns a dict with the number of copies of every card name that player
+    can't see (see get_all_knowable_cards)"""
+    counts = {name : SUIT_CONTENTS.count(name[0])
+              for name in get_card_identities(r)}
+    for name in get_all_knowable_cards(player, r):
+        counts[name] = max(counts[name] - 1, 0)
+    return counts
+
+def get_possibility_mask(card, identities):
+    """Returns an int with bit i set if the hints on card allow it to be
+    identities[i]"""
+    mask = 0
+    for i, name in enumerate(identities):
+        if (all(matches(name, hint) for hint in card['direct']) and not
+            any(matches(name, hint) for hint in card['indirect'])):
+            mask |= 1 << i
+    return mask
+
+# Results of _copy_probabilities, keyed by canonical state
+_hand_marginals_cache = {}
+HAND_MARGINALS_CACHE_SIZE = 100000
+
+def hand_marginals(counts, masks):
+    """Exact probability that each of a number of hidden cards is each
+    identity.  counts[j] is the number of unseen copies of identity j, and
+    bit j of masks[i] is set if card i can be identity j.  Every way to deal
+    the hidden cards from the unseen copies is equally likely, so scarce
+    cards (say a critical 5 that only fits in one slot) are not counted
+    twice, as they would be if every card was looked at on its own.
+    Returns a list with one list of probabilities per card (all 0 if no deal
+    fits the masks).
+
+    Cards with the same mask are interchangeable, and so are identities that
+    fit the same cards, so the work is memoized on the size of every group
+    of cards and the number of copies of every group of identities."""
+    groups, sizes, fits, classes = _group_hand(counts, masks)
+    key = (sizes, classes)
+    if key not in _hand_marginals_cache:
+        if len(_hand_marginals_cache) >= HAND_MARGINALS_CACHE_SIZE:
+            _hand_marginals_cache.clear()
+        _hand_marginals_cache[key] = _copy_probabilities(*key)
+    probability = _hand_marginals_cache[key]
+
+    marginals = []
+    for mask in masks:
+        g = groups.index(mask)
+        marginals.append([counts[j] * probability.get((g, fits[j]), 0.)
+                          if fits[j] >> g & 1 else 0.
+                          for j in range(len(counts))])
+    return marginals
+
+def _group_hand(counts, masks):
+    """The canonical state of hidden cards with the given masks (see
+    hand_marginals): the different masks (groups), the number of cards with
+    each of them, a bitmask per identity of the groups it fits, and the
+    classes (bitmask of groups, number of copies) of the identities that fit
+    some group."""
+    groups = sorted(set(masks))
+    sizes = tuple(masks.count(mask) for mask in groups)
+    fits = [sum(1 << g for g, mask in enumerate(groups) if mask >> j & 1)
+            for j in range(len(counts))]
+    copies = {}
+    for j, count in enumerate(counts):
+        if count > 0 and fits[j]:
+            copies[fits[j]] = copies.get(fits[j], 0) + count
+    return groups, sizes, fits, tuple(sorted(copies.items()))
+
+def _deals(sizes, classes, c, filled):
+    """All ways to give copies of class c to free cards, when filled[g]
+    cards of every group g are taken.  Yields the cards taken afterwards, the
+    number of cards per group that get a copy, and the number of ways to do
+    so: k of the f free cards of a group can be picked in C(f, k) ways, and
+    K picked cards get copies in copies! / (copies - K)! ways."""
+    allowed, copies = classes[c]
+    options = [range(min(sizes[g] - filled[g], copies) + 1)
+               if allowed >> g & 1 else [0] for g in range(len(sizes))]
+    for given in _itertools.product(*options):
+        picked = sum(given)
+        if picked > copies:
+            continue
+        ways = 1
+        for copy in range(picked):
+            ways *= copies - copy
+        for f, k, size in zip(filled, given, sizes):
+            ways *= binomial(size - f, k)
+        yield tuple(f + k for f, k in zip(filled, given)), given, ways
+
+def _deal_tables(sizes, classes):
+    """Counts the deals class by class.  forward[c][filled] is the number of
+    ways to take that many cards of every group with the classes before c,
+    and backward[c][filled] the number of ways to fill the other cards with
+    class c and the ones after it."""
+    forward = [{tuple(0 for size in sizes) : 1}]
+    for c in range(len(classes)):
+        step = {}
+        for filled, ways in forward[c].items():
+            for after, given, more in _deals(sizes, classes, c, filled):
+                step[after] = step.get(after, 0) + ways * more
+        forward.append(step)
+    backward = [None] * len(classes) + [{sizes : 1}]
+    for c in reversed(range(len(classes))):
+        step = {}
+        for filled in forward[c]:
+            total = 0
+            for after, given, more in _deals(sizes, classes, c, filled):
+                total += more * backward[c + 1].get(after, 0)
+            if total:
+                step[filled] = total
+        backward[c] = step
+    return forward, backward
+
+def _copy_probabilities(sizes, classes):
+    """For hand_marginals: the probability that a given card of group g is a
+    given copy of a class (the identities that fit the groups in the bitmask
+    allowed), as a dict keyed by (g, allowed).  Counting the deals forward
+    and backward gives the expected number of cards of every group that get
+    a copy of every class, which is spread evenly over the cards of the
+    group and the copies."""
+    forward, backward = _deal_tables(sizes, classes)
+    total = backward[0].get(tuple(0 for size in sizes), 0)
+    probability = {}
+    if total == 0:
+        return probability
+    for c, (allowed, copies) in enumerate(classes):
+        expected = [0] * len(sizes)
+        for filled, ways in forward[c].items():
+            for after, given, more in _deals(sizes, classes, c, filled):
+                rest = backward[c + 1].get(after, 0)
+                for g, k in enumerate(given):
+                    expected[g] += k * ways * more * rest
+        for g in range(len(sizes)):
+            if allowed >> g & 1:
+                probability[g, allowed] = (float(expected[g]) /
+                                           (total * sizes[g] * copies))
+    return probability
+
+def binomial(n, k):
+    """n choose k"""
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+def get_hand_marginals(player, r):
+    """Returns one dict per card in the hand of player, with the exact
+    probability of every card name it can be (see hand_marginals).  Only the
+    hints on the hand of player are used, so this is safe under policing."""
+    identities = get_card_identities(r)
+    counts = get_unseen_card_counts(player, r)
+    cards = r.h[player].cards
+    hidden = [i for i, card in enumerate(cards) if not card['known']]
+    marginals = hand_marginals([counts[name] for name in identities],
+                               [get_possibility_mask(cards[i], identities)
+                                for i in hidden])
+    result = [{card['name'] : 1.0} if card['known'] else None
+              for card in cards]
+    for i, row in zip(hidden, marginals):
+        result[i] = {name : p for name, p in zip(identities, row) if p > 0}
+    return result
+
+class HandSampler(object):
+    """Draws hands of player that fit everything player knows (the hints on
+    its hand and the cards it can see), every deal of the unseen copies being
+    equally likely.  The counting is done once (see hand_marginals), so
+    drawing is cheap.  Only the hints on the hand of player are used, so this
+    is safe under policing.
+
+    rng (random.Random): Source of the draws (the random module if None).
+    """
+    def __init__(self, player, r, rng=None):
+        super(HandSampler, self).__init__()
+        self.rng = random if rng is None else rng
+        identities = get_card_identities(r)
+        unseen = get_unseen_card_counts(player, r)
+        counts = [unseen[name] for name in identities]
+        cards = r.h[player].cards
+        self.known = [card['name'] if card['known'] else None
+                      for card in cards]
+        hidden = [i for i, card in enumerate(cards) if not card['known']]
+        masks = [get_possibility_mask(cards[i], identities) for i in hidden]
+        groups, self.sizes, fits, self.classes = _group_hand(counts, masks)
+
+        # The positions of the cards of every group, the copies of every
+        # class and the copies that don't fit any card
+        self.members = [[i for i, mask in zip(hidden, masks) if mask == group]
+                        for group in groups]
+        self.copies = {allowed : [] for allowed, n in self.classes}
+        self.unused = []
+        for j, name in enumerate(identities):
+            if fits[j]:
+                self.copies[fits[j]].extend([name] * counts[j])
+            else:
+                self.unused.extend([name] * counts[j])
+
+        forward, self.backward = _deal_tables(self.sizes, self.classes)
+        self.empty = tuple(0 for size in self.sizes)
+        if self.backward[0].get(self.empty, 0) == 0:
+            raise ValueError('no hand of player ' + str(player) +
+                             ' fits the hints')
+        # (class, cards taken) -> the choices and the deals they allow
+        self.choices = {}
+
+    def count(self):
+        """The number of different deals of the hidden cards"""
+        return self.backward[0][self.empty]
+
+    def sample(self):
+        """Returns (hand, deck): the names of the cards in the hand of player
+        (in order) and the names of the other unseen cards in random order, so
+        they can be dealt into a copy of the round"""
+        hand = list(self.known)
+        deck = list(self.unused)
+        free = [list(members) for members in self.members]
+        filled = self.empty
+        for c, (allowed, n) in enumerate(self.classes):
+            if (c, filled) not in self.choices:
+                self.choices[c, filled] = [
+                    (after, given, more * self.backward[c + 1][after])
+                    for after, given, more
+                    in _deals(self.sizes, self.classes, c, filled)
+                    if after in self.backward[c + 1]]
+            # Pick the number of cards of every group with the number of
+            # deals it allows
+            pick = self.rng.randrange(self.backward[c][filled])
+            for after, given, ways in self.choices[c, filled]:
+                if pick < ways:
+                    break
+                pick -= ways
+            filled = after
+            # Then which cards, and which copies in which order
+            positions = []
+            for g, k in enumerate(given):
+                chosen = self.rng.sample(free[g], k)
+                free[g] = [i for i in free[g] if i not in chosen]
+                positions.extend(chosen)
+            copies = list(self.copies[allowed])
+            self.rng.shuffle(copies)
+            for i, name in zip(positions, copies):
+                hand[i] = name
+            deck.extend(copies[len(positions):])
+        self.rng.shuffle(deck)
+        return hand, deck
+
 def is_critical(cardname, r):
     """Tests whether card is not played and there is no other non-discarded card with the same name
     Does not check whether all copies of a lower rank are already discarded"""
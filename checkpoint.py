@@ -0,0 +1,47 @@
+"""Checkpoints of long runs of the wrapper, so that a run that was stopped
+can go on where it stopped (see hanabi_wrapper.py -k and --resume).
+
+A checkpoint is a pickled dict with everything the rest of the run depends
+on: the next round, the scores and statistics so far, the state of the
+random module and the state of the players (which may keep statistics over
+rounds).  It is written to a temporary file which then replaces the old
+checkpoint, so an interrupted write leaves the old checkpoint in place.
+"""
+
+import os, pickle, random
+
+# Seconds between checkpoints
+CHECKPOINT_SECONDS = 60
+
+def player_state(player):
+    """What player keeps between rounds (its attributes without the
+    logger, which is set up again by the wrapper)"""
+    state = dict(player.__dict__)
+    state.pop('logger', None)
+    return state
+
+def save(path, state, players):
+    """Write the dict state, the state of the random module and the state of
+    players to the checkpoint at path, atomically"""
+    state = dict(state)
+    state['random'] = random.getstate()
+    state['players'] = [player_state(player) for player in players]
+    tmpPath = path + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        pickle.dump(state, f, 2) # Protocol 2 can be read by Python 2 and 3
+        f.flush()
+        os.fsync(f.fileno())
+    if hasattr(os, 'replace'):
+        os.replace(tmpPath, path)
+    else: # Python 2 (atomic on POSIX only)
+        os.rename(tmpPath, path)
+
+def load(path, players):
+    """The dict saved at path, after restoring the random module and
+    players from it"""
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    random.setstate(state['random'])
+    for player, saved in zip(players, state['players']):
+        player.__dict__.update(saved)
+    return state
@@ -0,0 +1,56 @@
+"""Counters and histograms that players keep about their own play, e.g. how
+often the hat player gave a blocked clue.  Printed as "debug info" at the
+end of a run of the wrapper.
+
+Every round gets the Counters of its run in r.counters.  Runs on several
+processes keep one Counters per process and merge them at the end.  When a
+Counters is disabled, add and observe return at once, so players can count
+in hot paths (players with a lot to count can also check r.counters.enabled
+once).
+"""
+
+class Counters(object):
+    """Named counters (int) and histograms (value -> number of times it was
+    observed), in two separate name spaces.
+
+    enabled (bool): False to ignore everything that is added.
+    counts (dict): Name -> count.
+    histograms (dict): Name -> dict of value -> count.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.counts = {}
+        self.histograms = {}
+
+    def add(self, name, n=1):
+        """Add n to the counter name"""
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def observe(self, name, value, n=1):
+        """Count n observations of value (hashable, e.g. an int or a
+        bucket) in the histogram name"""
+        if self.enabled:
+            histogram = self.histograms.setdefault(name, {})
+            histogram[value] = histogram.get(value, 0) + n
+
+    def merge(self, other):
+        """Add the counters and histograms of other (e.g. those of another
+        process) to these"""
+        for name, count in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        for name, histogram in other.histograms.items():
+            mine = self.histograms.setdefault(name, {})
+            for value, count in histogram.items():
+                mine[value] = mine.get(value, 0) + count
+        return self
+
+    def summary(self):
+        """Dict of every counter that is not 0 and every histogram (as a
+        sorted list of (value, count) pairs)"""
+        info = dict((name, count) for name, count in self.counts.items()
+                    if count)
+        for name, histogram in self.histograms.items():
+            info[name] = sorted(histogram.items())
+        return info
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""Stratified sampling of decks, to compare AIs with fewer rounds.
+
+Most of the spread of the scores of an AI comes from the decks, not from the
+AI.  A stratum index splits a corpus of decks into strata by a cheap proxy of
+how hard each deck is (the score the cheater gets on it).  The wrapper can
+then play a number of rounds from every stratum in proportion to its size
+(hanabi_wrapper.py -d), and estimate the mean score and the win rate within
+every stratum, so that the spread between strata no longer counts.
+
+An index is a JSON file:
+  {"game_type": ..., "n_players": ..., "proxy": "cheater",
+   "strata": [{"proxy": [scores of the proxy in this stratum],
+               "decks": ["1r 2g ...", ...]}, ...]}
+
+Usage (to build an index):
+    ./deck_strata.py index.json [-n n_decks] [-p n_players] [-t game_type]
+                     [-a proxy] [-i decks.jsonl] [-m min_size] [-s seed]
+  Without -i, n_decks random decks are dealt.  With -i, the decks are read
+  from a file with one JSON object with a "deck" per line (as written by
+  test/label_decks.py -o).
+"""
+
+import json, logging, random
+from math import sqrt
+from hanabi_classes import *
+from play_hanabi import play_until_end, final_score
+
+def build_index(decks, proxyScores, minSize):
+    """Stratum index of decks (lists of card names) by proxyScores (one per
+    deck).  Decks with the same proxy score share a stratum, and strata with
+    fewer than minSize decks are merged into the next lower one (the last
+    into the one above it)."""
+    byScore = {}
+    for deck, score in zip(decks, proxyScores):
+        byScore.setdefault(score, []).append(' '.join(deck))
+    strata = []
+    for score in sorted(byScore, reverse=True):
+        if strata and len(strata[-1]['decks']) < minSize:
+            stratum = strata[-1]
+        else:
+            stratum = {'proxy': [], 'decks': []}
+            strata.append(stratum)
+        stratum['proxy'].append(score)
+        stratum['decks'].extend(byScore[score])
+    if len(strata) > 1 and len(strata[-1]['decks']) < minSize:
+        last = strata.pop()
+        strata[-1]['proxy'].extend(last['proxy'])
+        strata[-1]['decks'].extend(last['decks'])
+    return strata
+
+def proxy_score(gameType, nPlayers, proxy, deck=None):
+    """Score (lossScore 'full') of nPlayers proxy AIs on deck (a random one
+    if None), and the deck"""
+    logger = logging.getLogger('game_log')
+    players = [proxy(i, logger, 'silent') for i in range(nPlayers)]
+    names = [proxy.get_name() + str(i + 1) for i in range(nPlayers)]
+    r = Round(gameType, players, names, 'silent', False, {})
+    r.generate_deck_and_deal_hands(deck)
+    play_until_end(r, players)
+    return final_score(r, 'full'), r.startingDeck
+
+def load_index(path):
+    with open(path) as f:
+        return json.load(f)
+
+def allocate(index, n):
+    """How many of n rounds to play from every stratum: in proportion to
+    its size, rounded so that the counts add up to n"""
+    sizes = [len(stratum['decks']) for stratum in index['strata']]
+    total = float(sum(sizes))
+    shares = [n * size / total for size in sizes]
+    counts = [int(share) for share in shares]
+    byRemainder = sorted(range(len(sizes)),
+                         key=lambda h: counts[h] - shares[h])
+    for h in byRemainder[:n - sum(counts)]:
+        counts[h] += 1
+    return counts
+
+def sample_decks(index, n, rng):
+    """n (stratum, deck) pairs to play, allocated to the strata by allocate
+    and drawn without replacement within every stratum (as long as it has
+    decks left), in random order.  rng is a random.Random."""
+    plan = []
+    for h, count in enumerate(allocate(index, n)):
+        decks = index['strata'][h]['decks']
+        for i in range(count):
+            if i % len(decks) == 0:
+                order = rng.sample(range(len(decks)), len(decks))
+            plan.append((h, decks[order[i % len(decks)]].split()))
+    rng.shuffle(plan)
+    return plan
+
+def stratified_mean(index, strata, values):
+    """Stratified estimate of the mean of values (one per round, with the
+    stratum of every round in strata) and its standard error.  Strata are
+    weighted by their share of the corpus; strata without rounds are left
+    out and the weights of the others scaled up.  Strata with one round use
+    the variance of all rounds."""
+    rounds = {}
+    for h, value in zip(strata, values):
+        rounds.setdefault(h, []).append(value)
+    sizes = dict((h, len(index['strata'][h]['decks'])) for h in rounds)
+    total = float(sum(sizes.values()))
+    overall = _variance(values)
+    mean = var = 0.
+    for h, group in rounds.items():
+        weight = sizes[h] / total
+        groupVar = _variance(group) if len(group) > 1 else overall
+        mean += weight * sum(group) / float(len(group))
+        var += weight ** 2 * groupVar / len(group)
+    return mean, sqrt(var)
+
+def _variance(values):
+    """Sample variance (0 for fewer than two values)"""
+    n = len(values)
+    if n < 2:
+        return 0.
+    m = sum(values) / float(n)
+    return sum((x - m) ** 2 for x in values) / (n - 1)
+
+
+if __name__ == '__main__':
+    import argparse
+    from players import *
+
+    parser = argparse.ArgumentParser(description='Build a deck stratum index.')
+    parser.add_argument('index', type=str, help='file to write the index to')
+    parser.add_argument('-n', '--n_decks', default=10000, type=int,
+        help='random decks to deal (without -i)')
+    parser.add_argument('-p', '--n_players', default=4, type=int)
+    parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+        help='rainbow, purple, or vanilla')
+    parser.add_argument('-a', '--proxy', default='cheater', type=str,
+        help='AI whose score on a deck is the proxy of its difficulty')
+    parser.add_argument('-i', '--input', default=None, type=str,
+        help='file with the decks, one JSON object with a "deck" per line')
+    parser.add_argument('-m', '--min_size', default=None, type=int,
+        help='fewest decks in a stratum [default: 1%% of the decks]')
+    parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+    args = parser.parse_args()
+    assert args.game_type in ('rainbow', 'purple', 'vanilla')
+
+    logging.getLogger('game_log').addHandler(logging.NullHandler())
+    proxy, = [c for c in AIPlayer.__subclasses__()
+              if c.get_name() == args.proxy]
+    decks = None
+    if args.input:
+        with open(args.input) as f:
+            decks = [json.loads(line)['deck'].split() for line in f
+                     if line.strip()]
+        args.n_decks = len(decks)
+
+    corpus = []
+    scores = []
+    for i in range(args.n_decks):
+        random.seed('{}-{}'.format(args.seed, i))
+        score, deck = proxy_score(args.game_type, args.n_players, proxy,
+                                  decks[i] if decks else None)
+        corpus.append(deck)
+        scores.append(score)
+    minSize = args.min_size or max(1, args.n_decks // 100)
+    index = {'game_type': args.game_type, 'n_players': args.n_players,
+             'proxy': args.proxy,
+             'strata': build_index(corpus, scores, minSize)}
+    with open(args.index, 'w') as f:
+        json.dump(index, f)
+    for stratum in index['strata']:
+        print('proxy {}: {} decks'.format(
+            ','.join(str(score) for score in stratum['proxy']),
+            len(stratum['decks'])))
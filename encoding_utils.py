@@ -0,0 +1,192 @@
+"""Hint codes shared by the encoding players (encoder and gencoder).
+
+A hint code tells the players how to turn the cards in the other hands into a
+number, which the hinting player then conveys with the hint it gives.  A code
+consists of several parts.  Every part picks one card in each of a number of
+hands, maps the number (or suit) of each of these cards to the index of the
+group containing it, and sums these indices modulo the number of groups.  The
+results of all parts together are the digits of a number in a mixed base
+(the first part is the most significant digit).
+
+The classes in this file are hashable and precompute the lookups needed to
+encode and decode, so a code never has to be parsed again after it is made.
+Their string form is only meant for printing.
+
+The combinatorics tables used by these players only depend on the number of
+players and cards per hand; ColumnCombinations builds each one once per
+process (and optionally keeps it in COMBINATORICS_DIR as a .npy file).
+SetPartitions is cached the same way."""
+
+import os
+import numpy as np
+
+# If not None, directory in which the combinatorics tables are saved, so they
+# are loaded instead of being built again by other processes
+COMBINATORICS_DIR = None
+
+# (nPlayers, nCards) -> array of column combinations
+_column_combinations = {}
+
+# n -> list of the partitions of range(n)
+_set_partitions = {}
+
+def MixedRadixIndex(Digits, Bases):
+    """The position of Digits in itertools.product(*[range(b) for b in Bases])"""
+    Index = 0
+    for digit, base in zip(Digits, Bases):
+        Index = Index * base + int(digit)
+    return Index
+
+def MixedRadixDigits(Index, Bases):
+    """The element at position Index of
+    itertools.product(*[range(b) for b in Bases]), as a tuple"""
+    Digits = []
+    for base in reversed(Bases):
+        Digits.append(Index % base)
+        Index //= base
+    return tuple(reversed(Digits))
+
+def ColumnCombinations(nPlayers, nCards):
+    """Every way to pick one column in each of the nPlayers - 1 hands of the
+    other players, as an array with one row per combination.  The rows are in
+    the order of itertools.product(range(nCards), repeat=nPlayers-1).  The
+    array is shared, so it is read only."""
+    key = (nPlayers, nCards)
+    if key in _column_combinations:
+        return _column_combinations[key]
+    path = None
+    if COMBINATORICS_DIR is not None:
+        path = os.path.join(COMBINATORICS_DIR, 'columns_' + str(nPlayers) +
+                            '_' + str(nCards) + '.npy')
+    if path is not None and os.path.exists(path):
+        table = np.load(path)
+    else:
+        Powers = nCards ** np.arange(nPlayers - 2, -1, -1)
+        table = (np.arange(nCards ** (nPlayers - 1))[:, None] // Powers) % nCards
+        if path is not None:
+            np.save(path, table)
+    table.flags.writeable = False
+    _column_combinations[key] = table
+    return table
+
+def SetPartitions(n):
+    """Every way to split range(n) into nonempty blocks, as a list of lists of
+    tuples (both ordered by their first element).  The list is shared, so it
+    must not be changed."""
+    if n in _set_partitions:
+        return _set_partitions[n]
+    partitions = [[]]
+    for i in range(n):
+        # Add i to one of the blocks or put it in a block of its own
+        extended = []
+        for partition in partitions:
+            for j in range(len(partition)):
+                extended.append(partition[:j] + [partition[j] + (i,)] +
+                                partition[j + 1:])
+            extended.append(partition + [(i,)])
+        partitions = extended
+    _set_partitions[n] = partitions
+    return partitions
+
+class CodePart(object):
+    """One part (digit) of a hint code.
+
+    Type (str): 'N' if the part encodes card numbers, 'S' if it encodes suits.
+    Cards (tuple of tup): (player, column) of every card in the sum.
+    Groups (tuple of tup): The values in every group.  A card contributes the
+      index of the group containing its value to the sum.
+    Base (int): Number of groups; the sum is taken modulo Base.
+    GroupOf (dict): Maps every value to the index of the group containing it.
+    """
+
+    __slots__ = ('Type', 'Cards', 'Groups', 'Base', 'GroupOf')
+
+    def __init__(self, Type, Cards, Groups):
+        self.Type = Type
+        self.Cards = tuple((int(player), int(column))
+                           for player, column in Cards)
+        self.Groups = tuple(tuple(group) for group in Groups)
+        self.Base = len(self.Groups)
+        self.GroupOf = {}
+        for i, group in enumerate(self.Groups):
+            for value in group:
+                self.GroupOf[value] = i
+
+    def key(self):
+        return (self.Type, self.Cards, self.Groups)
+
+    def __eq__(self, other):
+        return isinstance(other, CodePart) and self.key() == other.key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __str__(self):
+        cards = ':'.join(str(player) + ',' + str(column)
+                         for player, column in self.Cards)
+        groups = ','.join('[' + ','.join(str(value) for value in group) + ']'
+                          for group in self.Groups)
+        return self.Type + '_' + cards + '_[' + groups + ']'
+
+    __repr__ = __str__
+
+    def Column(self, player):
+        """Column of the card of player in this part (None if there is none)"""
+        for p, column in self.Cards:
+            if p == player:
+                return column
+        return None
+
+    def Result(self, values):
+        """The digit encoded by cards with the given values (one per card)"""
+        return sum(self.GroupOf[value] for value in values) % self.Base
+
+
+class HintCode(object):
+    """A complete hint code: a tuple of CodeParts.
+
+    Parts (tuple of CodePart)
+    Bases (tuple of int): Base of every part.
+    nValues (int): Number of different values the code can encode.
+    """
+
+    __slots__ = ('Parts', 'Bases', 'nValues')
+
+    def __init__(self, Parts):
+        self.Parts = tuple(Parts)
+        self.Bases = tuple(part.Base for part in self.Parts)
+        self.nValues = int(np.prod(self.Bases))
+
+    def __eq__(self, other):
+        return isinstance(other, HintCode) and self.Parts == other.Parts
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.Parts)
+
+    def __len__(self):
+        return len(self.Parts)
+
+    def __iter__(self):
+        return iter(self.Parts)
+
+    def __getitem__(self, i):
+        return self.Parts[i]
+
+    def __str__(self):
+        return '__'.join(str(part) for part in self.Parts)
+
+    __repr__ = __str__
+
+    def Encode(self, Digits):
+        """The value of the results of all parts (in the mixed base)"""
+        return MixedRadixIndex(Digits, self.Bases)
+
+    def Decode(self, Value):
+        """The results of all parts (as a tuple) encoded by Value"""
+        return MixedRadixDigits(Value, self.Bases)
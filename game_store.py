@@ -0,0 +1,125 @@
+"""Columnar store of the results of single rounds, so that questions about
+many rounds can be answered without playing them again.
+
+A store is a file of fixed width records (see RECORD), one per round, which
+is only ever appended to, and a header next to it (path + '.json') with the
+lineups the records refer to.  load reads the records through a memory map,
+as a NumPy record array, so a query is a mask over its columns:
+
+    games, lineups = load('games.bin')
+    hat = lineups.index(['hat'] * 5)
+    lost = games[(games['lineup'] == hat) &
+                 (games['variant'] == VARIANTS.index('rainbow')) &
+                 (games['score'] < 30) & (games['strikes'] == 2)]
+
+The deck of a record is solver.deck_hash of its starting deck, so rounds
+played with the same deck (and maximum scores in a solver.ScoreCache) can be
+matched up.
+"""
+
+import json, os
+import numpy as np
+
+# Game types, in the order of the variant column
+VARIANTS = ['vanilla', 'purple', 'rainbow']
+
+RECORD = np.dtype([
+    ('game', '<u8'),     # Index of the round in its run
+    ('seed', '<i8'),     # Seed of the run (-1 if there was none)
+    ('deck', '<u8'),     # solver.deck_hash of the starting deck
+    ('lineup', '<u2'),   # Index of the lineup in the header
+    ('variant', 'u1'),   # Index of the game type in VARIANTS
+    ('players', 'u1'),
+    ('score', 'u1'),
+    ('strikes', 'u1'),
+    ('hints', 'u1'),     # Hints left at the end
+    ('deck_out', '?'),   # Whether the deck ran out
+    ('turns', '<u2'),
+    ('seconds', '<f4'),  # Wall time of the round
+])
+
+# Records kept in memory before they are written to the file
+BUFFER_SIZE = 4096
+
+def header_path(path):
+    return path + '.json'
+
+def load_lineups(path):
+    """The lineups (lists of AI names) of the store at path"""
+    if not os.path.exists(header_path(path)):
+        return []
+    with open(header_path(path)) as f:
+        return json.load(f)['lineups']
+
+def load(path):
+    """The records of the store at path (a read only memory mapped record
+    array, see RECORD) and its lineups"""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size < RECORD.itemsize:
+        games = np.zeros(0, dtype=RECORD)
+    else:
+        games = np.memmap(path, dtype=RECORD, mode='r',
+                          shape=(size // RECORD.itemsize,))
+    return games, load_lineups(path)
+
+
+class GameStore(object):
+    """Writer of a store: records are collected in a buffer, and written to
+    the end of the file when it is full, on flush and on close.
+
+    path (str)
+    count (int): Number of records in the store, including the buffer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lineups = load_lineups(path)
+        self.buffer = np.zeros(BUFFER_SIZE, dtype=RECORD)
+        self.buffered = 0
+        self.file = open(path, 'ab')
+        self.count = os.path.getsize(path) // RECORD.itemsize
+
+    def lineup_id(self, lineup):
+        """Index of lineup (list of AI names) in the header, added to it if
+        it isn't there yet"""
+        lineup = list(lineup)
+        if lineup not in self.lineups:
+            self.lineups.append(lineup)
+            tmpPath = header_path(self.path) + '.tmp'
+            with open(tmpPath, 'w') as f:
+                json.dump({'dtype': RECORD.descr, 'lineups': self.lineups}, f)
+            if hasattr(os, 'replace'):
+                os.replace(tmpPath, header_path(self.path))
+            else: # Python 2
+                os.rename(tmpPath, header_path(self.path))
+        return self.lineups.index(lineup)
+
+    def add(self, **fields):
+        """Add the record of a round, with a value for every field of
+        RECORD (lineup as a list of AI names, variant as a game type)"""
+        fields['lineup'] = self.lineup_id(fields['lineup'])
+        fields['variant'] = VARIANTS.index(fields['variant'])
+        self.buffer[self.buffered] = tuple(fields[name]
+                                           for name in RECORD.names)
+        self.buffered += 1
+        self.count += 1
+        if self.buffered == BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write the buffer to the file"""
+        self.file.write(self.buffer[:self.buffered].tobytes())
+        self.file.flush()
+        self.buffered = 0
+
+    def truncate(self, count):
+        """Drop the records after the first count (e.g. those written after
+        a checkpoint)"""
+        self.flush()
+        self.file.truncate(count * RECORD.itemsize)
+        self.file.seek(0, os.SEEK_END)
+        self.count = count
+
+    def close(self):
+        self.flush()
+        self.file.close()
@@ -10,7 +10,8 @@ Common attributes/arguments:
   names (list of str): How players are identified in printed output.
 """
 
-import random, logging, sys
+import random, logging, sys, time
+from counters import Counters
 
 VANILLA_SUITS = 'rygbw'
 SUIT_CONTENTS = '1112233445' # must be ascending
@@ -19,8 +20,33 @@ N_LIGHTNING   = 3
 RAINBOW_SUIT  = '?'
 PURPLE_SUIT   = 'p'
 
+# Seed of the random keys of the Zobrist hashes (see Round.state_hash)
+ZOBRIST_SEED  = 'hanabi-zobrist'
+
+_zobrist_keys = {} # parts -> key
+
+def zobrist_key(*parts):
+    """Random 64-bit key for parts (a tuple of strs and ints).  Every key has
+    its own random.Random seeded from ZOBRIST_SEED and parts, so the keys are
+    the same in every process and the random module is left alone."""
+    key = _zobrist_keys.get(parts)
+    if key is None:
+        key = random.Random(ZOBRIST_SEED + repr(parts)).getrandbits(64)
+        _zobrist_keys[parts] = key
+    return key
+
 class AIPlayer(object):
     """AIPlayer class that should be inherited from when making"""
+
+    # Set to True to get a TurnBudget in r.budget at the start of every turn
+    usesTurnBudget = False
+
+    # Set to False if the player can't take over a round in the middle, e.g.
+    # because it needs what it remembers from the earlier turns of the round,
+    # r.PlayerRecord or the histories (a rollout.Simulation has none of
+    # these), so that it is not used as a rollout policy
+    canPlayMidRound = True
+
     def __init__(self, me, logger, verbosity):
         super(AIPlayer, self).__init__()
         self.logger = logger
@@ -42,6 +68,45 @@ class AIPlayer(object):
         pass
 
 
+class TurnBudget(object):
+    """Time a player may spend on one turn.
+
+    Players that set usesTurnBudget find the budget of their turn in r.budget.
+    The same object stays in r.budgetHistory, so other players can see later
+    how much work was done in that turn.
+
+    seconds (float): Time allowed for the turn, None if there is no limit.
+    start (float): time.time() at the start of the turn.
+    elapsed (float): Time the turn took (set after the player returns).
+    samples (int): Free for the player to record how much work it did (e.g.
+      how many samples it evaluated), so that other players can repeat it.
+    exhausted (bool): True if expired() ever returned True.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = time.time()
+        self.elapsed = None
+        self.samples = None
+        self.exhausted = False
+
+    def remaining(self):
+        """Seconds left in this turn (None if there is no limit)"""
+        if self.seconds is None:
+            return None
+        return self.seconds - (time.time() - self.start)
+
+    def expired(self):
+        """Whether the time for this turn is up"""
+        if self.seconds is not None and self.remaining() <= 0:
+            self.exhausted = True
+        return self.exhausted
+
+    def finish(self):
+        """Record how long the turn took"""
+        self.elapsed = time.time() - self.start
+
+
 class Round(object):
     """Store round info and interact with AI players.
 
@@ -67,9 +132,30 @@ class Round(object):
     cardsLeft (list of str): Cards that not all players have seen yet.
     deck (list of str)
     discardpile: list of (names of) cards which are discarded
+    turnBudget (float): Seconds per turn for players that use a TurnBudget
+      (None for no limit).
+    budget (obj): TurnBudget of the current turn (None if the player does not
+      use one).
+    budgetHistory (list of obj): budget of every turn so far (kept in step
+      with playHistory by apply and undo).
+    debug (dict): Shared by all rounds of a run; holds the notes players
+      write on cards for log.json (see play_hanabi.to_json), and 'stop'.
+    counters (obj): Counters of the run, in which players count what they
+      want to see at the end of it (see counters.py).  A disabled Counters if
+      the round was not given one.
+    publicHash (int): Zobrist hash of the public state: whose turn it is,
+      hints, lightning, progress, the discard pile, and the size of the deck.
+    deckHash (int): Zobrist hash of the order of the deck.
+    nameHashes (list of int): Zobrist hash of the cards in each hand.
+    clueHashes (list of int): Zobrist hash of what each hand was told (which
+      infos each card did and did not match).
+    handsHash (int): All nameHashes and clueHashes together.
+    The hashes are kept up to date by apply and undo (see state_hash and
+    info_hash); changes players make to cards themselves are not tracked.
     """
 
-    def __init__(self, gameType, players, names, verbosity, isPoliced, debug):
+    def __init__(self, gameType, players, names, verbosity, isPoliced, debug,
+                 turnBudget=None, counters=None):
         """Instantiate a Round and its Hand sub-objects."""
         self.gameType  = gameType
         self.suits = VANILLA_SUITS
@@ -97,6 +183,7 @@ class Round(object):
         self.zazz = ['[HANDS]', '[PLAYS]']
         self.isPoliced = isPoliced
         self.debug = debug
+        self.counters = counters if counters is not None else Counters(False)
 
         self.logger = logging.getLogger('game_log')
 
@@ -105,6 +192,9 @@ class Round(object):
         self.DropIndRecord = [] # Keeps track of the index of the dropped card.
         self.Resign = False
         self.discardpile = []
+        self.turnBudget = turnBudget
+        self.budget = None
+        self.budgetHistory = []
 
         # Provides a shared starting seed for fixed-seed pseudo RNG methods.
         self.CommonSeed = random.randint(0,sys.maxsize)
@@ -117,16 +207,22 @@ class Round(object):
             ch.setLevel(logging.INFO)
             self.logger.addHandler(ch)
 
-    def generate_deck_and_deal_hands(self):
-        """Construct a deck, shuffle, and deal."""
-        deck = []
+    def generate_deck_and_deal_hands(self, deck=None):
+        """Construct a deck, shuffle, and deal.  If deck (a list of card
+        names, top card first) is given, it is dealt as it is instead."""
+        cards = []
         for suit in self.suits:
             for number in SUIT_CONTENTS:
-                deck.append(number + suit)
+                cards.append(number + suit)
 
-        self.cardsLeft = deck[:] # Start tracking unplayed cards.
+        self.cardsLeft = cards[:] # Start tracking unplayed cards.
 
-        random.shuffle(deck)
+        if deck is None:
+            deck = cards
+            random.shuffle(deck)
+        else:
+            assert sorted(deck) == sorted(cards) # A full deck of this game
+            deck = list(deck)
         self.deck = deck
         self.startingDeck = deck[:]
         self.startingDeckSize = len(deck)
@@ -140,6 +236,7 @@ class Round(object):
             if self.verbose:
                 self.h[i].show(self.zazz[0], self.logger)
                 self.zazz[0] = ' ' * len(self.zazz[0])
+        self.rehash()
 
     def draw(self):
         """Remove and return the top card of the deck."""
@@ -152,11 +249,73 @@ class Round(object):
         card['position'] = hand.cards.index(card)
         ReplacedIndex = hand.drop(card)
         self.DropIndRecord.append(ReplacedIndex)
+        self.publicHash ^= zobrist_key('discard', card['name'],
+                                       self.discardpile.count(card['name']))
         self.discardpile.append(card['name'])
-        if self.deck != []:
+        drew = self.deck != []
+        if drew:
+            drawn = self.startingDeckSize - len(self.deck)
+            self.deckHash ^= zobrist_key('deck', drawn, self.deck[0])
+            self.publicHash ^= zobrist_key('deckSize', len(self.deck)) ^ \
+                               zobrist_key('deckSize', len(self.deck) - 1)
             hand.add(self.draw(), self.turnNumber, self.startingDeckSize-len(self.deck)-1)
-            return True # There was still a card to draw.
-        return False
+        self.rehash_hand(hand.seat)
+        return drew # Whether there was still a card to draw.
+
+    def rehash(self):
+        """Compute all Zobrist hashes from scratch (after dealing, or after
+        changing the round other than with apply)."""
+        self.publicHash = zobrist_key('turn', self.whoseTurn) ^ \
+                          zobrist_key('hints', self.hints) ^ \
+                          zobrist_key('lightning', self.lightning) ^ \
+                          zobrist_key('deckSize', len(self.deck))
+        for suit in self.suits:
+            self.publicHash ^= zobrist_key('progress', suit,
+                                           self.progress[suit])
+        for name in set(self.discardpile):
+            for copies in range(self.discardpile.count(name)):
+                self.publicHash ^= zobrist_key('discard', name, copies)
+        drawn = self.startingDeckSize - len(self.deck)
+        self.deckHash = 0
+        for i, name in enumerate(self.deck):
+            self.deckHash ^= zobrist_key('deck', drawn + i, name)
+        self.nameHashes = [0] * self.nPlayers
+        self.clueHashes = [0] * self.nPlayers
+        self.handsHash = 0
+        for seat in range(self.nPlayers):
+            self.rehash_hand(seat)
+
+    def rehash_hand(self, seat):
+        """Compute the Zobrist hashes of one hand from scratch (its size is
+        bounded, so this is O(1) too)."""
+        self.handsHash ^= self.nameHashes[seat] ^ self.clueHashes[seat]
+        nameHash = clueHash = 0
+        for slot, card in enumerate(self.h[seat].cards):
+            nameHash ^= zobrist_key('card', seat, slot, card['name'])
+            for info in set(card['direct']):
+                clueHash ^= zobrist_key('clue', seat, slot, True, info)
+            for info in set(card['indirect']):
+                clueHash ^= zobrist_key('clue', seat, slot, False, info)
+        self.nameHashes[seat] = nameHash
+        self.clueHashes[seat] = clueHash
+        self.handsHash ^= nameHash ^ clueHash
+
+    def state_hash(self):
+        """64-bit Zobrist hash of the full state of the round: the public
+        state, every hand (cards and what they were told), the order of the
+        deck and the countdown at the end of the round.  Plays that lead to
+        the same state give the same hash, so it can key transposition tables
+        and caches."""
+        return self.publicHash ^ self.handsHash ^ self.deckHash ^ \
+               zobrist_key('timer', self.gameOverTimer)
+
+    def info_hash(self, seat):
+        """64-bit Zobrist hash of what seat knows: the public state, the
+        other hands and what every hand was told (not the cards in seat's own
+        hand, nor the order of the deck)."""
+        return self.publicHash ^ self.handsHash ^ self.nameHashes[seat] ^ \
+               zobrist_key('timer', self.gameOverTimer) ^ \
+               zobrist_key('seat', seat)
 
     def print_all_knowledge(self):
         for i in range(self.nPlayers):
@@ -179,12 +338,53 @@ class Round(object):
 
         play = playType = playValue = None
         hand = self.h[self.whoseTurn]
+        self.budget = TurnBudget(self.turnBudget) if p.usesTurnBudget else None
         with self.PolicedHand(self.isPoliced, hand):
             play = playType, playValue = p.play(self)
+        if self.budget:
+            self.budget.finish()
+
+        verboseHandAtStart = ' '.join([card['name'] for card in hand.cards])
+        token = self.apply(play)
+
+        if self.verbose:
+            if playType == 'hint':
+                targetPlayer, info = playValue
+                desc = '{} to {}'.format(info, self.h[targetPlayer].name)
+            elif playType == 'resign':
+                desc = ''
+            else:
+                desc = playValue['name']
+                if token['drew']:
+                    desc += ' and draws {}'.format(hand.cards[-1]['name'])
+                if playValue['misplayed']:
+                    desc += ' (DOH!)'
+            self.logger.info(self.zazz[1] + ' {} [{}] {}s {}'\
+                    .format(hand.name, verboseHandAtStart, playType, desc))
+            self.zazz[1] = ' ' * len(self.zazz[1])
+
+    def apply(self, play):
+        """Execute play (see get_play) for whoever's turn it is, and return a
+        token that undo() takes to take it back.
+
+        The countdown at the end of the round (gameOverTimer) is not part of
+        a play; play_hanabi.play_until_end handles it."""
+        playType, playValue = play
+        hand = self.h[self.whoseTurn]
+        token = {'play'      : play,
+                 'hints'     : self.hints,
+                 'lightning' : self.lightning}
         self.playHistory.append(play)
         self.progressHistory.append(dict.copy(self.progress))
+        self.budgetHistory.append(self.budget)
+        changed = playValue[0] if playType == 'hint' else self.whoseTurn
+        token['hashes'] = (self.publicHash, self.deckHash, self.handsHash,
+                           changed, self.nameHashes[changed],
+                           self.clueHashes[changed])
+        self.publicHash ^= zobrist_key('turn', self.whoseTurn) ^ \
+                           zobrist_key('hints', self.hints) ^ \
+                           zobrist_key('lightning', self.lightning)
 
-        verboseHandAtStart = ' '.join([card['name'] for card in hand.cards])
         if playType == 'hint':
             assert self.hints != 0
             targetPlayer, info = playValue
@@ -192,52 +392,121 @@ class Round(object):
             assert info in self.suits or info in SUIT_CONTENTS
             assert info != '?'
             targetHand = self.h[targetPlayer]
-            for card in targetHand.cards:
+            token['matched'] = []
+            clueHash = 0
+            for slot, card in enumerate(targetHand.cards):
                 suit = card['name'][1]
                 if suit == '?' and info in VANILLA_SUITS:
-                    card['direct'].append(info) # Rainbows match any color.
-                elif info in card['name']:
-                    card['direct'].append(info) # Card matches hint.
+                    matched = True # Rainbows match any color.
                 else:
-                    card['indirect'].append(info) # Card does not match hint.
+                    matched = info in card['name'] # Card matches hint.
+                told = card['direct'] if matched else card['indirect']
+                if info not in told:
+                    clueHash ^= zobrist_key('clue', targetPlayer, slot,
+                                            matched, info)
+                told.append(info)
+                token['matched'].append(matched)
+            self.clueHashes[targetPlayer] ^= clueHash
+            self.handsHash ^= clueHash
             self.hints -= 1
-            desc = '{} to {}'.format(info, self.h[targetPlayer].name)
 
         elif playType == 'resign':
             self.Resign = True
-            desc        = ''
 
         else:
             card = playValue
-            assert card in hand
-
-            desc = card['name']
+            dropped = [c for c in hand.cards if hand.card_equals(c, card)]
+            assert dropped
+            token['dropped'] = dropped[0]
+            token['position'] = card['position']
+            token['misplayed'] = card['misplayed']
+            token['cardsLeft'] = None
+            if not card['known']:
+                token['cardsLeft'] = self.cardsLeft.index(card['name'])
 
             if playType == 'discard':
-                if self.replace_card(card, hand):
-                    desc += ' and draws {}'.format(hand.cards[-1]['name'])
+                token['drew'] = self.replace_card(card, hand)
                 self.hints = min(self.hints + 1, N_HINTS)
 
             elif playType == 'play':
                 value, suit = card['name']
-                if self.replace_card(card, hand):
-                    desc += ' and draws {}'.format(hand.cards[-1]['name'])
+                token['drew'] = self.replace_card(card, hand)
+                token['progress'] = self.progress[suit]
                 if self.progress[suit] == int(value) - 1: # Legal play
+                    self.publicHash ^= \
+                        zobrist_key('progress', suit, self.progress[suit]) ^ \
+                        zobrist_key('progress', suit, self.progress[suit] + 1)
                     self.progress[suit] += 1
                     if value == '5':
                         self.hints = min(self.hints + 1, N_HINTS)
                 else: # Illegal play
                     card['misplayed'] = True
                     self.lightning += 1
-                    desc += ' (DOH!)'
 
         self.whoseTurn = (self.whoseTurn + 1) % self.nPlayers
         self.turnNumber += 1
+        self.publicHash ^= zobrist_key('turn', self.whoseTurn) ^ \
+                           zobrist_key('hints', self.hints) ^ \
+                           zobrist_key('lightning', self.lightning)
+        return token
+
+    def undo(self, token):
+        """Take back the last play, given the token apply() returned for it.
+        Plays must be taken back in the reverse order."""
+        playType, playValue = token['play']
+        self.turnNumber -= 1
+        self.whoseTurn = (self.whoseTurn - 1) % self.nPlayers
+        hand = self.h[self.whoseTurn]
 
-        if self.verbose:
-            self.logger.info(self.zazz[1] + ' {} [{}] {}s {}'\
-                    .format(hand.name, verboseHandAtStart, playType, desc))
-            self.zazz[1] = ' ' * len(self.zazz[1])
+        if playType == 'hint':
+            targetPlayer, info = playValue
+            for card, matched in zip(self.h[targetPlayer].cards,
+                                     token['matched']):
+                if matched:
+                    card['direct'].pop()
+                else:
+                    card['indirect'].pop()
+
+        elif playType == 'resign':
+            self.Resign = False
+
+        else:
+            card = playValue
+            if playType == 'play':
+                self.progress[card['name'][1]] = token['progress']
+            if token['drew']:
+                self.deck.insert(0, hand.cards.pop()['name'])
+            hand.cards.insert(self.DropIndRecord.pop(), token['dropped'])
+            self.discardpile.pop()
+            card['position'] = token['position']
+            card['misplayed'] = token['misplayed']
+            if token['cardsLeft'] is not None:
+                self.cardsLeft.insert(token['cardsLeft'], card['name'])
+
+        self.hints = token['hints']
+        self.lightning = token['lightning']
+        (self.publicHash, self.deckHash, self.handsHash, changed,
+         self.nameHashes[changed], self.clueHashes[changed]) = token['hashes']
+        self.playHistory.pop()
+        self.progressHistory.pop()
+        self.budgetHistory.pop()
+
+    def legal_actions(self):
+        """Generate every play the current player may make: play or discard
+        each card, then (if there are hints left) every hint to every other
+        player (in turn order), numbers before suits."""
+        cards = self.h[self.whoseTurn].cards
+        for card in cards:
+            yield 'play', card
+        for card in cards:
+            yield 'discard', card
+        if self.hints != 0:
+            infos = sorted(set(SUIT_CONTENTS)) + \
+                    [suit for suit in self.suits if suit != RAINBOW_SUIT]
+            for i in range(1, self.nPlayers):
+                target = (self.whoseTurn + i) % self.nPlayers
+                for info in infos:
+                    yield 'hint', (target, info)
 
 
     class Hand(object):
@@ -10,15 +10,31 @@ Command-line arguments (see usage):
     'scores', result of each round; 'verbose', play by play; 'log',
     detailed log file for the gamestate at each play)
   loss_score: Whether to award points after a game is lost
+  budget: Seconds per turn for AIs that can use a time budget (gencoder)
+  decks: Stratum index (see deck_strata) to draw the decks of the rounds from
+  cache: File in which the scores of rounds are cached (see result_cache)
+  checkpoint: File to save the progress of the run to every minute, so that
+    it can go on from there with --resume (see checkpoint)
+  games: File to append a record of every round to (see game_store)
+  weights: JSON file with the Weights of the heuristic player, e.g. written
+    by tune_heuristics.py
 """
 
-import sys, argparse, logging, random, os
+import sys, argparse, logging, random, os, time
 from time import gmtime, strftime
 from math import sqrt
 from play_hanabi import play_one_round, player_end_game_logging
+from deck_strata import load_index, sample_decks, stratified_mean
+from counters import Counters
+from solver import deck_hash
+import checkpoint
 from hanabi_classes import SUIT_CONTENTS, AIPlayer
 from players import *
 
+# The module of the heuristic player, if players could load it (it needs
+# NumPy)
+heuristics_player = sys.modules.get('heuristics_player')
+
 availablePlayers = {}
 for playerSubClass in AIPlayer.__subclasses__():
   availablePlayers[playerSubClass.get_name()] = playerSubClass
@@ -44,6 +60,21 @@ parser.set_defaults(police=False)
 parser.add_argument('-o', '--output',
   dest='output', action='store_true', help='Output a JSON file of the game in log.json')
 parser.set_defaults(output=False)
+parser.add_argument('-b', '--budget', default=None, metavar='budget',
+  type=float, help='seconds per turn for AIs that use a time budget')
+parser.add_argument('-d', '--decks', default=None, metavar='decks',
+  type=str, help='stratum index to draw decks from (see deck_strata.py)')
+parser.add_argument('-c', '--cache', default=None, metavar='cache',
+  type=str, help='file to cache round scores in (needs a seed, no budget)')
+parser.add_argument('-k', '--checkpoint', default=None, metavar='checkpoint',
+  type=str, help='file to save the progress of the run to')
+parser.add_argument('--resume',
+  dest='resume', action='store_true', help='Go on from the checkpoint')
+parser.set_defaults(resume=False)
+parser.add_argument('-g', '--games', default=None, metavar='games',
+  type=str, help='file to append a record of every round to')
+parser.add_argument('-w', '--weights', default=None, metavar='weights',
+  type=str, help='JSON file with the Weights of the heuristic player')
 
 args = parser.parse_args()
 
@@ -51,6 +82,20 @@ assert args.game_type in ('rainbow', 'purple', 'vanilla')
 assert args.n_rounds > 0
 assert args.verbosity in ('silent', 'scores', 'verbose', 'log')
 assert args.loss_score in ('zero', 'full')
+assert args.budget is None or args.budget > 0
+assert args.cache is None or (args.seed >= 0 and not args.output)
+# Rounds with a time budget depend on the speed of the machine
+assert args.cache is None or args.budget is None
+assert args.checkpoint is None or not args.output
+assert not args.resume or os.path.exists(args.checkpoint or '')
+assert args.games is None or args.cache is None
+# The cache only knows the source of the AIs, not the weights they load
+assert args.weights is None or args.cache is None
+assert args.weights is None or heuristics_player, \
+       'the heuristic player could not be loaded'
+
+if args.weights:
+    heuristics_player.load_weights(args.weights)
 
 def get_logger(args):
   # Create logging object for all output.
@@ -112,31 +157,131 @@ if args.verbosity == 'log':
 if args.seed >= 0:
     random.seed(args.seed)
 
-debug = {} # a dictionary players can write into which will be printed in the end. Useful for collecting statistics
+# Draw the decks of all rounds from the strata of the index.
+plan = None
+if args.decks:
+    index = load_index(args.decks)
+    assert index['game_type'] == args.game_type
+    assert index['n_players'] == len(players)
+    plan = sample_decks(index, args.n_rounds,
+                        random.Random(args.seed if args.seed >= 0 else None))
+
+debug = {} # a dictionary players can write notes on cards into, for log.json
+counters = Counters() # players count in r.counters what will be printed in the end. Useful for collecting statistics
 # if you set r.debug['stop'] = 0, then the log of that game will be appended to log.json, and no new game will be started
 
-if args.output and os.path.exists('log.json'):
-  os.remove('log.json')
+if args.output:
+  if os.path.exists('log.json'):
+    os.remove('log.json')
   for i in range(len(players)):
     for c in range(10 * (5 if args.game_type == 'vanilla' else 6)):
         debug[('note', i, c)] = ''
 
 # Play rounds.
+# With a cache, every round gets its own seed, so that it can be looked up
+# on its own.
+cache = None
+if args.cache:
+    from result_cache import ResultCache
+    cache = ResultCache(args.cache, [type(player) for player in players],
+                        args.game_type, args.loss_score, args.police,
+                        args.budget)
+
+# Records of the rounds
+games = None
+if args.games:
+    from game_store import GameStore # Needs NumPy
+    games = GameStore(args.games)
+roundStats = {} if games else None
+lineup = [type(player).get_name() for player in players]
+
 scores = []
-for i in range(args.n_rounds):
+strata = []
+budgetStats = {}
+firstRound = 0
+settings = dict((k, v) for k, v in vars(args).items() if k != 'resume')
+if args.resume:
+    saved = checkpoint.load(args.checkpoint, players)
+    assert saved['settings'] == settings, 'the checkpoint is of another run'
+    firstRound = saved['round']
+    scores = list(saved['scores'])
+    if plan:
+        plan = saved['plan'] or plan
+        strata = list(saved['strata'])
+    else:
+        strata = [None] * len(scores)
+    budgetStats = saved['budgetStats']
+    debug = saved['debug']
+    counters = saved['counters']
+    if games:
+        games.truncate(saved['games']) # Drop rounds after the checkpoint
+    logger.info('Resuming after round {}'.format(firstRound - 1))
+
+def save_checkpoint(nextRound):
+    """Save the progress of the run before round nextRound.  Scores and
+    strata fit in a byte, which keeps big checkpoints small."""
+    if cache:
+        cache.commit() # The cache must have every round of the checkpoint
+    if games:
+        games.flush()
+    checkpoint.save(args.checkpoint, {
+        'settings': settings, 'round': nextRound,
+        'scores': bytearray(scores),
+        'strata': bytearray(strata) if plan else None,
+        # The plan only has to be kept if it can't be drawn again
+        'plan': plan if args.seed < 0 else None,
+        'budgetStats': budgetStats, 'debug': debug, 'counters': counters,
+        'games': games.count if games else None}, players)
+
+lastCheckpoint = time.time()
+for i in range(firstRound, args.n_rounds):
+    if args.checkpoint and \
+       time.time() - lastCheckpoint >= checkpoint.CHECKPOINT_SECONDS:
+        save_checkpoint(i)
+        lastCheckpoint = time.time()
     if 'stop' in debug:
         logger.info("Games interrupted by player after round " + str(i) + "!")
         args.n_rounds = i
         break
     if args.verbosity in ('verbose', 'log'):
         logger.info('\n' + 'ROUND {}:'.format(i))
+    stratum, deck = plan[i] if plan else (None, None)
+    score = None
+    if cache:
+        roundId = 'seed {}-{}'.format(args.seed, i)
+        if deck:
+            roundId += ' deck ' + ' '.join(deck)
+        score = cache.get(roundId)
+        random.seed('{}-{}'.format(args.seed, i))
+    if score is not None:
+        if args.verbosity != 'silent':
+            logger.info('Score: {} (cached)'.format(score))
+        scores.append(score)
+        strata.append(stratum)
+        continue
+    start = time.time()
     score = play_one_round(args.game_type, players, names, args.verbosity,
-                           args.loss_score, args.police, args.output, debug)
+                           args.loss_score, args.police, args.output, debug,
+                           args.budget, budgetStats, deck, roundStats, counters)
+    if games:
+        games.add(game=i, seed=args.seed,
+                  deck=deck_hash(roundStats['deck'], len(players)),
+                  lineup=lineup, variant=args.game_type,
+                  players=len(players), score=score,
+                  strikes=roundStats['strikes'], hints=roundStats['hints'],
+                  deck_out=roundStats['deckOut'],
+                  turns=roundStats['turns'], seconds=time.time() - start)
+    if cache:
+        cache.put(roundId, score)
     scores.append(score)
+    strata.append(stratum)
     if args.verbosity != 'silent':
         logger.info('Score: ' + str(score))
     player_end_game_logging(players)
 
+if args.checkpoint:
+    save_checkpoint(args.n_rounds)
+
 # Print average scores.
 if args.verbosity != 'silent':
     logger.info('')
@@ -152,8 +297,37 @@ if len(scores) > 1: # Only print stats if there were multiple rounds.
                 .format(mean(scores), std_err(scores)))
     logger.info('PERFECT GAMES: {:.2f}% +/- {:.2f}pp (1 std. err.)'
                 .format(100*perfect_games, 100*std_perfect_games))
+    if plan:
+        logger.info('STRATIFIED AVERAGE SCORE: {:.2f} +/- {:.3f} (1 std. err.)'
+                    .format(*stratified_mean(index, strata, scores)))
+        wins = [int(score == max_score) for score in scores]
+        logger.info('STRATIFIED PERFECT GAMES: {:.2f}% +/- {:.2f}pp (1 std. err.)'
+                    .format(*[100*x for x in stratified_mean(index, strata, wins)]))
 elif args.verbosity == 'silent': # Still print score for silent single round
     logger.info('Score: ' + str(scores[0]))
 
-debug = {k:v for k, v in debug.items() if v is not 0 and v is not ''}
+if games:
+    games.close()
+
+if cache:
+    cache.close()
+    logger.info('CACHE: {} of {} rounds served from {}'.format(
+                cache.hits, cache.hits + cache.misses, args.cache))
+    # Cached rounds only have a score: the players did not see them
+    if cache.hits:
+        logger.info('  (debug info and player statistics only cover the {} '
+                    'rounds played)'.format(cache.misses))
+
+if budgetStats.get('turns'):
+    logger.info('TURN BUDGETS: {} of {} turns ran out of time, {} took longer '
+                'than {}s (longest {:.3f}s)'.format(budgetStats['exhausted'],
+                budgetStats['turns'], budgetStats['overrun'], args.budget,
+                budgetStats['longest']))
+
+# Calibration of the heuristic players of all rounds (if TRACKING is on)
+if heuristics_player:
+    heuristics_player.merge_trackings(players).log_tracking_info(logger)
+
+debug = {k:v for k, v in debug.items() if v != 0 and v != ''}
+debug.update(counters.summary())
 if debug: print("debug info:",debug)
\ No newline at end of file
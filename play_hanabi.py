@@ -26,27 +26,20 @@ def to_json (r, action):
         dic = {"type":actionType, "target":target}
     return dic
 
-def play_one_round(gameType, players, names, verbosity, lossScore, isPoliced, writeOutput, debug):
-    """Play a full round and return the score (int)."""
+def play_one_round(gameType, players, names, verbosity, lossScore, isPoliced, writeOutput, debug,
+                   turnBudget=None, budgetStats=None, deck=None, roundStats=None,
+                   counters=None):
+    """Play a full round and return the score (int).
 
-    r = Round(gameType, players, names, verbosity, isPoliced, debug) # Instance of a single Hanabi round
-    r.generate_deck_and_deal_hands()
+    If budgetStats is a dict, the turn budgets of this round are added to it
+    (see record_budgets).  If deck is given, the round is played with that
+    deck order (see Round.generate_deck_and_deal_hands).  If roundStats is a
+    dict, how the round ended is put in it (see record_round).  Players count
+    what they want to in counters (see Round)."""
 
-    while r.gameOverTimer != 0:
-        if r.deck == [] and r.gameOverTimer == None:
-            r.gameOverTimer = r.nPlayers # Begin last turns when deck depletes.
-        if type(r.gameOverTimer) is int:
-            r.gameOverTimer -= 1 # Count down in the last turns.
-        if all(x == int(SUIT_CONTENTS[-1]) for x in r.progress.values()):
-            break # End round early if already won.
-
-        if r.Resign:
-            break # Resignation for debug purposes
-
-        if r.lightning == N_LIGHTNING:
-            break # The game ends by having three strikes
-
-        r.get_play(players[r.whoseTurn]) # Play one turn.
+    r = Round(gameType, players, names, verbosity, isPoliced, debug, turnBudget, counters) # Instance of a single Hanabi round
+    r.generate_deck_and_deal_hands(deck)
+    play_until_end(r, players)
 
     if writeOutput or 'stop' in debug:
         if not writeOutput and os.path.exists('log.json'): os.remove('log.json')
@@ -68,10 +61,60 @@ def play_one_round(gameType, players, names, verbosity, lossScore, isPoliced, wr
                 debug[('note', i, c)] = ''
 
 
+    if budgetStats is not None:
+        record_budgets(r, budgetStats)
+    if roundStats is not None:
+        record_round(r, roundStats)
+
+    return final_score(r, lossScore)
+
+def play_until_end(r, players):
+    """Let players take their turns in r until the round is over."""
+    while r.gameOverTimer != 0:
+        if r.deck == [] and r.gameOverTimer == None:
+            r.gameOverTimer = r.nPlayers # Begin last turns when deck depletes.
+        if type(r.gameOverTimer) is int:
+            r.gameOverTimer -= 1 # Count down in the last turns.
+        if all(x == int(SUIT_CONTENTS[-1]) for x in r.progress.values()):
+            break # End round early if already won.
+
+        if r.Resign:
+            break # Resignation for debug purposes
+
+        if r.lightning == N_LIGHTNING:
+            break # The game ends by having three strikes
+
+        r.get_play(players[r.whoseTurn]) # Play one turn.
+
+def final_score(r, lossScore):
+    """The score of the finished round r."""
     if r.lightning == N_LIGHTNING and lossScore == 'zero':
         return 0 # Award no points for a loss
     return sum(r.progress.values()) # Final score
 
+def record_budgets(r, budgetStats):
+    """Count the turns with a time budget, the turns in which the player ran
+    out of time, and the turns that took longer than their budget."""
+    for key in ('turns', 'exhausted', 'overrun'):
+        budgetStats.setdefault(key, 0)
+    budgetStats.setdefault('longest', 0.)
+    for budget in r.budgetHistory:
+        if budget is None or budget.seconds is None:
+            continue
+        budgetStats['turns'] += 1
+        budgetStats['exhausted'] += budget.exhausted
+        budgetStats['overrun'] += budget.elapsed > budget.seconds
+        budgetStats['longest'] = max(budgetStats['longest'], budget.elapsed)
+
+def record_round(r, roundStats):
+    """Put the starting deck of the finished round r, its number of turns,
+    strikes and hints left, and whether the deck ran out in roundStats."""
+    roundStats['deck'] = r.startingDeck
+    roundStats['turns'] = r.turnNumber
+    roundStats['strikes'] = r.lightning
+    roundStats['hints'] = r.hints
+    roundStats['deckOut'] = not r.deck
+
 def player_end_game_logging(players):
     """Will log any information specific to a player at the end of the game"""
     for player in players:
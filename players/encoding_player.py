@@ -10,16 +10,29 @@ import itertools as it
 import numpy as np
 
 from hanabi_classes import AIPlayer
+from encoding_utils import CodePart, HintCode, ColumnCombinations
 
 # This AI is designed to implement an information encoding algorithm
 # Still very much a work in progress
 
+MATLABELS = {'N':'NumMat','S':'SuitMat'}
+
+# Groups of the named maps used in codes, in the order of the value they encode
+# ('1,2+' encodes a 1 as 1 and everything else as 0)
+CODEGROUPS = {('N','all'):[[1],[2],[3],[4],[5]],
+              ('S','all'):[[0],[1],[2],[3],[4]],
+              ('N','1,2+'):[[2,3,4,5],[1]],
+              ('N','1-4+'):[[1],[2],[3],[4,5]]}
+
 class EncodingPlayer(AIPlayer):
 
     @classmethod
     def get_name(cls):
         return 'encoder'
 
+    # Needs the hand history of the whole round
+    canPlayMidRound = False
+
     def InitializeConstants(self,r):
         self.nPlayers = r.nPlayers
         self.SelfID = r.whoseTurn
@@ -30,6 +43,9 @@ class EncodingPlayer(AIPlayer):
         self.EncodingTables = []
         for l in range(r.nPlayers):
             self.EncodingTables.append([[i,str(j)] for j in '12345rygbw' for i in [k for k in range(r.nPlayers) if k != l]])
+        # EncodingIndices maps every hint back to its position in the table
+        self.EncodingIndices = [{tuple(I):i for i,I in enumerate(Table)}
+                                for Table in self.EncodingTables]
         self.TableSize = len(self.EncodingTables[self.SelfID])
         
         self.nCards = len(r.h[r.whoseTurn].cards)
@@ -51,11 +67,13 @@ class EncodingPlayer(AIPlayer):
         self.RunningPlayInd = -1
         self.iRecord = -1
         
+        # The codes of the first turns are parsed once, the code of turn i
+        # is given by player i
         self.CodeList = []
-        self.CodeList.append('0N_1,2+__1N_1,2+__2N_1,2+__2S_all')
-        self.CodeList.append('0N_1-4+__3S_all__3N_1,2+')
-        self.CodeList.append('4S_all_3,1:0,2:1,3__4N_1,2+_0,2:1,3__1N_1-4+')
-        self.CodeList.append('0S_all__1S_all')
+        self.CodeList.append(self.CodeFromString('0N_1,2+__1N_1,2+__2N_1,2+__2S_all',0))
+        self.CodeList.append(self.CodeFromString('0N_1-4+__3S_all__3N_1,2+',1))
+        self.CodeList.append(self.CodeFromString('4S_all_3,1:0,2:1,3__4N_1,2+_0,2:1,3__1N_1-4+',2))
+        self.CodeList.append(self.CodeFromString('0S_all__1S_all',3))
     
     def play(self, r):
         r.HandHistory.append(c(r.h))
@@ -75,15 +93,15 @@ class EncodingPlayer(AIPlayer):
             if i > self.iRecord:
                 self.iRecord = c(i)
                 if i == len(self.CodeList):
-                    self.CodeList.append('')
+                    self.CodeList.append(None)
                 PlayingPlayer = (i % self.nPlayers) # Determines which player made this move
                 if I[0] == 'hint':
                     GivenHint = list(I[1])
-                    if self.CodeList[i] == '':
+                    if self.CodeList[i] is None:
                         NumInHand =  [len(K.cards) for K in r.HandHistory[i]]
                         self.CodeList[i] = self.CodeFromInfoMat(PlayingPlayer,NumInHand)
                     Code = self.CodeList[i]
-                    EncodedValue = self.BackOutEncodedValue(self.EncodingTables[PlayingPlayer],GivenHint)
+                    EncodedValue = self.BackOutEncodedValue(self.EncodingIndices[PlayingPlayer],GivenHint)
                     for j in [k for k in range(self.nPlayers) if k != PlayingPlayer]:
                         RestrictedDenseOtherHands = self.CompleteHandToInt(r,[j,PlayingPlayer],i)
                         self.ValueFromCode(Code,RestrictedDenseOtherHands,EncodedValue,j)
@@ -95,7 +113,7 @@ class EncodingPlayer(AIPlayer):
                     else:
                         raise NameError('')
                         
-                    MatLabel = {'N':'NumMat','S':'SuitMat'}[HintType]
+                    MatLabel = MATLABELS[HintType]
                     for j,J in enumerate(r.HandHistory[i][GivenHint[0]].cards):
                         
                         PriorKnowledge = c(self.InformationMatrix[MatLabel][GivenHint[0],j])
@@ -185,17 +203,12 @@ class EncodingPlayer(AIPlayer):
                 if KnownStr == 'x': KnownStr = self.SuitStr
                 SuitPosMat[i,j] = len(KnownStr.split(','))
         
-        CandidateIndices = list(it.product(range(self.nCards),repeat=self.nPlayers-1))
-        ReductionListNum = []
-        ReductionListSuit = []
-        for i,I in enumerate(CandidateIndices):
-            nReductionNum = 0
-            nReductionSuit = 0
-            for j,J in enumerate(I):
-                nReductionNum += NumPosMat[OtherPlayers[j],J] - 1
-                nReductionSuit += SuitPosMat[OtherPlayers[j],J] - 1
-            ReductionListNum.append(int(nReductionNum))
-            ReductionListSuit.append(int(nReductionSuit))
+        # Row i is the i-th element of it.product(range(nCards),repeat=nPlayers-1)
+        CandidateIndices = ColumnCombinations(self.nPlayers,self.nCards)
+        ReductionListNum = np.sum(NumPosMat[OtherPlayers,CandidateIndices] - 1,
+                                  axis=1).astype(int).tolist()
+        ReductionListSuit = np.sum(SuitPosMat[OtherPlayers,CandidateIndices] - 1,
+                                   axis=1).astype(int).tolist()
         NumSortInd = np.argsort(ReductionListNum)[::-1]
         SuitSortInd = np.argsort(ReductionListSuit)[::-1]
         
@@ -205,14 +218,14 @@ class EncodingPlayer(AIPlayer):
             # Prioritize number resolution over suit resolution
             for j in range(len(NumSortInd)):
                 if ReductionListNum[NumSortInd[j]] == i:
-                    ColInd = list(CandidateIndices[NumSortInd[j]])
+                    ColInd = CandidateIndices[NumSortInd[j]].tolist()
                     if all([HandNumOther[k] > K for k,K in enumerate(ColInd)]):
-                        CodeCandidateList.append('N:' + str(ColInd)[1:-1])
+                        CodeCandidateList.append(('N',ColInd))
             for j in range(len(SuitSortInd)):
                 if ReductionListNum[SuitSortInd[j]] == i:
-                    ColInd = list(CandidateIndices[SuitSortInd[j]])
+                    ColInd = CandidateIndices[SuitSortInd[j]].tolist()
                     if all([HandNumOther[k] > K for k,K in enumerate(ColInd)]):
-                        CodeCandidateList.append('S:' + str(ColInd)[1:-1])
+                        CodeCandidateList.append(('S',ColInd))
         
         CodeSelection = [CodeCandidateList[0]]
         for i in CodeCandidateList:
@@ -220,20 +233,11 @@ class EncodingPlayer(AIPlayer):
                 CodeSelection.append(i)
                 break
             else:
-                ColInd = [int(k) for k in i.split(':')[1].split(',')]
-                if not any(np.equal([int(k) for k in CodeSelection[0].split(':')[1].split(',')],
-                                     ColInd)):
+                if not any(np.equal(CodeSelection[0][1],i[1])):
                      CodeSelection.append(i)
                      break
-        CodeStr = ''
-        for I in CodeSelection:
-            CodeStr += '4' + I[0] + '_all_'
-            for j,J in enumerate([int(K) for K in I.split(':')[1].split(',')]):
-                CodeStr += str(OtherPlayers[j]) + ',' + str(J) + ':'
-            CodeStr = CodeStr[:-1]
-            CodeStr += '__'
-        CodeStr = CodeStr[:-2]
-        return CodeStr
+        return HintCode([CodePart(Type,zip(OtherPlayers,ColInd),CODEGROUPS[Type,'all'])
+                         for Type,ColInd in CodeSelection])
     
     def GetDiscardable(self,r):
         Output = []
@@ -327,147 +331,68 @@ class EncodingPlayer(AIPlayer):
         SuitMat = np.array(SuitMat,dtype='S64')
         return {'NumMat':NumMat,'SuitMat':SuitMat}
         
-    def EnumerateMixedBase(self,BaseIn):
-        Output = range(BaseIn[0])
-        for i,I in enumerate(BaseIn[1:]):
-            Output = np.array(list(it.product(Output,range(I)))).tolist()
-            if i>0:
-                for j,J in enumerate(Output):
-                    Output[j] = list(it.chain(*[J[0],[J[1]]]))
-        for i,I in enumerate(Output):
-            if type(I) != list:
-                Output[i] = [Output[i]]
-        
-        return Output
-        
     def InterpretCode(self,Code,DenseOtherHands):
         ResultList = []
-        MixBaseList = []
-        for i,I in enumerate(Code.split('__')):
-            Position,Map,OtherHandMat,MatLabel,CustomPosition = self.CodeParse(I,DenseOtherHands)
+        for I in Code:
+            OtherHandMat = DenseOtherHands[MATLABELS[I.Type]]
+            ResultList.append(I.Result([int(OtherHandMat[j[0],j[1]]) for j in I.Cards]))
 
-            if Position != 'custom':
-                OtherHandRaw = OtherHandMat[self.OtherIDs,Position]
-            else:
-                OtherHandRaw = [OtherHandMat[j[0],j[1]] for j in CustomPosition]
-            
-            OtherHandMapped = self.MapVector(OtherHandRaw,Map)           
-            
-            ResultList.append(np.sum(OtherHandMapped) % len(Map[1]))
-            MixBaseList.append(len(Map[1]))
-
-        MixBaseEnum = self.EnumerateMixedBase(MixBaseList)
-        for i,I in enumerate(MixBaseEnum):
-            if np.array_equal(I,ResultList):
-                return i,ResultList
+        return Code.Encode(ResultList),ResultList
  
     def ValueFromCode(self,Code,DenseOtherHands,EncodedValue,Player):
-        MixBaseList = []
-        for i,I in enumerate(Code.split('__')):
-            Position,Map,OtherHandMat,MatLabel,CustomPosition = self.CodeParse(I,DenseOtherHands)
-            MixBaseList.append(len(Map[1]))
-            
-        MixBaseEnum = self.EnumerateMixedBase(MixBaseList)
-        ResultList = MixBaseEnum[EncodedValue]
+        ResultList = Code.Decode(EncodedValue)
         
-        BackCalcList = []
-        for i,I in enumerate(Code.split('__')):
-            AdjustInfoMatBool = True
-            Position,Map,OtherHandMat,MatLabel,CustomPosition = self.CodeParse(I,DenseOtherHands)
-            if Position != 'custom':
-                OtherValues = [int(j) for j in OtherHandMat[:,Position] if j != 'x']
-                if len(OtherValues) != self.nPlayers - 2:
-                    raise NameError('Incorrect number of elements')
+        for i,I in enumerate(Code):
+            MatLabel = MATLABELS[I.Type]
+            OtherHandMat = DenseOtherHands[MatLabel]
+            PlayerAddress = [j for j in I.Cards if j[0] == Player]
+            if len(PlayerAddress) > 1:
+                raise NameError('Multiple unknowns for same player not supported')
+            elif len(PlayerAddress) == 0:
+                continue
+            PlayerAddress = PlayerAddress[0]
+            OtherValues = [int(OtherHandMat[j[0],j[1]]) for j in I.Cards if j[0] != Player]
+
+            MappedOtherValues = [I.GroupOf[j] for j in OtherValues]
+            ResultInd = (ResultList[i] - np.sum(MappedOtherValues)) % I.Base
+            BackCalc = list(I.Groups[ResultInd])
 
+            CurrentKnowledge = c(self.InformationMatrix[MatLabel][PlayerAddress[0],PlayerAddress[1]])
+            
+            AddedKnowledge = str(BackCalc)[1:-1]
+            if CurrentKnowledge == 'x':
+                self.InformationMatrix[MatLabel][PlayerAddress[0],PlayerAddress[1]] = c(AddedKnowledge)
+            elif len(CurrentKnowledge) == 1:
+                pass
             else:
-                PlayerAddress = []
-                OtherPlayerAddress = []
-                for j,J in enumerate(CustomPosition):
-                    if J[0] == Player:
-                        PlayerAddress.append(J)
-                    else:
-                        OtherPlayerAddress.append(J)
-                
-                if len(PlayerAddress) > 1:
-                    raise NameError('Multiple unknowns for same player not supported')
-                elif len(PlayerAddress) == 1:
-                    PlayerAddress = PlayerAddress[0]
-                    OtherValues = [OtherHandMat[j[0],j[1]] for j in OtherPlayerAddress]
-                else:
-                    AdjustInfoMatBool = False
-                  
-            if AdjustInfoMatBool:
-                MappedOtherValues = self.MapVector(OtherValues,Map)
-                ResultInd = (ResultList[i] - np.sum(MappedOtherValues)) % len(Map[1])
-                BackCalcList.append(self.InverseMapVector([ResultInd],Map)[0])
-                
-                if Position != 'custom':  
-                    PlayerAddress = [Player,Position]
-    
-                CurrentKnowledge = c(self.InformationMatrix[MatLabel][PlayerAddress[0],PlayerAddress[1]])
-                
-                AddedKnowledge = str(BackCalcList[-1])[1:-1]
-                if CurrentKnowledge == 'x':
-                    self.InformationMatrix[MatLabel][PlayerAddress[0],PlayerAddress[1]] = c(AddedKnowledge)
-                elif len(CurrentKnowledge) == 1:
-                    pass
-                else:
-                    CurrentSet =  [int(j) for j in AddedKnowledge.split(',')]
-                    IntSet = [int(j) for j in CurrentKnowledge.split(',')]
-                    NewSet = list(set(CurrentSet).intersection(IntSet))
-                    if len(NewSet) == 0:
-                        raise NameError('Error: Possibility has been reduced to empty set')
-                    self.InformationMatrix[MatLabel][PlayerAddress[0],PlayerAddress[1]] = c(str(NewSet)[1:-1])    
+                CurrentSet =  [int(j) for j in AddedKnowledge.split(',')]
+                IntSet = [int(j) for j in CurrentKnowledge.split(',')]
+                NewSet = list(set(CurrentSet).intersection(IntSet))
+                if len(NewSet) == 0:
+                    raise NameError('Error: Possibility has been reduced to empty set')
+                self.InformationMatrix[MatLabel][PlayerAddress[0],PlayerAddress[1]] = c(str(NewSet)[1:-1])    
         
-    def CodeParse(self,CodeIn,DenseOtherHands):
-        Position = int(CodeIn.split('_')[0][0])
-        if Position >= DenseOtherHands['NumMat'].shape[1]:
-            Position = 'custom'
-            CustomPosition = [[int(j) for j in i.split(',')] 
-                                for i in CodeIn.split('_')[2].split(':')]
-        else:
-            Position = int(Position)
-            CustomPosition = ''
-        MatLabel = {'N':'NumMat','S':'SuitMat'}[CodeIn.split('_')[0][1]]
-        OtherHandMat = c(DenseOtherHands[MatLabel])
-        if CodeIn.split('_')[1] == 'all':
-            if CodeIn.split('_')[0][1] == 'N':
-                Map = [[[1],[2],[3],[4],[5]],range(5)]
-            elif CodeIn.split('_')[0][1] == 'S':
-                Map = [[[0],[1],[2],[3],[4]],range(5)]
-        elif CodeIn.split('_')[1] == '1,2+':
-            if CodeIn.split('_')[0][1] == 'N':
-                Map = [[[1],[2,3,4,5]],[1,0]]
-            else:
-                raise NameError('1,2+ valid only for numeric case')   
-        elif CodeIn.split('_')[1] == '1-4+':
-            if CodeIn.split('_')[0][1] == 'N':
-                Map = [[[1],[2],[3],[4,5]],[0,1,2,3]]
+    def CodeFromString(self,CodeIn,Hinter):
+        # Codes are written as parts separated by '__'.  Every part is
+        # <position><N or S>_<groups>, where the position is the column used in
+        # all hands but the hinter's, or <nCards>_<groups>_<player,column:...>
+        # to give the cards explicitly
+        Parts = []
+        for I in CodeIn.split('__'):
+            Position = int(I.split('_')[0][0])
+            Type = I.split('_')[0][1]
+            if Position >= self.nCards:
+                Cards = [[int(j) for j in k.split(',')] 
+                         for k in I.split('_')[2].split(':')]
             else:
-                raise NameError('1-4+ valid only for numeric case')  
-            
-        return Position,Map,OtherHandMat,MatLabel,CustomPosition
-        
-    def MapVector(self,VecIn,Map):
-        VecOut = []        
-        for i in VecIn:
-            for j,J in enumerate(Map[0]):
-                if int(i) in J:
-                    VecOut.append(Map[1][j])
-        return VecOut
-        
-    def InverseMapVector(self,VecIn,Map):
-        OutVec = []
-        for i in VecIn:
-            for j,J in enumerate(Map[1]):
-                if i==J:
-                    OutVec.append(Map[0][j])
-        return OutVec
+                Cards = [[k,Position] for k in range(self.nPlayers) if k != Hinter]
+            if (Type,I.split('_')[1]) not in CODEGROUPS:
+                raise NameError(I.split('_')[1] + ' is not valid for type ' + Type)
+            Parts.append(CodePart(Type,Cards,CODEGROUPS[Type,I.split('_')[1]]))
+        return HintCode(Parts)
         
-    def BackOutEncodedValue(self,EncodingTable,Hint):
-        for i,I in enumerate(EncodingTable):
-            if np.array_equal(I,Hint):
-                return i
+    def BackOutEncodedValue(self,EncodingIndex,Hint):
+        return EncodingIndex[Hint[0],str(Hint[1])]
     
     def CheckEncoding(self,r,Turn):
         # Debuging function to check if an incorrect value has been encoded
@@ -8,8 +8,10 @@ Created on Sun May 08 12:57:34 2016
 from copy import deepcopy as c
 import itertools as it
 import numpy as np
-import random, re, sys, time
+import random, sys, time
 from hanabi_classes import AIPlayer
+from encoding_utils import CodePart, HintCode, ColumnCombinations, \
+                           SetPartitions
 
 class GeneralEncodingPlayer(AIPlayer):
 
@@ -17,6 +19,13 @@ class GeneralEncodingPlayer(AIPlayer):
     def get_name(cls):
         return 'gencoder'
 
+    # With a time budget, codes are searched until the budget is used up
+    # (see GenerateCode)
+    usesTurnBudget = True
+
+    # Needs the hand history and information matrix of the whole round
+    canPlayMidRound = False
+
     def __init__(self, me, logger, verbosity):
         super(GeneralEncodingPlayer, self).__init__(me, logger, verbosity)
         # This boolean is for replicate runs. Certain initialization routines
@@ -92,7 +101,8 @@ class GeneralEncodingPlayer(AIPlayer):
         # Preempt normal discard to use up hints, drag out game.
         if nDraw <= NearEndCutoff and r.hints > 0:
             Code = self.GenerateCode(nPriorTurns,self.SelfID,
-                                 self.GroupCardNumbers(r.progress),r.progress)
+                                 self.GroupCardNumbers(r.progress),r.progress,
+                                 r.budget)
             Hint = self.DetermineHint(Code,self.SelfID,nPriorTurns)
             return 'hint', (Hint[0],Hint[1])
         
@@ -113,7 +123,8 @@ class GeneralEncodingPlayer(AIPlayer):
             return 'discard',r.h[r.whoseTurn].cards[0]
             
         Code = self.GenerateCode(nPriorTurns,self.SelfID,
-                                 self.GroupCardNumbers(r.progress),r.progress)
+                                 self.GroupCardNumbers(r.progress),r.progress,
+                                 r.budget)
         Hint = self.DetermineHint(Code,self.SelfID,nPriorTurns)
         return 'hint', (Hint[0],Hint[1])
         # ---------------------------------------------------------------------
@@ -125,6 +136,8 @@ class GeneralEncodingPlayer(AIPlayer):
         # Instead, combinations are psudo randomly selected and tested. Larger
         # sampling will produce better results at the cost of longer run times
         self.nMCCandidates = np.float(1e2)
+        # Reductions are sums of floats, so a bound is only trusted up to this
+        self.BoundTolerance = 1e-9
     
     
         # This block initializes constants which depend on game specifics         
@@ -146,20 +159,35 @@ class GeneralEncodingPlayer(AIPlayer):
             for number in '1112233445':
                 self.SortedDeck.append(number + suit)
         
-        # I choose to represent the information matrix as a dictionary because
-        # it makes it easier to retreive elements. The tradeoff is that the 
-        # intrinsic structure is not contained in the variable. However, the
-        # shape is always nPlayers x nCards, so this is acceptable
-        self.InformationMatrix = {}
-        for i in range(self.nPlayers):
-            # "Dummy" r1 at the -1 position can be pointed to during encoding
-            # if the origional target is not present (less than full hand size)
-            # See self.GenerateHandRecord for more information
-            self.InformationMatrix[i,-1,'S'] = ['r']
-            self.InformationMatrix[i,-1,'N'] = [1]
-            for j in range(self.nCards):
-                self.InformationMatrix[i,j,'S'] = c(self.SuitSet)
-                self.InformationMatrix[i,j,'N'] = c(self.NumberSet)
+        # Index of every card in the suit and number axes of the card counts
+        # and the information matrix
+        self.CardIndex = {}
+        for k,K in enumerate(self.SuitSet):
+            for m,M in enumerate(self.NumberSet):
+                self.CardIndex[M + K] = (k,m)
+        self.NumberValues = np.array([int(i) for i in self.NumberSet])
+        
+        # CountHistory[t] is the number of copies of every card left before
+        # turn t (as seen from the played and discarded cards). It is 
+        # extended as the game goes on, see GetCountFromDiscard.
+        CardCount = np.zeros([len(self.SuitSet),len(self.NumberSet)],
+                             dtype=int)
+        for i in self.SortedDeck:
+            CardCount[self.CardIndex[i]] += 1
+        self.CountHistory = [CardCount]
+
+        # The information matrix is a boolean tensor: 
+        # InformationMatrix[player,card,suit,number-1] is true if the card can
+        # still have that suit and number. Suits and numbers are always 
+        # restricted separately, so for every card it is the product of a set
+        # of suits and a set of numbers.
+        self.InformationMatrix = np.ones([self.nPlayers,self.nCards+1,
+                        len(self.SuitSet),len(self.NumberSet)],dtype=bool)
+        # "Dummy" r1 at the -1 position can be pointed to during encoding
+        # if the origional target is not present (less than full hand size)
+        # See self.GenerateHandRecord for more information
+        self.InformationMatrix[:,-1] = False
+        self.InformationMatrix[(slice(None),-1) + self.CardIndex['1r']] = True
 
         # I plan on using random sampling methods to study different play
         # strategies. However, introduction of a full CSPRNG would 
@@ -199,19 +227,20 @@ class GeneralEncodingPlayer(AIPlayer):
 
     def GetCountFromDiscard(self,r,turn = ''):
         # Card counting function, uses the played and discarded cards
+        # (CardCount[suit,number-1] is the number of copies left). Only the
+        # turns that were not counted yet are added to self.CountHistory.
         if turn == '':
             turn = len(r.playHistory)
-        CardCount = {i:0 for i in np.unique(self.SortedDeck)}
-        for i in self.SortedDeck:
-            CardCount[i] += 1
-        for i,I in enumerate(r.playHistory[:turn]):
+        for I in r.playHistory[len(self.CountHistory)-1:turn]:
+            CardCount = self.CountHistory[-1].copy()
             if I[0] == 'play' or I[0] == 'discard':
-                CardCount[I[1]['name']] -= 1
+                CardCount[self.CardIndex[I[1]['name']]] -= 1
             elif I[0] == 'hint':
                 pass
             else:
                 raise NameError('')
-        return CardCount
+            self.CountHistory.append(CardCount)
+        return self.CountHistory[turn].copy()
         
     def GetCardCountFromHandAndDiscard(self,r):
         # Card counting function. Uses played, discarded, and other players'
@@ -221,50 +250,48 @@ class GeneralEncodingPlayer(AIPlayer):
             for j in range(self.nCards):
                 Value = self.HandHistory[-1][i,j]
                 if Value != 'xx':
-                    CardCount[Value] -= 1
+                    CardCount[self.CardIndex[Value]] -= 1
         return CardCount
         
+    def GetPlayableMask(self,progress):
+        # PlayableMask[suit,number-1] is true if that card can be played
+        PlayableMask = np.zeros([len(self.SuitSet),len(self.NumberSet)],
+                                dtype=bool)
+        for key in progress:
+            if progress[key] < self.MaxCardNumber:
+                PlayableMask[self.CardIndex[str(progress[key]+1) + key]] = True
+        return PlayableMask
+
     def GetSemiSafePlay(self,r,SafeDiscard):
         # This function calculates the probability that a card is safe to play.
         # It only does this for the cards that are safe to discard. That way
         # the game isn't ruined if it plays an invalid card.
-        progress = r.progress
         CardCount = self.GetCardCountFromHandAndDiscard(r)
-        PlayableSet = [str(progress[key]+1) + key for key in progress]
+        PlayableMask = self.GetPlayableMask(r.progress)
         pPlayable = [0 for m in range(self.nCards)]
         for i in SafeDiscard:
-            N = self.InformationMatrix[self.SelfID,i,'N']
-            S = self.InformationMatrix[self.SelfID,i,'S']
-            PossibleSet = [m[0] + m[1] for m in list(it.product(N,S))]
-            PosPlayable = [1 if m in PlayableSet else 0 for m in PossibleSet]
-            PosCount = [CardCount[m] for m in PossibleSet]
-            pPlayable[i] =  (np.float(np.sum(np.array(PosCount)*
-                            np.array(PosPlayable)))/np.sum(PosCount))
+            PosCount = CardCount * self.InformationMatrix[self.SelfID,i]
+            pPlayable[i] = (float(np.sum(PosCount * PlayableMask))
+                            /np.sum(PosCount))
         return pPlayable    
             
     def GetPlayableIndex(self,r):
         # Gets which cards in the player's hand are safely playable.
-        progress = r.progress
         CardCount = self.GetCardCountFromHandAndDiscard(r)
-        PlayableSet = [str(progress[key]+1) + key for key in progress]
-        nSuits = len(PlayableSet)
+        PlayableMask = self.GetPlayableMask(r.progress)
+        nSuits = len(r.progress)
+        Possible = self.InformationMatrix[self.SelfID,:self.nCards]
+        nPos = np.sum(Possible,axis=(1,2))
+        Playable = (nPos <= nSuits) & ~np.any(Possible & ~PlayableMask,
+                                              axis=(1,2))
         PlayableCards = []
         ExpectedValue = []
         for i in range(self.nCards):
-            N = self.InformationMatrix[self.SelfID,i,'N']
-            S = self.InformationMatrix[self.SelfID,i,'S']
-            PossibleSet = [m[0] + m[1] for m in list(it.product(N,S))]
-            nPos = len(PossibleSet)
-            Playable = False
-            if nPos <= nSuits:
-                if len(set(PossibleSet).intersection(PlayableSet)) == nPos:
-                    Playable = True
-            if Playable:
+            if Playable[i]:
                 PlayableCards.append(i)
-                PosSetCount = [CardCount[m] for m in PossibleSet]
-                PosSetVal = [int(m[0]) for m in PossibleSet]
+                PosSetCount = CardCount * Possible[i]
                 ExpectedValue.append(
-                    float(np.sum(np.array(PosSetCount)*np.array(PosSetVal)))
+                    float(np.sum(PosSetCount*self.NumberValues))
                     /np.sum(PosSetCount))
         return PlayableCards, ExpectedValue
         
@@ -273,28 +300,17 @@ class GeneralEncodingPlayer(AIPlayer):
         # SafeDiscard = can be discarded
         # SaferDiscard = more than 1 other copy
         # SafestDiscard = already played, no issue with discarding
-        SafeDiscard = []
-        SaferDiscard = []
-        SafestDiscard = []
         CardCount = self.GetCountFromDiscard(r)
-        
-        for i in range(self.nCards):
-            N = self.InformationMatrix[self.SelfID,i,'N']
-            S = self.InformationMatrix[self.SelfID,i,'S']
-            PossibleSet = [m[0] + m[1] for m in list(it.product(N,S))]            
-            AlreadyPlayed = [1 if int(m[0]) <= r.progress[m[1]] 
-                             else 0 for m in PossibleSet]
-            MultipleLeft = [1 if CardCount[m] > 1 else 0 for m in PossibleSet]
-            MultipleLeft2 = [1 if CardCount[m] > 2 else 0 for m in PossibleSet]
-            SafeDiscardBool =   np.min([1 if AlreadyPlayed[m] == 1 or 
-                                MultipleLeft[m] == 1 else 0 for m in 
-                                range(len(PossibleSet))]) == 1
-            if SafeDiscardBool:
-                SafeDiscard.append(i)
-            if np.min(MultipleLeft2) == 1:
-                SaferDiscard.append(i)
-            if np.min(AlreadyPlayed) == 1:
-                SafestDiscard.append(i)
+        AlreadyPlayed = np.array([self.NumberValues <= r.progress[key] 
+                                  for key in self.SuitSet])
+        Impossible = ~self.InformationMatrix[self.SelfID,:self.nCards]
+        Safe = np.all(Impossible | AlreadyPlayed | (CardCount > 1),
+                      axis=(1,2))
+        Safer = np.all(Impossible | (CardCount > 2),axis=(1,2))
+        Safest = np.all(Impossible | AlreadyPlayed,axis=(1,2))
+        SafeDiscard = [i for i in range(self.nCards) if Safe[i]]
+        SaferDiscard = [i for i in range(self.nCards) if Safer[i]]
+        SafestDiscard = [i for i in range(self.nCards) if Safest[i]]
         return SafeDiscard, SaferDiscard, SafestDiscard
             
     def GenerateHandRecord(self,r):
@@ -385,30 +401,38 @@ class GeneralEncodingPlayer(AIPlayer):
                     # Back out the dynamic code chosen by the hinting player
                     Code = self.GenerateCode(Turn,HintingPlayer,
                                 self.GroupCardNumbers(r.progressHistory[Turn]),
-                                r.progressHistory[Turn])
+                                r.progressHistory[Turn],r.budgetHistory[Turn])
                     self.UpdateInformationMatrix(r.playHistory[Turn][1],Code,
                          HintingPlayer,Turn)
+                    # Use the actual hinted information in addition to the
+                    # encoded information
+                    Numbers = np.any(self.InformationMatrix,axis=2)
+                    Suits = np.any(self.InformationMatrix,axis=3)
                     for i in range(self.nPlayers):
                         for j in range(self.nCards):
-                            # Use the actual hinted information in addition to
-                            # the encoded information
                             for k in self.DirectRecord[Turn][i,j]:
                                 if k in self.NumberSet:
-                                    self.InformationMatrix[i,j,'N'] = k
+                                    Numbers[i,j] = False
+                                    Numbers[i,j,self.NumberSet.index(k)] = True
                                 else:
-                                    self.InformationMatrix[i,j,'S'] = k
-                            self.InformationMatrix[i,j,'N'] = list(set(
-                                self.InformationMatrix[i,j,'N']).difference(
-                                self.IndirectRecord[Turn][i,j]))
-                            self.InformationMatrix[i,j,'S'] = list(set(
-                                self.InformationMatrix[i,j,'S']).difference(
-                                self.IndirectRecord[Turn][i,j]))
+                                    Suits[i,j] = False
+                                    Suits[i,j,self.SuitSet.index(k)] = True
+                            for k in self.IndirectRecord[Turn][i,j]:
+                                if k in self.NumberSet:
+                                    Numbers[i,j,self.NumberSet.index(k)] = False
+                                elif k in self.SuitSet:
+                                    Suits[i,j,self.SuitSet.index(k)] = False
+                    self.InformationMatrix[:,:self.nCards] = (
+                        Suits[:,:self.nCards,:,None] & 
+                        Numbers[:,:self.nCards,None,:])
                                 
-                            # Use card counting methods to further restrict
-                            # possibilities.
-                            Improvement = True
-                            while Improvement:
-                                Improvement = self.CardCountInfoMat(r,Turn)
+                    # Use card counting methods to further restrict
+                    # possibilities. All restrictions only remove 
+                    # possibilities, so the result does not depend on the 
+                    # order in which they are applied.
+                    Improvement = True
+                    while Improvement:
+                        Improvement = self.CardCountInfoMat(r,Turn)
                 elif PlayType == 'play' or PlayType == 'discard':
                     # Shift cards to the left and initialize the rightmost
                     # card as unknown: [1,2,3,4,5]['r','y','g','b','w']
@@ -417,15 +441,11 @@ class GeneralEncodingPlayer(AIPlayer):
                     # redirected to the dummy r1 at the -1 position.
                     self.RunningPlayInd += 1  
                     DroppedCardInd = r.DropIndRecord[self.RunningPlayInd]
-                    for j in range(DroppedCardInd,self.nCards-1):
-                        self.InformationMatrix[CurrentPlayer,j,'N'] = c(
-                                self.InformationMatrix[CurrentPlayer,j+1,'N'])
-                        self.InformationMatrix[CurrentPlayer,j,'S'] = c(
-                                self.InformationMatrix[CurrentPlayer,j+1,'S'])
-                    self.InformationMatrix[CurrentPlayer,self.nCards-1,'N'] = (
-                            c(self.NumberSet))
-                    self.InformationMatrix[CurrentPlayer,self.nCards-1,'S'] = (
-                            c(self.SuitSet))
+                    self.InformationMatrix[CurrentPlayer,
+                                           DroppedCardInd:self.nCards-1] = (
+                        self.InformationMatrix[CurrentPlayer,
+                                               DroppedCardInd+1:self.nCards])
+                    self.InformationMatrix[CurrentPlayer,self.nCards-1] = True
                 else:
                     raise NameError('Still to be implemented')
         # Raise exception if a mistake is made
@@ -434,32 +454,33 @@ class GeneralEncodingPlayer(AIPlayer):
     def CardCountInfoMat(self,r,Turn):
         # This function uses card counting methods to restrict the 
         # possibilities of the information matrix
-        Improvement = False
         CardCount = self.GetCountFromDiscard(r,Turn)
-        for i in range(self.nPlayers):
-            for j in range(self.nCards):
-                if (len(self.InformationMatrix[i,j,'N']) == 1 and
-                    len(self.InformationMatrix[i,j,'S']) == 1):
-                        CardVal = (self.InformationMatrix[i,j,'N'][0]
-                                    + self.InformationMatrix[i,j,'S'][0])
-                        CardCount[CardVal] -= 1
+        InfoMat = self.InformationMatrix[:,:self.nCards]
+        Known = np.sum(InfoMat,axis=(2,3)) == 1
+        CardCount = CardCount - np.sum(InfoMat[Known],axis=0)
         
-        for i in range(self.nPlayers):
-            for j in range(self.nCards):
-                N = self.InformationMatrix[i,j,'N']
-                S = self.InformationMatrix[i,j,'S']
-                if len(N) > 1 or len(S) > 1:
-                    PossibleSet = ([m[0] + m[1] for m in 
-                        list(it.product(N,S)) if 
-                        CardCount[m[0] + m[1]] > 0])
-                    Nnew = np.unique([m[0] for m in PossibleSet]).tolist()
-                    Snew = np.unique([m[1] for m in PossibleSet]).tolist()
-                    if len(Nnew) < len(N) or len(Snew) < len(S):
-                        Improvement = True
-                        self.InformationMatrix[i,j,'N'] = c(Nnew)
-                        self.InformationMatrix[i,j,'S'] = c(Snew)
-
-            return Improvement
+        # Only the cards of the first player are restricted. This is kept
+        # on purpose: the loop over players of the original (dictionary)
+        # version returned after the first player, and the codes and
+        # actions of the encoders depend on it. Restricting every player
+        # changes their games (test/gencoder_card_count.py pins this).
+        Cards = InfoMat[0]
+        Possible = Cards & (CardCount > 0)
+        Nnew = np.any(Possible,axis=1)
+        Snew = np.any(Possible,axis=2)
+        Improved = (np.sum(Cards,axis=(1,2)) > 1) & (
+            (np.sum(Nnew,axis=1) < np.sum(np.any(Cards,axis=1),axis=1)) |
+            (np.sum(Snew,axis=1) < np.sum(np.any(Cards,axis=2),axis=1)))
+        Cards[Improved] = Snew[Improved][:,:,None] & Nnew[Improved][:,None,:]
+        return bool(np.any(Improved))
+    
+    def PossibleNumbersAndSuits(self,Player,Card):
+        # Lists of the numbers and suits a card can still have
+        N = [M for m,M in enumerate(self.NumberSet) if 
+             np.any(self.InformationMatrix[Player,Card,:,m])]
+        S = [M for m,M in enumerate(self.SuitSet) if 
+             np.any(self.InformationMatrix[Player,Card,m,:])]
+        return N,S
     
     def CheckInfoMat(self,r):
         # Check to see if the information matrix is wrong, and if so raise an
@@ -467,15 +488,14 @@ class GeneralEncodingPlayer(AIPlayer):
         for i in range(self.nPlayers):
             for j in range(self.nCards):
                 if j < len(r.h[i].cards):
-                    N = self.InformationMatrix[i,j,'N']
-                    S = self.InformationMatrix[i,j,'S']
-                    PossibleSet = [m[0] + m[1] for m in list(it.product(N,S))]
-                    if r.h[i].cards[j]['name'] not in PossibleSet:
+                    CardIndex = self.CardIndex[r.h[i].cards[j]['name']]
+                    if not self.InformationMatrix[(i,j) + CardIndex]:
                         print(r.playHistory)
                         print(r.DropIndRecord)
                         for m in range(self.nCards):
-                            print(self.InformationMatrix[i,m,'N'],)
-                            print(self.InformationMatrix[i,m,'S'],)
+                            N,S = self.PossibleNumbersAndSuits(i,m)
+                            print(N,)
+                            print(S,)
                             print(' ' * 10,)
                         print('')
                         for m in range(self.nCards):
@@ -484,69 +504,61 @@ class GeneralEncodingPlayer(AIPlayer):
                         print('')
                         raise NameError('Error detected in the information matrix')
             
-    def ExpandCode(self,Code):
-        # Utility function, just converts a string into several lists
-        CodeList = Code.split('__')
-        TypeList = [i.split('_')[0] for i in CodeList]
-        ColList = [i.split('_')[1] for i in CodeList]
-        GroupSetList = [i.split('_')[2] for i in CodeList]
-        EvalSetList = [[['r'],['y'],['g'],['b'],['w']] if i == 
-                    '[[r],[y],[g],[b],[w]]' else eval(i) for i in GroupSetList]
-        EncodeBase = [len(i) for i in EvalSetList]
-        PossibleResultList = list(it.product(*[range(i) for i in EncodeBase]))
-        return (CodeList,TypeList,ColList,GroupSetList,EvalSetList,EncodeBase,
-                PossibleResultList)
-    
     def UpdateInformationMatrix(self,Hint,Code,HintingPlayer,Turn):
         # This is the function which performs the modular arithmetic back
         # calculation to convert a code and hint into the underlying encoded
         # information and transfers it into the information matrix.
         ActualResult = self.BackCalcHintedState(Hint,Code,HintingPlayer)
-        (CodeList,TypeList,ColList,GroupSetList,EvalSetList,EncodeBase,
-             PossibleResultList) = self.ExpandCode(Code)
         NonHintingIDs = [m for m in range(self.nPlayers) if m != HintingPlayer]
         OtherNonHintingIDs = [m for m in NonHintingIDs if m != self.SelfID]
         CodePosOtherNonHinting = [m for m,M in enumerate(NonHintingIDs) if M != self.SelfID]
-        for i,I in enumerate(CodeList):
-            CurrentColList = [int(m) for m in ColList[i].split(',')]
+        for i,I in enumerate(Code):
+            CurrentColList = [m[1] for m in I.Cards]
             CurrentOtherColList = [CurrentColList[m] for m in CodePosOtherNonHinting]
             OtherHandVals = []
             for j,J in enumerate(OtherNonHintingIDs):
                 # Within this loop "Val" refers to the index of the set which
                 # the card is known to belong
                 HandValue = self.HandHistory[Turn][J,CurrentOtherColList[j]]
-                if TypeList[i] == 'S':
+                if I.Type == 'S':
                     HandValue = HandValue[-1]
                 else:
                     HandValue = int(HandValue[:-1])
-                OtherHandVals.append(
-                 [m for m,M in enumerate(EvalSetList[i]) if HandValue in M][0])
+                OtherHandVals.append(I.GroupOf[HandValue])
             if self.SelfID != HintingPlayer:
                 SelfVal = int((ActualResult[i] - np.sum(OtherHandVals)) 
-                            % len(EvalSetList[i]))
+                            % I.Base)
             OtherHandValsRev = c(OtherHandVals)
             OtherHandValsRev.reverse()
             NonHintingVals = ([OtherHandValsRev.pop() if M != self.SelfID 
                                 else SelfVal for M in NonHintingIDs])
             for j,J in enumerate(NonHintingIDs):
-                RestrictedSet = EvalSetList[i][NonHintingVals[j]]
-                RestrictedSet = [str(m) for m in RestrictedSet]
-                self.InformationMatrix[J,CurrentColList[j],TypeList[i]] = (
-                    list(set(self.InformationMatrix[J,CurrentColList[j],
-                    TypeList[i]]).intersection(RestrictedSet)))
+                RestrictedSet = I.Groups[NonHintingVals[j]]
+                if I.Type == 'S':
+                    Allowed = np.array([m in RestrictedSet 
+                                        for m in self.SuitSet])
+                    self.InformationMatrix[J,CurrentColList[j]] &= (
+                        Allowed[:,None])
+                elif CurrentColList[j] == -1:
+                    # The number of the dummy card is not part of any group,
+                    # so it has no possible numbers left once a numeric code
+                    # points to it (it keeps its suit, see EvaluateCandidates)
+                    self.InformationMatrix[J,-1] = False
+                else:
+                    Allowed = np.array([int(m) in RestrictedSet 
+                                        for m in self.NumberSet])
+                    self.InformationMatrix[J,CurrentColList[j]] &= (
+                        Allowed[None,:])
             
     def BackCalcHintedState(self,Hint,Code,HintingPlayer):
         # Converts the actual hint (i.e. player 3 green) into the intended
         # vector of numbers (i.e. [2,0,0])
         OtherIDs = [m for m in range(self.nPlayers) if m != HintingPlayer]
-        (CodeList,TypeList,ColList,GroupSetList,EvalSetList,EncodeBase,
-             PossibleResultList) = self.ExpandCode(Code)
-        NumSuitSet = c(self.NumberSet)
-        [NumSuitSet.append(m) for m in self.SuitSet]
-        ResultSelection = ([m for m,M in enumerate(list(
-                            it.product(OtherIDs,NumSuitSet))) 
-                            if np.array_equal(M,Hint)][0])
-        ActualResult = PossibleResultList[ResultSelection]
+        NumSuitSet = self.NumberSet + self.SuitSet
+        # Position of the hint in it.product(OtherIDs,NumSuitSet)
+        ResultSelection = (OtherIDs.index(Hint[0]) * len(NumSuitSet) + 
+                           NumSuitSet.index(Hint[1]))
+        ActualResult = Code.Decode(ResultSelection)
         return ActualResult
         
     def DetermineHint(self,Code,HintingPlayer,Turn):
@@ -554,38 +566,41 @@ class GeneralEncodingPlayer(AIPlayer):
         # determines what hint to give to provide the information corresponding
         # to the selected code.
         OtherIDs = [m for m in range(self.nPlayers) if m != HintingPlayer]
-        (CodeList,TypeList,ColList,GroupSetList,EvalSetList,EncodeBase,
-             PossibleResultList) = self.ExpandCode(Code)
         ActualResult = []
-        for i,I in enumerate(CodeList):
-            Columns = [int(m) for m in ColList[i].split(',')]
-            PositionInSetList = []
-            for j,J in enumerate(Columns):
-                RawVal = (self.HandHistory[Turn][OtherIDs[j],J]
-                            [0 if TypeList[i] == 'N' else 1])
-                if TypeList[i] == 'N':
+        for I in Code:
+            RawVals = []
+            for J in I.Cards:
+                RawVal = (self.HandHistory[Turn][J[0],J[1]]
+                            [0 if I.Type == 'N' else 1])
+                if I.Type == 'N':
                     RawVal = int(RawVal)
-                PositionInSetList.append([m for m,M in enumerate(EvalSetList[i]) 
-                                    if RawVal in M][0])
-            ActualResult.append(
-                np.sum(PositionInSetList) % len(EvalSetList[i]))
-        ResultSelection = ([m for m,M in enumerate(PossibleResultList) 
-                            if np.array_equal(M,ActualResult)][0])
+                RawVals.append(RawVal)
+            ActualResult.append(I.Result(RawVals))
+        ResultSelection = Code.Encode(ActualResult)
                                 
-        NumSuitSet = c(self.NumberSet)
-        [NumSuitSet.append(m) for m in self.SuitSet]
-        Hint = list(it.product(OtherIDs,NumSuitSet))[ResultSelection]
+        NumSuitSet = self.NumberSet + self.SuitSet
+        # Element ResultSelection of it.product(OtherIDs,NumSuitSet)
+        Hint = (OtherIDs[ResultSelection // len(NumSuitSet)],
+                NumSuitSet[ResultSelection % len(NumSuitSet)])
         return Hint
         
-    def GenerateCode(self,TurnNumber,HintingPlayer,CardNumberGroups,progress):
+    def GenerateCode(self,TurnNumber,HintingPlayer,CardNumberGroups,progress,
+                     Budget=None):
         # Iterates through a number of candidate codes (using common seed 
-        # Monte Carlo) and selects the best based on some evaluation criteria
+        # Monte Carlo) and selects the best based on some evaluation criteria.
+        # Candidates are drawn in rounds of nMCCandidates. Without a time
+        # limit there is one round. With one, the hinting player keeps adding
+        # rounds while it has time and records the number of candidates in
+        # Budget.samples; the other players then draw the same candidates.
+        # Every player evaluates each hint again in its next turn, so the
+        # hinting player only uses 1/(nPlayers+1) of its budget here.
+        # Combinations whose bound (see ReductionBound) can't beat the best
+        # candidate so far are not evaluated, and the search ends once a
+        # candidate reaches the best bound. This never changes the chosen
+        # code, except that candidates which beat it by less than
+        # BoundTolerance (rounding) may be passed over.
         OtherIDs = [m for m in range(self.nPlayers) if m != HintingPlayer]
         self.StartRandom(self.RandomSeedList[TurnNumber])
-        SuitSetStr = ''
-        for i in self.SuitSet:
-            SuitSetStr += '[' + i +']' + ','
-        SuitSetStr = '[' + SuitSetStr[:-1] +']'
         
         # For the various numerical subset groupings (including the trivial 
         # case where each value is its own subset) there is a number of DoF 
@@ -607,114 +622,230 @@ class GeneralEncodingPlayer(AIPlayer):
                     ValidCombinations.append(j)
         
         nMCPerValidCombo = int(self.nMCCandidates/len(ValidCombinations))
-            
-        CodeCandidateList = []
-        for i in ValidCombinations:
-            for k in range(nMCPerValidCombo):
-                TrialStr = ''
-                for j in i:
-                    TrialStr += j[-1]
-                    TrialStr += '_'
-                    ColComboChoice = random.randint(0,
-                                            self.ColumnCombinations.shape[0]-1)
-                    Cols =c(self.ColumnCombinations[ColComboChoice,:]).tolist()
-                    ColInPlay = ([self.InPlay[TurnNumber][M,Cols[m]] 
-                                    for m,M in enumerate(OtherIDs)])
-                    for l,L in enumerate(ColInPlay):
-                        if not L:
-                            Cols[l] = -1
-                    TrialStr +=  re.sub(' ','',str(Cols)[1:-1])
-                    TrialStr += '_'
-                    if j[-1] == 'S':
-                        TrialStr += SuitSetStr
-                    else:
-                        TrialStr += re.sub(' ','',str(
-                                    CardNumberGroups[int(j[:-1])]))
-                    TrialStr += '__'
-                CodeCandidateList.append(TrialStr[:-2])          
-    
-        BestReduction = 0
-        BestCode = CodeCandidateList[0]
-        for i,I in enumerate(CodeCandidateList):
-            Reduction = self.EvaluateCode(OtherIDs,I,progress)
-            if  Reduction > BestReduction:
-                BestReduction = Reduction
-                BestCode = I
+        nRounds = None
+        if Budget is not None and Budget.samples is not None:
+            nRounds = Budget.samples // (nMCPerValidCombo*len(ValidCombinations))
+        elif Budget is not None and Budget.seconds is not None:
+            # Counted from the start of the turn, so the work done before
+            # the search (e.g. updating the information matrix) is included
+            SearchEnd = Budget.start + Budget.seconds/(self.nPlayers+1.)
+
+        # Candidate codes are kept as integer arrays rather than strings. For
+        # every valid combination, CandidateCols[k,j,:] are the columns that
+        # code j of candidate k points to in the hands of OtherIDs (-1 if the
+        # card is not in play). The random numbers are drawn in the same order
+        # as when the candidates were built one at a time.
+        InPlay = np.zeros([self.nPlayers,self.nCards],dtype=bool)
+        for j in range(self.nPlayers):
+            for k in range(self.nCards):
+                InPlay[j,k] = self.InPlay[TurnNumber][j,k]
+        nColumnCombinations = self.ColumnCombinations.shape[0]
+        State = self.EvaluationState(progress)
+        Bounds = [self.ReductionBound(OtherIDs,i,CardNumberGroups,State)
+                  for i in ValidCombinations]
+        # The first candidate with the largest reduction is picked, or the
+        # very first one if no reduction is positive (nan is never picked)
+        BestIndex = 0
+        BestReduction = 0.
+        CandidateColsList = []
+        RoundsDone = 0
+        Done = False
+        while not Done:
+            LastRound = ((nRounds is not None and RoundsDone + 1 == nRounds)
+                         or (nRounds is None and 
+                             (Budget is None or Budget.seconds is None)))
+            for m,i in enumerate(ValidCombinations):
+                # The random numbers are drawn even if the candidates are not
+                # evaluated, so later candidates don't depend on the bounds
+                ColComboChoice = np.array([[random.randint(0,
+                                    nColumnCombinations-1) for j in i] 
+                                    for k in range(nMCPerValidCombo)],
+                                    dtype=int).reshape(nMCPerValidCombo,len(i))
+                CandidateCols = self.ColumnCombinations[ColComboChoice]
+                CandidateCols[~InPlay[OtherIDs,CandidateCols]] = -1
+                CandidateColsList.append(CandidateCols)
+                if Bounds[m] + self.BoundTolerance > BestReduction:
+                    Reduction = self.EvaluateCandidates(OtherIDs,i,
+                                    CardNumberGroups,CandidateCols,State)
+                    if not np.all(np.isnan(Reduction)):
+                        k = int(np.nanargmax(Reduction))
+                        if Reduction[k] > BestReduction:
+                            BestReduction = Reduction[k]
+                            BestIndex = ((len(CandidateColsList) - 1) * 
+                                         nMCPerValidCombo + k)
+                if BestReduction > 0:
+                    if BestReduction >= max(Bounds) - self.BoundTolerance:
+                        Done = True
+                    elif LastRound and m + 1 < len(Bounds) and (
+                            max(Bounds[m+1:]) + self.BoundTolerance <= 
+                            BestReduction):
+                        Done = True
+                if Done:
+                    break
+            RoundsDone += 1
+            if Done:
+                pass
+            elif nRounds is not None:
+                Done = RoundsDone == nRounds
+            elif Budget is None or Budget.seconds is None:
+                Done = True
+            elif time.time() >= SearchEnd or Budget.expired():
+                Budget.exhausted = True
+                Done = True
+        if Budget is not None and Budget.samples is None:
+            Budget.samples = RoundsDone * nMCPerValidCombo * len(ValidCombinations)
+
+        Combination = ValidCombinations[(BestIndex // nMCPerValidCombo) %
+                                        len(ValidCombinations)]
+        Cols = CandidateColsList[BestIndex // nMCPerValidCombo][
+                    BestIndex % nMCPerValidCombo]
+
+        CodeParts = []
+        for j,J in enumerate(Combination):
+            if J[-1] == 'S':
+                Groups = [[m] for m in self.SuitSet]
+            else:
+                Groups = [[int(m) for m in M] 
+                          for M in CardNumberGroups[int(J[:-1])]]
+            CodeParts.append(CodePart(J[-1],zip(OtherIDs,Cols[j]),Groups))
+        BestCode = HintCode(CodeParts)
 
         self.EndRandom()
         return BestCode
 
-    def EvaluateCode(self,OtherIDs,Code,progress):
-        # This function takes a code and returns an evaluation of the merit of
-        # said code. Currently this takes the form of a degree of freedom (DoF)
-        # minimization weighted by some coefficients (AMaster)
-    
+    def EvaluationState(self,progress):
+        # The weights and card information used to evaluate candidates, which
+        # are the same for the whole turn.
+
         # Weighting coefficients for determining set reduction. Currently just
         # naively the number of each card number in the deck
-        AMaster = [3,2,2,2,1]
+        AMaster = np.array([3,2,2,2,1],dtype=float)
         P,D,O = self.GetPDO(progress)
         for i in P:
             AMaster[i-1] = AMaster[i-1] * 2.
         for i in D:
             AMaster[i-1] = AMaster[i-1] / 2.
-        
-        DoFReductionList = []
-        
-        CodeList = Code.split('__')
-        TypeList = [i.split('_')[0] for i in CodeList]
-        ColList = [i.split('_')[1] for i in CodeList]
-        GroupSetList = [i.split('_')[2] for i in CodeList]
-        
-        NumIndex = [i for i,I in enumerate(TypeList) if I == 'N']
-        SuitIndex = [i for i,I in enumerate(TypeList) if I == 'S']
-        
-        # Calculate numeric DoF reduction
+
+        # InfoN[player,column,number-1] and InfoS[player,column,suit] are 
+        # true if the card can have that number or suit. Column -1 is the 
+        # dummy r1, whose suit stays known after it has lost its number.
+        InfoN = np.any(self.InformationMatrix,axis=2)
+        InfoS = np.any(self.InformationMatrix,axis=3)
+        InfoS[:,-1] = False
+        InfoS[:,-1,self.CardIndex['1r'][0]] = True
+        return AMaster,InfoN,InfoS
+
+    def NumericGroups(self,Combination,CardNumberGroups):
+        # The positions of the numeric codes in Combination, and 
+        # SameGroup[k,v,w], which is true if numbers v+1 and w+1 are in the 
+        # same set of numeric code k
+        NumIndex = [i for i,I in enumerate(Combination) if I[-1] == 'N']
+        SameGroup = np.zeros([len(NumIndex),len(self.NumberSet),
+                              len(self.NumberSet)],dtype=bool)
+        for k,K in enumerate(NumIndex):
+            for m in CardNumberGroups[int(Combination[K][:-1])]:
+                for v in m:
+                    for w in m:
+                        SameGroup[k,v-1,w-1] = True
+        return NumIndex,SameGroup
+
+    def ReductionBound(self,OtherIDs,Combination,CardNumberGroups,State):
+        # An upper bound of the reduction (see EvaluateCandidates) of every
+        # candidate for this combination of code types. The numeric codes
+        # that point to the same card in a hand restrict it together, and the
+        # best they can do is bounded by the best card for them. Trying every
+        # way to split the codes over the cards of each hand then bounds the
+        # numeric terms. Every suit code adds at most one card per hand.
+        AMaster,InfoN,InfoS = State
+        NumIndex,SameGroup = self.NumericGroups(Combination,CardNumberGroups)
+        nSuitCodes = len(Combination) - len(NumIndex)
+
+        Bound = np.zeros(len(OtherIDs))
         if len(NumIndex) > 0:
-            NumColList = [ColList[i].split(',') for i in NumIndex]
-            CodeNumSets = [eval(GroupSetList[i]) for i in NumIndex]
-            NumColListSwitch = ([[int(NumColList[i][j]) 
-                                for i in range(len(NumColList))] 
-                                for j in range(len(NumColList[0]))])
-            # This is the list of columns in each row that I need to check to
-            # determine the reduction in uncertainty for a given code
-            ColCheckList = [list(set(i)) for i in NumColListSwitch]
-            
-            for i,I in enumerate(ColCheckList):
-                for j,J in enumerate(I):
-                    InitialInfoSet = [int(m) for m in
-                                     self.InformationMatrix[OtherIDs[i],J,'N']]
-                    AParticular = [AMaster[m-1] for m in InitialInfoSet]
-                    nPosFinal = []
-                    for PosValInd,PossibleValue in enumerate(InitialInfoSet):
-                        InfoSetRestrict = set(c(InitialInfoSet))
-                        for k,K in enumerate(NumColListSwitch[i]):
-                            if K == J:
-                                InfoSetRestrict = InfoSetRestrict.intersection(
-                                            [m for m in CodeNumSets[k] if 
-                                            PossibleValue in m][0])
-                       
-                        nPosFinal.append(len(InfoSetRestrict))
-                    DoFReduction = len(InitialInfoSet) - (
-                        1./np.sum(AParticular)*np.sum([AParticular[m]*
-                        nPosFinal[m] for m in range(len(AParticular))]))
-                    DoFReductionList.append(DoFReduction)
-                    
-        # Calculate suit DoF reduction
-        if len(SuitIndex) > 0:
-            SuitColList = [ColList[i].split(',') for i in SuitIndex]
-            SuitColListSwitch = ([[int(SuitColList[i][j]) 
-                                for i in range(len(SuitColList))] 
-                                for j in range(len(SuitColList[0]))])
-            ColCheckList = [list(set(i)) for i in SuitColListSwitch]
-            for i,I in enumerate(ColCheckList):
-                for j,J in enumerate(I):
-                    InitialInfoSet = [m for m in
-                                     self.InformationMatrix[OtherIDs[i],J,'S']]
-                    DoFReduction = len(InitialInfoSet) - 1
-                    DoFReductionList.append(DoFReduction)
-        return np.sum(DoFReductionList)
+            Subsets = [S for n in range(1,len(NumIndex)+1)
+                       for S in it.combinations(range(len(NumIndex)),n)]
+            SubsetGroup = np.array([np.logical_and.reduce(SameGroup[list(S)],
+                                    axis=0) for S in Subsets])
+            Initial = InfoN[OtherIDs]
+            nPosFinal = np.sum(SubsetGroup[:,None,None,:,:] & 
+                               Initial[None,:,:,None,:],axis=4)
+            AParticular = AMaster[None,None,:] * Initial
+            with np.errstate(divide='ignore',invalid='ignore'):
+                Term = np.sum(Initial,axis=2)[None,:,:] - (
+                    np.sum(AParticular[None,:,:,:]*nPosFinal,axis=3) / 
+                    np.sum(AParticular,axis=2)[None,:,:])
+            # Cards without any possible number give nan, and such candidates
+            # are never picked
+            Term[np.isnan(Term)] = -np.inf
+            BestTerm = np.max(Term,axis=2)
+            SubsetIndex = dict((S,n) for n,S in enumerate(Subsets))
+            Bound += np.max([np.sum([BestTerm[SubsetIndex[S]] for S in P],
+                                    axis=0)
+                             for P in SetPartitions(len(NumIndex))],axis=0)
+        if nSuitCodes > 0:
+            SuitTerm = np.sort(np.sum(InfoS[OtherIDs],axis=2) - 1.,axis=1)
+            Bound += np.sum(SuitTerm[:,-nSuitCodes:],axis=1)
+        return float(np.sum(Bound))
+
+    def EvaluateCandidates(self,OtherIDs,Combination,CardNumberGroups,
+                           CandidateCols,State):
+        # This function takes all candidate codes for one combination of
+        # code types and returns an evaluation of the merit of each of them.
+        # Currently this takes the form of a degree of freedom (DoF)
+        # minimization weighted by some coefficients (AMaster). CandidateCols
+        # is an nCandidates x nCodes x nOtherPlayers array of columns, and
+        # State comes from EvaluationState.
+        AMaster,InfoN,InfoS = State
+        nCandidates = CandidateCols.shape[0]
+        NumIndex,SameGroup = self.NumericGroups(Combination,CardNumberGroups)
+        SuitIndex = [i for i,I in enumerate(Combination) if I[-1] == 'S']
 
+        # Every (player, column) pair contributes one term to the reduction.
+        # The terms are listed in the same order as they used to be summed
+        # (numeric codes first, per player, columns ascending with the dummy
+        # column last), which keeps the floating point sums identical.
+        ColumnOrder = list(range(self.nCards)) + [-1]
+        Terms = []
+        Present = []
+        if len(NumIndex) > 0:
+            NumCols = CandidateCols[:,NumIndex,:]
+            for i in range(len(OtherIDs)):
+                for J in ColumnOrder:
+                    PointsToJ = NumCols[:,:,i] == J
+                    Initial = InfoN[OtherIDs[i],J]
+                    # Restricted[c,v,w]: w is still possible for candidate c
+                    # if the card has number v+1
+                    Restricted = np.logical_and.reduce(SameGroup[None,:,:,:] |
+                                    ~PointsToJ[:,:,None,None],axis=1)
+                    Restricted = Restricted & Initial[None,None,:]
+                    nPosFinal = np.sum(Restricted,axis=2)
+                    AParticular = AMaster[Initial]
+                    with np.errstate(divide='ignore',invalid='ignore'):
+                        DoFReduction = np.sum(Initial) - (
+                            1./np.sum(AParticular)*np.sum(AParticular[None,:]*
+                            nPosFinal[:,Initial],axis=1))
+                    Terms.append(DoFReduction)
+                    Present.append(np.any(PointsToJ,axis=1))
+        if len(SuitIndex) > 0:
+            SuitCols = CandidateCols[:,SuitIndex,:]
+            for i in range(len(OtherIDs)):
+                for J in ColumnOrder:
+                    Terms.append(np.full(nCandidates,
+                                np.sum(InfoS[OtherIDs[i],J]) - 1,dtype=float))
+                    Present.append(np.any(SuitCols[:,:,i] == J,axis=1))
+        Terms = np.array(Terms).T
+        Present = np.array(Present).T
 
+        # Move the terms of each candidate to the front (keeping their order)
+        # and sum candidates with the same number of terms together
+        Order = np.argsort(~Present,axis=1,kind='mergesort')
+        Terms = Terms[np.arange(nCandidates)[:,None],Order]
+        nTerms = np.sum(Present,axis=1)
+        Reduction = np.zeros(nCandidates)
+        for n in np.unique(nTerms):
+            Rows = nTerms == n
+            Reduction[Rows] = np.sum(Terms[Rows,:n],axis=1)
+        return Reduction
 
     def Startup(self,r):
         # Currently rainbow compatability is not implemented
@@ -747,7 +878,8 @@ class GeneralEncodingPlayer(AIPlayer):
     
     def StaticCombinatorics(self):
         # This function performs the combinatoric math which only needs to be
-        # done once (even across replicate games)
+        # done once (even across replicate games and players, the table is
+        # shared by the whole process)
     
         # This array represents the combination of cards in other players'
         # hands. Each row is a different possibility. The columns are 
@@ -763,9 +895,7 @@ class GeneralEncodingPlayer(AIPlayer):
         # determined cards is fine; by contrast encoding a number less than
         # nPlayers - 1 in a single value would further conbinatorically grow
         # the number of choices. (Unnecessarily)
-        IndexVector = [i for i in range(self.nCards)]
-        self.ColumnCombinations = np.array(list(it.product(IndexVector,
-                                                    repeat=self.nPlayers-1)))
+        self.ColumnCombinations = ColumnCombinations(self.nPlayers,self.nCards)
                                                     
     def GetPDO(self,progress):
         # Utility to get the set of playable (P), discardable (D),
@@ -861,12 +991,13 @@ class GeneralEncodingPlayer(AIPlayer):
         S = [['' for m in range(self.nCards)] for n in range(self.nPlayers)]
         for i in playerRange:
             for j in range(self.nCards):
+                Numbers,Suits = self.PossibleNumbersAndSuits(i,j)
                 N[i][j] += '['
-                for m in self.InformationMatrix[i,j,'S']:
+                for m in Suits:
                     N[i][j] += m + ','
                 N[i][j] = N[i][j][:-1] + ']'
                 S[i][j] = '['
-                for m in self.InformationMatrix[i,j,'N']:
+                for m in Numbers:
                     S[i][j] += m + ','
                 S[i][j] = S[i][j][:-1] + ']'
         NStrLenList = []
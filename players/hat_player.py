@@ -18,11 +18,12 @@ from copy import copy
 # If true, the cluer can tell the player to discard, including cards which might be useful later
 # If false, the clued player can clue instead of discarding
 MODIFIEDACTION = True
+# If true, the seats share one HatCommonKnowledge: the last action is interpreted once per turn,
+# and the standard discards are computed once.
+# If false, every seat has its own HatCommonKnowledge, interprets the last action itself and
+# recomputes the standard discards (this should not change any decision)
+SHAREDKNOWLEDGE = True
 DEBUG = True
-DEBUGVALUES = ['play 5 instead', 'someone cannot clue, but I have a play', 'unsafe discard at 0 clues', 'safe discard at 0 clues', \
-    'clue blocked', 'I misplayed', 'BUG: instructed to discard at 8 clues', 'BUG: instructed to clue with 0 clues', 'instructing to discard critical card',
-    'player did wrong action at >0 clues', 'player did not play', 'player played wrong card', 'wrong action: discard at 0 clues', 'someone performed the wrong action',
-    'player played when not instructed to', 'we can use the clue from a 5 to reach another player in endgame', 'yolo', 'successful yolo', 'unsuccessful yolo']
 
 
 ### General utility functions, maybe these should be moved to bot_utils.py
@@ -36,12 +37,54 @@ def list_between(begin, end, r):
         return list(range(begin, end+1))
     return list(range(begin, r.nPlayers)) + list(range(end+1))
 
+class HatCommonKnowledge(object):
+    """The public part of the hat convention, shared by all seats at the table.
+
+    Every seat interprets the same public actions, and standard discards only depend
+    on the hand of the discarding player, which all other seats can see. This object
+    computes these things once per turn, and every HatPlayer layers its own view
+    (which excludes its own hand) on top of it."""
+
+    def __init__(self):
+        self.turnNumber = -1
+        self.safe_discards = {}
+
+    def start_turn(self, interpreter, r):
+        """Interpret the last action. This is called once per turn, before any
+        seat calls `think_at_turn_start`."""
+        self.turnNumber = r.turnNumber
+        self.player = prev(r.whoseTurn, r)
+        self.rawaction = r.playHistory[-1]
+        self.action, self.card = interpreter.interpret_external_action(self.rawaction)
+        self.cardname = self.card['name'] if self.action[0] != 'hint' else ""
+        self.cluevalue = None
+        self.discarded = None
+        if self.action[0] == 'hint':
+            target, value = self.rawaction[1]
+            self.cluevalue = interpreter.clue_to_number(target, value, self.player, r)
+            self.discarded = r.discardpile.copy()
+
+    def safe_discard(self, interpreter, cards, progress, r):
+        """The standard discard of `cards`, computed only once for all seats.
+        Hands and progress only change by a single card per turn, so we keep the
+        results for the whole game (a new object is made every game).
+        Only call this on a hand which is visible to `interpreter`."""
+        if not SHAREDKNOWLEDGE:
+            return interpreter.safe_discard(cards, progress)
+        key = (tuple([card['cardNo'] for card in cards]), tuple(progress.values()))
+        if key not in self.safe_discards:
+            self.safe_discards[key] = interpreter.safe_discard(cards, progress)
+        return self.safe_discards[key]
+
 class HatPlayer(AIPlayer):
 
     @classmethod
     def get_name(cls):
         return 'hat'
 
+    # Needs the common knowledge of the whole round
+    canPlayMidRound = False
+
     ### utility functions specific to this strategy
 
     def number_to_action(self, n):
@@ -115,7 +158,7 @@ class HatPlayer(AIPlayer):
                     clue = self.clue_not_newest(cards, r)
                     if clue: return (target, clue)
             # this can theoretically happen, but will never happen in practice
-            if DEBUG: r.debug['clue blocked'] += 1
+            if DEBUG: r.counters.add('clue blocked')
             target = next(me, r)
             return (target, r.h[target].cards[-1]['name'][0])
         assert target != me
@@ -129,7 +172,7 @@ class HatPlayer(AIPlayer):
         if x == 2:
             clue = self.clue_not_newest(cards, r)
             if clue: return (target, clue)
-            if DEBUG: r.debug['clue blocked'] += 1
+            if DEBUG: r.counters.add('clue blocked')
             # if the clue is blocked, we currently just return another clue.
             # todo: We should add a list of blocked clues to modified_action, and give the player any non-blocked action
             clue = cards[-1]['name'][0]
@@ -169,13 +212,15 @@ class HatPlayer(AIPlayer):
 
     ### Initialization functions
 
-    def initialize_memory(self, r):
+    def initialize_memory(self, r, common):
         """Initializes the memory of a player.
 
         These are all the variables that players have set between turns,
         to interpret future clues and give clues myself. These will be updated by the
         function 'think_at_turn_start', which is executed for every player at the start of every turn,
-        and also when giving a clue."""
+        and also when giving a clue.
+        `common` is the HatCommonKnowledge object shared by all players."""
+        self.common = common
         # do I have a card which can be safely discarded?
         # todo: make this a list of list, with a list of known useless cards for each player,
             # stack safe discards when you would currently give no new information to a player
@@ -227,16 +272,17 @@ class HatPlayer(AIPlayer):
         and interpret a clue at the start of the turn of the player first targeted by that clue.
         This function accesses only information known to `me`."""
         assert self == r.PlayerRecord[me]
-        player = prev(r.whoseTurn, r)
-        rawaction = r.playHistory[-1]
-        action, card = self.interpret_external_action(rawaction)
-        cardname = card['name'] if action[0] != 'hint' else ""
+        common = self.common
+        assert common.turnNumber == r.turnNumber
+        player = common.player
+        action, card = common.action, common.card
+        cardname = common.cardname
         for d in self.given_clues[1:]:
             d['plays'][player] = (action, card)
         if me == player:
             if action[0] != 'play': return
             if card['misplayed'] and DEBUG:
-                r.debug['I misplayed'] += 1
+                r.counters.add('I misplayed')
             self.resolve_clue(action, cardname, player, r)
             if self.given_clues: # this can be false if you yolo in the endgame
                 self.resolve_given_clues(me, r)
@@ -254,9 +300,9 @@ class HatPlayer(AIPlayer):
                     exp_action = self.next_player_actions[diff]
                     if not (exp_action == action or (exp_action[0] == 'discard' and action[0] == 'hint')):
                         if action[0] == 'discard' and exp_action[0] == 'hint' and r.hints == 1:
-                            r.debug['wrong action: discard at 0 clues'] += 1
+                            r.counters.add('wrong action: discard at 0 clues')
                         else:
-                            r.debug['player did wrong action at >0 clues'] += 1
+                            r.counters.add('player did wrong action at >0 clues')
                             # print(me, "thinks",player,"who did", action,"should do", exp_action, "other actions:",self.next_player_actions, "hints",r.hints, "turnnumber",r.turnNumber)
                             # r.debug['stop'] = 0
 
@@ -269,9 +315,9 @@ class HatPlayer(AIPlayer):
                 else:
                     if DEBUG:
                         if action[0] != 'play':
-                            r.debug['player did not play'] += 1
+                            r.counters.add('player did not play')
                         else:
-                            r.debug['player played wrong card'] += 1
+                            r.counters.add('player played wrong card')
                     # print(me, "thinks that player", player, "didn't play the right card. He did",action,"cardname",cardname,"dics",
                     #     self.player_to_card,self.card_to_player,"current hand",names(r.h[player].cards))
                     cardname = self.player_to_card[player][1]
@@ -284,13 +330,12 @@ class HatPlayer(AIPlayer):
                     self.clued_progress_current[cardname[1]] = r.progress[cardname[1]]
                     self.clued_progress[cardname[1]] = r.progress[cardname[1]]
             # elif action[0] == 'play' and (player - me - 1) % r.nPlayers < len(self.next_player_actions) and DEBUG:
-            #     r.debug['player played when not instructed to'] += 1 # if this actually happens, we should modify progress
+            #     r.counters.add('player played when not instructed to') # if this actually happens, we should modify progress
 
         if action[0] != 'hint':
             return
-        target, value = rawaction[1]
-        cluevalue = self.clue_to_number(target, value, player, r)
-        info = {'value':cluevalue, 'cluer':player, 'plays':{}, 'discarded':r.discardpile.copy()}
+        # the discard pile is shared between all players, none of them modifies it
+        info = {'value':common.cluevalue, 'cluer':player, 'plays':{}, 'discarded':common.discarded}
         self.given_clues.append(info)
         if len(self.given_clues) == 1:
             self.initialize_given_clue(player, me, r)
@@ -319,8 +364,8 @@ class HatPlayer(AIPlayer):
                 self.clued_progress_current[cardname[1]] = int(cardname[0])
         if DEBUG and action[0] != 'hint' and action[1] < len(r.h[player].cards):
             card = r.h[player].cards[action[1]]
-            if card['name'] == cardname:
-                s = ('note', self.me, card['cardNo'])
+            s = ('note', self.me, card['cardNo'])
+            if card['name'] == cardname and s in r.debug: # Notes are only kept for log.json
                 if r.debug[s]:
                     r.debug[s] += ' | '
                 r.debug[s] += 't' + str(r.turnNumber + 1) + ': ' + action[0]
@@ -369,7 +414,7 @@ class HatPlayer(AIPlayer):
         self.modified_player = i
         # print(me,"thinks",cluer,"->",self.modified_player,"-",self.player_to_card) # I think this works now, but maybe double check
         # find out expected discards:
-        self.expected_discards = {i:self.safe_discard(self.recover_hand(i, r), self.clued_progress) for i in range(r.nPlayers) if i != me and i != cluer}
+        self.expected_discards = {i:self.common.safe_discard(self, self.recover_hand(i, r), self.clued_progress, r) for i in range(r.nPlayers) if i != me and i != cluer}
 
         # Reset some variables in my memory.
         self.next_player_actions = []
@@ -433,7 +478,7 @@ class HatPlayer(AIPlayer):
             self.given_clues[0]['value'] = (self.given_clues[0]['value'] - value) % 9
             if DEBUG and next(me, r) == r.whoseTurn and self.given_clues[0]['value'] != 0:
                 # this can happen if someone didn't perform the right action, or the cluer didn't give the correct clue
-                r.debug['someone performed the wrong action'] += 1
+                r.counters.add('someone performed the wrong action')
             return
         # If I just played, the modified player might be after me. In that case,
         # I now need to determine the action assigned to the modified player
@@ -495,7 +540,7 @@ class HatPlayer(AIPlayer):
             wanttoplay = playableCards[0]
             return 'play', cards.index(wanttoplay)
         # I cannot play
-        return self.safe_discard(cards, progress)
+        return self.common.safe_discard(self, cards, progress, r)
 
     def want_to_play(self, cluer, player, dont_play, progress, dic, cardname, r):
         """Do I want to play cardname in standard_action?"""
@@ -597,11 +642,11 @@ class HatPlayer(AIPlayer):
                         if card['name'][0] == '5']
                 if playablefives:
                     if DEBUG:
-                        r.debug['play 5 instead'] += 1
+                        r.counters.add('play 5 instead')
                     return 'play', cards.index(playablefives[0])
                 else:
                     if DEBUG:
-                        r.debug["someone cannot clue, but I have a play"] += 1
+                        r.counters.add("someone cannot clue, but I have a play")
                     if self.endgame <= 0:
                         action = self.safe_discard(cards, progress)
                         if action[0] == 'discard': return action
@@ -687,7 +732,7 @@ class HatPlayer(AIPlayer):
         if is_between(playing_player, self.modified_player, useful_players[0]):
             needed_hints -= 1
             if DEBUG:
-                r.debug['we can use the clue from a 5 to reach another player in endgame'] += 1
+                r.counters.add('we can use the clue from a 5 to reach another player in endgame')
             #this seems to rarely happen
             #r.debug['stop'] = 0
             #print("one fewer")
@@ -732,7 +777,7 @@ class HatPlayer(AIPlayer):
         """Find the card with the highest rank card to discard.
         This function is only called when all cards are critical."""
         if DEBUG:
-            r.debug['instructing to discard critical card'] += 1
+            r.counters.add('instructing to discard critical card')
         return 'discard', cards.index(find_highest(cards))
 
     ### The main function which is called every turn
@@ -748,22 +793,19 @@ class HatPlayer(AIPlayer):
         if r.turnNumber == 0:
             if r.nPlayers <= 3:
                 raise NameError('This AI works only with at least 4 players.')
-            if DEBUG:
-                for s in DEBUGVALUES:
-                    if s not in r.debug:
-                        r.debug[s] = 0
-                # for i in [0, 1]:
-                #     for j in range(4):
-                #         s = 'yolo: played ' + str(i) + ', correct was ' + str(j)
-                #         if s not in r.debug:
-                #             r.debug[s] = 0
+            common = HatCommonKnowledge()
             for i in range(n):
                 # initialize variables which contain the memory of this player.
                 # These are updated after every move of any player
-                r.PlayerRecord[i].initialize_memory(r)
+                r.PlayerRecord[i].initialize_memory(r, common if SHAREDKNOWLEDGE else HatCommonKnowledge())
         else:
             # everyone takes some time to think about the meaning of previously
-            # given clues
+            # given clues. The public part of this is only done once, unless every seat has its own.
+            if SHAREDKNOWLEDGE:
+                self.common.start_turn(self, r)
+            else:
+                for i in range(n):
+                    r.PlayerRecord[i].common.start_turn(r.PlayerRecord[i], r)
             for i in range(n):
                 r.PlayerRecord[i].think_at_turn_start(i, r)
         # Is there a clue aimed at me?
@@ -779,31 +821,31 @@ class HatPlayer(AIPlayer):
             if self.useless_card is not None and self.useless_card in r.h[me].cards and not r.h[me].cards.index(self.useless_card):
                 slot = 1
             if DEBUG:
-                r.debug['yolo'] += 1
+                r.counters.add('yolo')
                 # peek at my hand to test if my yolo is successful for debugging (I cannot check it next turn if this is the last turn of the game)
                 if is_playable(r.h[me].cards[slot], r.progress):
-                    r.debug['successful yolo'] += 1
+                    r.counters.add('successful yolo')
                 else:
-                    r.debug['unsuccessful yolo'] += 1
+                    r.counters.add('unsuccessful yolo')
                 # s = 'yolo: played ' + str(slot) + ', correct was ' + str([is_playable(card, r.progress) for card in r.h[me].cards].index(True))
-                # r.debug[s] += 1
+                # r.counters.add(s)
             return self.execute_action(('play', slot), r)
         if myaction[0] == 'discard' and (not r.hints or (me == self.modified_player and MODIFIEDACTION)):
             if r.hints != 8:
                 return self.execute_action(myaction, r)
             elif DEBUG: # this can happen with a blocked clue
-                r.debug['BUG: instructed to discard at 8 clues']
+                r.counters.add('BUG: instructed to discard at 8 clues')
 
 
 
         if not r.hints: # I cannot hint without clues
             x = 3
             if DEBUG and me == self.modified_player:
-                r.debug['BUG: instructed to clue with 0 clues'] += 1
+                r.counters.add('BUG: instructed to clue with 0 clues')
             if self.useless_card is not None and self.useless_card in r.h[me].cards:
                 x = r.h[me].cards.index(self.useless_card)
-                if DEBUG: r.debug['safe discard at 0 clues'] += 1
-            elif DEBUG: r.debug['unsafe discard at 0 clues'] += 1
+                if DEBUG: r.counters.add('safe discard at 0 clues')
+            elif DEBUG: r.counters.add('unsafe discard at 0 clues')
             return self.execute_action(('discard', x), r)
 
     # I'm am considering whether to give a clue
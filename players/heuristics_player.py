@@ -8,7 +8,8 @@
 
 from hanabi_classes import *
 from bot_utils import *
-from collections import defaultdict
+import json
+import numpy as np
 
 Weights = {
     "indirectHintWeight" : 1.0,
@@ -19,9 +20,33 @@ Weights = {
     "directHintOrderWeight" : [2.0, 1.5, 1.0, 1.0, 1.0],
 
     # Weight based on order given by other player (eg, if given one card, very likely playable)
-    "directHintInHintOrderWeight" : [5.0, 2.0, 1.0, 1.0, 1.0]
+    "directHintInHintOrderWeight" : [5.0, 2.0, 1.0, 1.0, 1.0],
+
+    # Play the most likely playable card if its probability is above this
+    "playThreshold" : 0.8
 }
 
+def load_weights(path):
+    """Replace Weights with those in the JSON file at path: a dict like
+    Weights, or the output of tune_heuristics.py (which has it under
+    'weights').  Weights that are not in the file are left as they are."""
+    with open(path) as f:
+        weights = json.load(f)
+    weights = weights.get('weights', weights)
+    unknown = set(weights) - set(Weights)
+    if unknown:
+        raise KeyError('Unknown weights in {}: {}'.format(
+                       path, ', '.join(sorted(unknown))))
+    Weights.update(weights)
+
+# If true, every player keeps a HeuristicsTracking of its probabilities over
+# all its rounds.  The trackings of all players are merged and logged at the
+# end of a run (see merge_trackings).
+TRACKING = False
+
+# Number of equal bins the probabilities are counted in by HeuristicsTracking
+CALIBRATION_BINS = 20
+
 class HeuristicsPlayer(AIPlayer):
     """
     """
@@ -31,7 +56,7 @@ class HeuristicsPlayer(AIPlayer):
 
     def __init__(self, *args):
         super(HeuristicsPlayer, self).__init__(*args)
-        self.tracking = HeuristicsTracking(False)
+        self.tracking = HeuristicsTracking(TRACKING)
 
     def play(self, r):
         """
@@ -50,14 +75,94 @@ class HeuristicsPlayer(AIPlayer):
         # Change to get only max val
         cards_sorted_playable = sorted(playable_odds, key=playable_odds.get, reverse=True)
 
-        if playable_odds[cards_sorted_playable[0]] > 0.8:
+        if playable_odds[cards_sorted_playable[0]] > Weights["playThreshold"]:
             return 'play', cards[cards_sorted_playable[0]]
         else:
             return 'discard', cards[cards_sorted_playable[-1]]
 
-    def end_game_logging(self):
-        self.tracking.log_tracking_info(self.verbosity, self.logger)
-        pass
+
+class HeuristicsBelief(object):
+    """The probability of every identity of every card in the hand of player,
+    given what player can see (the discard pile, the other hands and the
+    hints).  The hidden cards are dealt together from the unseen copies (see
+    bot_utils.hand_marginals), so a scarce card is not expected in several
+    of them at once.  The cards of player are only looked at through their
+    hints, so this also works when the hand is policed.
+
+    identities (list of str): Every card name, in deck order.
+    probabilities (np.array): One row per card in the hand of player and one
+      column per identity.
+    """
+
+    # Beliefs keyed by what their player knows (see get), cleared when full
+    _cache = {}
+    CACHE_SIZE = 10000
+
+    # (suits, hint) -> which identities match the hint
+    _hint_matches = {}
+
+    @classmethod
+    def get(cls, player, r):
+        """The belief of player in the current state of r, shared by every
+        caller in a state with the same information (r.info_hash, the suits
+        and the cards of player that are known by name), so it stays right
+        after r.apply and r.undo"""
+        key = (r.suits, r.info_hash(player),
+               tuple(card['name'] if card['known'] else None
+                     for card in r.h[player].cards))
+        if key not in cls._cache:
+            if len(cls._cache) >= cls.CACHE_SIZE:
+                cls._cache.clear()
+            cls._cache[key] = cls(player, r)
+        return cls._cache[key]
+
+    def __init__(self, player, r):
+        super(HeuristicsBelief, self).__init__()
+        self.player = player
+        self.suits = r.suits
+        self.identities = get_card_identities(r)
+        self.index = {name : i for i, name in enumerate(self.identities)}
+
+        unseen = get_unseen_card_counts(player, r)
+        cards = r.h[player].cards
+        hidden = [i for i, card in enumerate(cards) if not card['known']]
+        masks = [sum(1 << int(j) for j in np.flatnonzero(self.possible(cards[i])))
+                 for i in hidden]
+        self.probabilities = np.zeros((len(cards), len(self.identities)))
+        self.probabilities[hidden] = hand_marginals(
+            [unseen[name] for name in self.identities], masks)
+        for i, card in enumerate(cards):
+            if card['known']:
+                self.probabilities[i, self.index[card['name']]] = 1
+
+        self.playable = np.array([is_cardname_playable(name, r.progress)
+                                  for name in self.identities])
+
+    def matching(self, hint):
+        """Which identities match hint"""
+        key = (self.suits, hint)
+        if key not in self._hint_matches:
+            self._hint_matches[key] = np.array([matches(name, hint)
+                                                for name in self.identities])
+        return self._hint_matches[key]
+
+    def possible(self, card):
+        """Which identities card can have according to its hints"""
+        mask = np.ones(len(self.identities), dtype=bool)
+        for hint in card['direct']:
+            mask &= self.matching(hint)
+        for hint in card['indirect']:
+            mask &= ~self.matching(hint)
+        return mask
+
+    def probability_playable(self, location):
+        """The probability that the card at location is playable"""
+        return float(self.probabilities[location][self.playable].sum())
+
+    def probability_of_card(self, location):
+        """The probability of every identity the card at location can have"""
+        return {self.identities[i] : self.probabilities[location, i]
+                for i in np.flatnonzero(self.probabilities[location])}
 
 
 class HeuristicsUtils(object):
@@ -66,13 +171,17 @@ class HeuristicsUtils(object):
         super(HeuristicsUtils, self).__init__()
         self.player = player
         self.r = r
-        self.knowable_cards = get_all_knowable_cards(self.player, self.r)
-        self.unknown_cards = inverse_card_set(self.knowable_cards, self.r)
-
-        self.card_probability_cache = {}
+        self.belief = HeuristicsBelief.get(self.player, self.r)
 
         self.cards_hinted_this_turn = 0
 
+    def location(self, card):
+        """The position of card in the hand of the player"""
+        for i, other in enumerate(self.r.h[self.player].cards):
+            if other is card:
+                return i
+        raise ValueError('card is not in the hand of player ' + str(self.player))
+
     def scale_probability(self, probability, scale):
         return probability ** (1.0 / scale)
 
@@ -113,58 +222,93 @@ class HeuristicsUtils(object):
         if (card['known']):
             return 1 if is_cardname_playable(card['name'], self.r.progress) else 0
 
-        probability_of_cards = self.get_probability_of_card(card)
-
-        overallProbability = 0
-        for card_name, probability in probability_of_cards.items():
-            if is_cardname_playable(card_name, self.r.progress):
-                overallProbability += probability
-
-        # print "Total playable prob!: " + str(overallProbability)
-        return overallProbability
+        return self.belief.probability_playable(self.location(card))
 
     def get_probability_of_card(self, card):
 
         if card['known']:
             return {card['name'] : 1.0}
 
-        # Attempt to use cache first - fix for police
-        # if card['name'] in self.card_probability_cache:
-        #     return self.card_probability_cache[card['name']]
-
-        possible_cards = cards_possibly_in_set(card, self.unknown_cards)
-
-        # Create default dict of all 0's
-        ret = defaultdict(int)
-        prob_of_card = 1.0 / len(possible_cards)
-
-        for card_name in possible_cards:
-            ret[card_name] += prob_of_card
-
-        self.card_probability_cache[card_name] = ret
-
-        return ret
+        return self.belief.probability_of_card(self.location(card))
 
 
 class HeuristicsTracking(object):
-    """docstring for HeuristicsTracking"""
-    def __init__(self, on):
+    """Calibration of the probabilities that cards are playable: how often
+    the cards given each probability turned out to be playable.  Every
+    probability is counted in one of nBins equal bins, so the memory used
+    does not grow with the number of decisions, and the trackings of several
+    players (or processes) can be merged.
+
+    count (list of int): Number of probabilities in every bin.
+    playable (list of int): Number of them that were playable.
+    predicted (list of float): Sum of the probabilities in every bin.
+    squaredError (float): Sum of (probability - playable)^2 over all
+      probabilities (see brier_score).
+    """
+    def __init__(self, on, nBins=CALIBRATION_BINS):
         super(HeuristicsTracking, self).__init__()
         self.on = on
-        self.playable_cards = []
-        self.unplayable_cards = []
+        self.nBins = nBins
+        self.count = [0] * nBins
+        self.playable = [0] * nBins
+        self.predicted = [0.] * nBins
+        self.squaredError = 0.
 
     def record_playable(self, card, probability, progress):
         if not self.on:
             return
-        if is_playable(card, progress):
-            self.playable_cards.append(probability)
-        else:
-            self.unplayable_cards.append(probability)
-
-    def log_tracking_info(self, verbosity, logger):
-        if not self.on:
+        outcome = is_playable(card, progress)
+        i = min(int(probability * self.nBins), self.nBins - 1)
+        self.count[i] += 1
+        self.playable[i] += outcome
+        self.predicted[i] += probability
+        self.squaredError += (probability - outcome) ** 2
+
+    def merge(self, other):
+        """Add the probabilities counted by other (with the same bins)"""
+        assert other.nBins == self.nBins
+        for i in range(self.nBins):
+            self.count[i] += other.count[i]
+            self.playable[i] += other.playable[i]
+            self.predicted[i] += other.predicted[i]
+        self.squaredError += other.squaredError
+        return self
+
+    def brier_score(self):
+        """Mean squared error of the probabilities (None if there are none)"""
+        total = sum(self.count)
+        return self.squaredError / total if total else None
+
+    def reliability_table(self):
+        """Lines of a table with, for every bin with probabilities in it, how
+        many there are, their mean and how often the card was playable"""
+        lines = ['probability | decisions | mean | playable']
+        for i in range(self.nBins):
+            if self.count[i]:
+                lines.append('{:.2f}-{:.2f} | {:9d} | {:.3f} | {:.3f}'.format(
+                    i / float(self.nBins), (i + 1) / float(self.nBins),
+                    self.count[i], self.predicted[i] / self.count[i],
+                    self.playable[i] / float(self.count[i])))
+        return lines
+
+    def log_tracking_info(self, logger):
+        """Log the reliability table and the Brier score (if tracking is on
+        and there are probabilities)"""
+        if not self.on or not sum(self.count):
             return
-        if verbosity != 'silent':
-            logger.info('playable cards: ' + str(sorted(self.playable_cards)))
-            logger.info('unplayable cards: ' + str(sorted(self.unplayable_cards)))
+        for line in self.reliability_table():
+            logger.info(line)
+        logger.info('Brier score: {:.4f} over {} decisions'.format(
+            self.brier_score(), sum(self.count)))
+
+
+def merge_trackings(players, tracking=None):
+    """Merge the trackings of the heuristic players among players (e.g. the
+    seats of a run) into tracking (a new HeuristicsTracking if None), and
+    return it"""
+    if tracking is None:
+        tracking = HeuristicsTracking(TRACKING)
+    for player in players:
+        if isinstance(player, HeuristicsPlayer):
+            tracking.merge(player.tracking)
+    return tracking
@@ -0,0 +1,141 @@
+"""Cache of round scores, so that rounds whose result can't have changed are
+not played again.
+
+A score is stored under a key made from everything it depends on: the source
+of the modules of the AIs (and of every module of this repository they
+import, like bot_utils), the rules (hanabi_classes and play_hanabi), the
+versions of Python and NumPy (which decide what random and NumPy return),
+the lineup, the game type, the loss score, policing, the turn budget, and
+the deck or seed of the round.  Editing heuristics_player.py changes the keys of
+the rounds with heuristic players only; the rounds of the other AIs are
+served from the cache.  The scores are kept in an SQLite file.
+
+Rounds are cached on their own, so a round must not depend on the rounds
+before it: every round needs its own seed or deck (see hanabi_wrapper.py -c).
+Nor may it depend on how fast it is played, so rounds with a time budget
+are not cached.
+"""
+
+import hashlib, io, json, os, re, sqlite3, sys
+
+# Modules every round depends on
+RULES_MODULES = ['hanabi_classes', 'play_hanabi']
+
+# Number of new scores to collect before they are written to the file
+COMMIT_EVERY = 100
+
+_root = os.path.dirname(os.path.abspath(__file__))
+_import = re.compile(r'^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w., ]+))',
+                     re.MULTILINE)
+
+def module_path(name):
+    """The file of the module of this repository called name (top level or
+    in players/), or None if there is none"""
+    for directory in (_root, os.path.join(_root, 'players')):
+        path = os.path.join(directory, name + '.py')
+        if os.path.exists(path):
+            return path
+    return None
+
+def module_closure(names):
+    """names and every module of this repository they import, directly or
+    not, as a sorted list"""
+    seen = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        with io.open(module_path(name), encoding='utf-8') as f:
+            source = f.read()
+        for fromName, importNames in _import.findall(source):
+            for imported in [fromName] if fromName else importNames.split(','):
+                words = imported.split() # Drop 'as ...'
+                if words and module_path(words[0]):
+                    todo.append(words[0])
+    return sorted(seen)
+
+def numpy_version():
+    """Version of NumPy ('none' if it is not installed, as some AIs don't
+    need it)"""
+    try:
+        import numpy
+    except ImportError:
+        return 'none'
+    return numpy.__version__
+
+def fingerprint(playerClasses):
+    """SHA-1 (hex) of the source of the modules of playerClasses, the modules
+    of this repository they import and the RULES_MODULES"""
+    names = set(RULES_MODULES)
+    for cls in playerClasses:
+        names.add(cls.__module__.split('.')[-1])
+    digest = hashlib.sha1()
+    for name in module_closure(names):
+        with open(module_path(name), 'rb') as f:
+            source = f.read()
+        digest.update(name.encode('utf-8') + b'\0' +
+                      hashlib.sha1(source).digest())
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """Scores of rounds with one configuration, kept in an SQLite file.
+
+    path (str)
+    config (str): SHA-1 (hex) of the configuration (see __init__).
+    hits (int): Number of scores served from the cache.
+    misses (int): Number of scores that were not in the cache.
+    """
+
+    def __init__(self, path, playerClasses, gameType, lossScore, isPoliced,
+                 turnBudget):
+        """Cache for rounds of the AIs playerClasses (one per seat, in seat
+        order) with the given settings (see play_hanabi.play_one_round)."""
+        config = [fingerprint(playerClasses),
+                  list(sys.version_info[:2]), numpy_version(),
+                  [cls.get_name() for cls in playerClasses],
+                  gameType, lossScore, isPoliced, turnBudget]
+        self.config = hashlib.sha1(
+            json.dumps(config).encode('utf-8')).hexdigest()
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS scores '
+                        '(key TEXT PRIMARY KEY, score INTEGER)')
+
+    def key(self, roundId):
+        """Key of the round identified by roundId (a str naming its seed, or
+        its deck) in this configuration"""
+        return hashlib.sha1((self.config + '\0' + roundId)
+                            .encode('utf-8')).hexdigest()
+
+    def get(self, roundId):
+        """Score of the round, or None if it is not in the cache"""
+        row = self.db.execute('SELECT score FROM scores WHERE key = ?',
+                              (self.key(roundId),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, roundId, score):
+        """Keep the score of the round"""
+        self.db.execute('INSERT OR REPLACE INTO scores VALUES (?, ?)',
+                        (self.key(roundId), score))
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        """Write the new scores to the file"""
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
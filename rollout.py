@@ -0,0 +1,195 @@
+"""Monte Carlo rollouts: play the rest of a round many times.
+
+Intended for bots that want to know how a position turns out.  The round is
+copied from the point of view of one player into a Simulation, the hidden
+cards of that player and the deck are dealt at random in a way that fits
+everything the player knows (see bot_utils.HandSampler), and a policy (an
+AIPlayer, the cheater is a good choice) plays the copy to the end.  Batches of
+rollouts can be spread over a process pool.
+
+The policy players only join the round in the middle, so policies that need
+to have seen the round from its start (AIPlayer.canPlayMidRound is False,
+e.g. the hat and encoding players) are refused.
+"""
+
+import logging, multiprocessing, random
+from hanabi_classes import *
+from bot_utils import HandSampler
+from play_hanabi import play_until_end, final_score
+
+# Number of rollouts each process task plays.  The rollouts of a batch only
+# depend on the seed, not on the number of processes.
+CHUNK_SIZE = 25
+
+class Simulation(Round):
+    """Lightweight copy of a Round to play on.
+
+    Only the state needed to play on is copied.  There is no logger and no
+    players (PlayerRecord is None), the histories start empty and every card
+    is a new dict.  When
+    copied from the point of view of player, the names of the cards player
+    doesn't know and the deck are None until deal() fills them in.
+
+    player (int): Whose point of view was copied (None if everything was).
+    """
+
+    def __init__(self, r, player=None):
+        """Copy r (a Round or a Simulation).  Round.__init__ is not called,
+        since it sets up logging."""
+        self.gameType = r.gameType
+        self.suits = r.suits
+        self.nPlayers = r.nPlayers
+        self.player = player
+        self.h = []
+        for hand in r.h:
+            copy = Round.Hand(hand.seat, hand.name)
+            copy.cards = [_copy_card(card, hand.seat == player and
+                                     not card['known'])
+                          for card in hand.cards]
+            self.h.append(copy)
+
+        self.whoseTurn          = r.whoseTurn
+        self.turnNumber         = r.turnNumber
+        self.playHistory        = []
+        self.HandHistory        = []
+        self.progressHistory    = []
+        self.progress           = dict(r.progress)
+        self.gameOverTimer      = r.gameOverTimer
+        self.hints              = r.hints
+        self.lightning          = r.lightning
+
+        self.verbosity = 'silent'
+        self.verbose = False
+        self.log = False
+        self.zazz = ['[HANDS]', '[PLAYS]']
+        self.isPoliced = False
+        self.debug = {}
+        self.counters = Counters(False)
+
+        self.NameRecord = r.NameRecord
+        self.PlayerRecord = None
+        self.DropIndRecord = []
+        self.Resign = False
+        self.discardpile = list(r.discardpile)
+        self.turnBudget = None
+        self.budget = None
+        self.budgetHistory = []
+        self.CommonSeed = r.CommonSeed
+        self.startingDeckSize = r.startingDeckSize
+
+        self.deck = None
+        self.cardsLeft = None
+        if player is None:
+            self.deal(None, r.deck)
+
+    def deal(self, hand, deck):
+        """Fill in the names of the cards in the hand of player (a list of
+        names in the order of the hand, as from HandSampler.sample) and the
+        deck, and compute the Zobrist hashes."""
+        if hand is not None:
+            for card, name in zip(self.h[self.player].cards, hand):
+                card['name'] = card['sec_name'] = name
+        self.deck = list(deck)
+        self.cardsLeft = [card['name'] for hand in self.h
+                          for card in hand.cards if not card['known']]
+        self.cardsLeft.extend(self.deck)
+        self.rehash()
+
+    def __getstate__(self):
+        """Hands as plain data, so that simulations can be sent to other
+        processes (Round.Hand is a nested class)"""
+        state = dict(self.__dict__)
+        state['h'] = [(hand.seat, hand.name, hand.cards) for hand in self.h]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.h = []
+        for seat, name, cards in state['h']:
+            hand = Round.Hand(seat, name)
+            hand.cards = cards
+            self.h.append(hand)
+
+
+def _copy_card(card, hidden):
+    """A copy of card that play can change; the name is None if hidden"""
+    copy = dict(card)
+    copy['direct'] = list(card['direct'])
+    copy['indirect'] = list(card['indirect'])
+    if hidden:
+        copy['name'] = copy['sec_name'] = None
+    elif 'name' not in copy: # Copied from a policed hand
+        copy['name'] = copy['sec_name']
+    return copy
+
+def rollout(sim, sampler, policy, lossScore='zero'):
+    """Deal a copy of the Simulation sim with sampler (a HandSampler for
+    sim.player, or None if sim is complete), let one policy player per seat
+    play it to the end, and return the score."""
+    play = Simulation(sim, sim.player)
+    if sampler is not None:
+        play.deal(*sampler.sample())
+    logger = logging.getLogger('game_log')
+    players = [policy(i, logger, 'silent') for i in range(sim.nPlayers)]
+    play_until_end(play, players)
+    return final_score(play, lossScore)
+
+def run_rollouts(r, player, policy, n, processes=1, seed=None,
+                 lossScore='zero', pool=None):
+    """Play n rollouts of r from the point of view of player (None to use
+    the real hidden cards and deck) with the AIPlayer class policy, and
+    return their scores.
+
+    The rollouts are spread over pool (a multiprocessing.Pool, so that a bot
+    can keep one for all its turns), or with processes > 1 and no pool over
+    a new pool.  The scores only depend on seed (drawn from the random
+    module if None), so the same seed gives the same scores for any number
+    of processes."""
+    _find_policy(policy.get_name())
+    sim = Simulation(r, player)
+    if seed is None:
+        seed = random.getrandbits(32)
+    tasks = [(sim, policy.get_name(), min(CHUNK_SIZE, n - start), seed,
+              start // CHUNK_SIZE, lossScore)
+             for start in range(0, n, CHUNK_SIZE)]
+    if pool is not None and len(tasks) > 1:
+        results = pool.map(_rollout_chunk, tasks)
+    elif processes > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_rollout_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_rollout_chunk(task) for task in tasks]
+    return [score for scores in results for score in scores]
+
+def _rollout_chunk(task):
+    """Play one chunk of rollouts of run_rollouts.  The policy is passed by
+    name, and policies that use the random module get a seeded copy of it
+    whose state is restored afterwards."""
+    sim, policyName, n, seed, chunk, lossScore = task
+    policy = _find_policy(policyName)
+    rng = random.Random('{}-{}'.format(seed, chunk))
+    sampler = None
+    if sim.player is not None:
+        sampler = HandSampler(sim.player, sim, rng)
+    state = random.getstate()
+    random.seed(rng.getrandbits(32))
+    try:
+        return [rollout(sim, sampler, policy, lossScore) for i in range(n)]
+    finally:
+        random.setstate(state)
+
+def _find_policy(name):
+    """The AIPlayer class called name (see AIPlayer.get_name), which must be
+    able to play a Simulation (see AIPlayer.canPlayMidRound)"""
+    import players
+    for cls in AIPlayer.__subclasses__():
+        if cls.get_name() == name:
+            if not cls.canPlayMidRound:
+                raise NameError(name + ' players can\'t be rollout policies, '
+                                'they need to play the round from its start')
+            return cls
+    raise NameError('No player called ' + name)
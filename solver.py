@@ -0,0 +1,331 @@
+"""Maximum score of a round when every player sees every card.
+
+Intended to tell apart losses that the deck forced from mistakes of a
+strategy.  The solver searches every line of play depth first and remembers
+the value of every state it solved in a transposition table.  With all cards
+visible, hints only pass the turn (they cost a hint and change nothing else),
+and misplays are never better than discards, so the search never misplays.
+States are reduced to a canonical form before they are looked up:
+
+  * the hands are stored from the point of view of the player on turn, so
+    whose turn it is does not matter,
+  * the cards in a hand are sorted, and equal cards are only tried once,
+  * every card that can no longer be played (already played, or a card it
+    depends on is gone) becomes the same trash card, and when a player holds
+    trash no other discard is tried (discarding trash is never worse).
+
+A state is left as soon as a line of play reaches the upper bound of its
+score (every card that can still be played, limited by the plays left), so
+most decks are solved without branching much.
+
+Scores of whole decks can be kept on disk in a ScoreCache, keyed by
+deck_hash.
+"""
+
+import json, os
+from hanabi_classes import *
+
+class NodeLimit(Exception):
+    """Raised when a search visits more states than it may"""
+    pass
+
+
+class Solver(object):
+    """Depth first search for the maximum score of one deck order.
+
+    suits (str): The suits in play.
+    deck (list of int): Codes (see code) of the cards still to be drawn.
+    nPlayers (int)
+    maxNodes (int): Number of states the search may solve (None: no limit).
+    nodes (int): Number of states solved so far.
+    table (dict): Transposition table, canonical state without the hints ->
+      (highest score known to be reachable, lowest score known to be out of
+      reach), both lists indexed by the number of hints.
+    """
+
+    def __init__(self, suits, deck, nPlayers, maxNodes=None):
+        self.suits = suits
+        self.nValues = len(set(SUIT_CONTENTS))
+        self.maxScore = len(suits) * self.nValues
+        self.deck = [self.code(name) for name in deck]
+        self.nPlayers = nPlayers
+        self.maxNodes = maxNodes
+        self.nodes = 0
+        self.table = {}
+
+        # Number of every card in deck[i:], for every i
+        nCodes = len(suits) * self.nValues
+        counts = [0] * nCodes
+        self.deckCounts = [tuple(counts)]
+        for card in reversed(self.deck):
+            counts[card] += 1
+            self.deckCounts.append(tuple(counts))
+        self.deckCounts.reverse()
+
+    def code(self, name):
+        """The int a card called name is stored as"""
+        return self.suits.index(name[1]) * self.nValues + int(name[0]) - 1
+
+    def solve(self, hands, progress, hints, gameOverTimer, lower=0):
+        """Maximum score from the state in which the player with hands[0] is
+        on turn (see Round.get_play; gameOverTimer was already counted down
+        for this turn).
+
+        hands (list of list of str): Names of the cards in every hand, from
+          the player on turn onwards.
+        progress (dict): Keys are suits, values are progress.
+        lower (int): A score known to be reachable (e.g. what a bot scored),
+          so the search only looks for higher ones.
+        """
+        progress = tuple(progress[suit] for suit in self.suits)
+        hands = self._canonical([tuple(self.code(name) for name in hand)
+                                 for hand in hands], progress, 0)
+        lower = max(lower, sum(progress))
+        # Try the highest scores first: a search for a score gives up on
+        # every state whose upper bound is lower
+        target = self._bound(hands, progress, 0, gameOverTimer)
+        while target > lower:
+            if self._reaches(hands, progress, hints, 0, gameOverTimer,
+                             target):
+                return target
+            target -= 1
+        return lower
+
+    def _counts(self, hands, drawn):
+        """Number of every card in hands and the rest of the deck"""
+        counts = list(self.deckCounts[drawn])
+        for hand in hands:
+            for card in hand:
+                if card >= 0:
+                    counts[card] += 1
+        return counts
+
+    def _reach(self, counts, progress):
+        """How far every suit can still get with the cards in counts"""
+        reach = []
+        for s, p in enumerate(progress):
+            base = s * self.nValues
+            while p < self.nValues and counts[base + p]:
+                p += 1
+            reach.append(p)
+        return reach
+
+    def _canonical(self, hands, progress, drawn):
+        """hands (a list of tuples) with every card that can no longer be
+        played replaced by trash (-1) and every hand sorted, as a tuple"""
+        reach = self._reach(self._counts(hands, drawn), progress)
+        nValues = self.nValues
+        canonical = []
+        for hand in hands:
+            cards = []
+            for card in hand:
+                if card >= 0:
+                    s, value = divmod(card, nValues)
+                    if value < progress[s] or value >= reach[s]:
+                        card = -1
+                cards.append(card)
+            cards.sort()
+            canonical.append(tuple(cards))
+        return tuple(canonical)
+
+    def _bound(self, hands, progress, drawn, timer):
+        """Upper bound of the score: every card that can still be played is
+        played, but every play except those of the last turns draws a card"""
+        if timer is None:
+            turns = len(self.deck) - drawn + self.nPlayers
+        else:
+            turns = timer + 1
+        score = sum(progress)
+        reach = self._reach(self._counts(hands, drawn), progress)
+        return score + min(sum(reach) - score, turns)
+
+    def _reaches(self, hands, progress, hints, drawn, timer, target):
+        """Whether a score of target can be reached from a canonical state
+        (see solve; timer is -1 once the round is over).  The table keeps
+        the highest score known to be reachable and the lowest score known
+        to be out of reach of every state, for every number of hints."""
+        score = sum(progress)
+        if score >= target:
+            return True
+        if timer == -1:
+            return False
+        key = (hands, progress, drawn, timer)
+        entry = self.table.get(key)
+        if entry is None:
+            bound = self._bound(hands, progress, drawn, timer)
+            if bound < target:
+                return False
+            entry = ([score] * (N_HINTS + 1), [bound + 1] * (N_HINTS + 1))
+            self.table[key] = entry
+        reachable, outOfReach = entry
+        if reachable[hints] >= target:
+            return True
+        if outOfReach[hints] <= target:
+            return False
+        self.nodes += 1
+        if self.maxNodes is not None and self.nodes > self.maxNodes:
+            raise NodeLimit()
+
+        # Countdown of the next turn (see play_hanabi.play_until_end)
+        deckLeft = len(self.deck) - drawn
+        nextTimer = timer
+        if nextTimer is not None:
+            nextTimer -= 1
+        elif deckLeft == 0:
+            nextTimer = self.nPlayers - 1 # The deck ran out before this turn
+
+        hand = hands[0]
+        others = hands[1:]
+        nValues = self.nValues
+        for action, card in self._actions(hands, progress, hints, drawn):
+            if action == 'hint':
+                reached = self._reaches(others + (hand,), progress,
+                                        hints - 1, drawn, nextTimer, target)
+            else:
+                i = hand.index(card)
+                newHand = hand[:i] + hand[i + 1:]
+                newDrawn, newTimer = drawn, nextTimer
+                if deckLeft:
+                    newHand += (self.deck[drawn],)
+                    newDrawn += 1
+                    if deckLeft == 1:
+                        newTimer = self.nPlayers - 1
+                newHints = min(hints + 1, N_HINTS)
+                newProgress = progress
+                if action == 'play':
+                    s, v = divmod(card, nValues)
+                    newProgress = progress[:s] + (v + 1,) + progress[s + 1:]
+                    if v != nValues - 1:
+                        newHints = hints
+                newHands = self._canonical(others + (newHand,), newProgress,
+                                           newDrawn)
+                reached = self._reaches(newHands, newProgress, newHints,
+                                        newDrawn, newTimer, target)
+            if reached:
+                # More hints can only help
+                for h in range(hints, N_HINTS + 1):
+                    reachable[h] = max(reachable[h], target)
+                return True
+        for h in range(hints + 1):
+            outOfReach[h] = min(outOfReach[h], target)
+        return False
+
+    def _actions(self, hands, progress, hints, drawn):
+        """Actions worth trying for the player on turn, most promising
+        first: plays (of different cards, lowest first), the discard of
+        trash (if there is any, no other card is discarded), discards of
+        cards that are also in another hand, a hint (if possible), and the
+        discards of the other cards, the last copies last"""
+        hand = hands[0]
+        nValues = self.nValues
+        distinct = sorted(set(hand), key=lambda card: card % nValues)
+        for card in distinct:
+            if card >= 0 and card % nValues == progress[card // nValues]:
+                yield 'play', card
+        if -1 in distinct:
+            yield 'discard', -1
+        else:
+            seen = set(card for other in hands[1:] for card in other)
+            if len(distinct) < len(hand):
+                seen.update(card for card in distinct
+                            if hand.count(card) > 1)
+            for card in reversed(distinct):
+                if card in seen:
+                    yield 'discard', card
+        if hints and self.nPlayers > 1:
+            yield 'hint', None
+        if -1 not in distinct:
+            counts = self._counts(hands, drawn)
+            rest = [card for card in distinct if card not in seen]
+            rest.sort(key=lambda card: (counts[card] == 1, -(card % nValues)))
+            for card in rest:
+                yield 'discard', card
+
+
+def max_score(deck, nPlayers, suits=None, maxNodes=None, cache=None,
+              lower=0):
+    """Maximum score of a round with deck order deck (e.g. r.startingDeck)
+    when every player sees every card, or None if the search had to solve
+    more than maxNodes states.
+
+    suits (str): The suits in play (by default the suits in deck).
+    lower (int): A score known to be reachable with deck (see Solver.solve).
+    cache (ScoreCache): Where to look up and keep the scores of decks.
+    """
+    if cache is not None:
+        score = cache.get(deck, nPlayers)
+        if score is not None:
+            return score
+    if suits is None:
+        suits = ''.join(sorted(set(name[1] for name in deck)))
+    handSize = 4
+    if nPlayers < 4:
+        handSize += 1
+    dealt = handSize * nPlayers
+    hands = [deck[i * handSize:(i + 1) * handSize] for i in range(nPlayers)]
+    solver = Solver(suits, deck[dealt:], nPlayers, maxNodes)
+    try:
+        score = solver.solve(hands, {suit : 0 for suit in suits}, N_HINTS,
+                             None, lower)
+    except NodeLimit:
+        return None
+    if cache is not None:
+        cache.put(deck, nPlayers, score)
+    return score
+
+def max_score_from(r, maxNodes=None):
+    """Maximum score from the state of the Round r when every player sees
+    every card, as seen by the player on turn (during its play), or None if
+    the search had to solve more than maxNodes states.  The cards of r must
+    all be named (not in a PolicedHand)."""
+    if r.lightning == N_LIGHTNING:
+        return sum(r.progress.values())
+    order = [(r.whoseTurn + i) % r.nPlayers for i in range(r.nPlayers)]
+    hands = [[card['name'] for card in r.h[seat].cards] for seat in order]
+    solver = Solver(r.suits, r.deck, r.nPlayers, maxNodes)
+    try:
+        return solver.solve(hands, r.progress, r.hints, r.gameOverTimer)
+    except NodeLimit:
+        return None
+
+def deck_hash(deck, nPlayers):
+    """64-bit Zobrist hash of a starting deck order and number of players"""
+    h = zobrist_key('players', nPlayers)
+    for i, name in enumerate(deck):
+        h ^= zobrist_key('deck', i, name)
+    return h
+
+
+class ScoreCache(object):
+    """Maximum scores of decks, kept in a file with one JSON object per line
+    ({"hash": ..., "score": ...}, see deck_hash).  Lines are only appended,
+    so the file survives being interrupted and can be shared by runs that
+    label the same decks.
+
+    path (str)
+    scores (dict): deck_hash -> maximum score.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.scores[int(entry['hash'], 16)] = entry['score']
+
+    def get(self, deck, nPlayers):
+        """The maximum score of deck (None if it is not known)"""
+        return self.scores.get(deck_hash(deck, nPlayers))
+
+    def put(self, deck, nPlayers, score):
+        """Keep the maximum score of deck"""
+        h = deck_hash(deck, nPlayers)
+        if self.scores.get(h) == score:
+            return
+        self.scores[h] = score
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'hash': '{:016x}'.format(h),
+                                'score': score}) + '\n')
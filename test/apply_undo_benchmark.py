@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+""" Check Round.apply/undo and measure what they cost compared to copying.
+
+./test/apply_undo_benchmark.py
+play a few turns of a game with cheaters, then apply random legal actions and
+undo them again, checking that the round comes back exactly and that the
+Zobrist hashes kept by apply match hashes computed from scratch; then time
+apply + undo of every legal action against copy.deepcopy and rollout.Simulation
+
+./test/apply_undo_benchmark.py -n 2000 -p 5 -d 20 -t vanilla
+the same for more walks, with other settings
+
+"""
+
+import argparse, copy, logging, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import Round, AIPlayer
+from rollout import Simulation
+import players
+
+CheatingPlayer, = [c for c in AIPlayer.__subclasses__() if c.get_name() == 'cheater']
+
+parser = argparse.ArgumentParser(description='check and time apply/undo')
+parser.add_argument('-n', '--n_walks', default=500, type=int, help='positive int')
+parser.add_argument('-p', '--n_players', default=4, type=int, help='2 to 5')
+parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+    help='rainbow, purple, or vanilla')
+parser.add_argument('-d', '--depth', default=10, type=int,
+    help='actions per random walk')
+parser.add_argument('-m', '--moves', default=10, type=int,
+    help='turns to play before the walks')
+parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+args = parser.parse_args()
+
+logger = logging.getLogger('game_log')
+logger.addHandler(logging.NullHandler())
+
+def state(r):
+    """Everything apply may change, including which card dicts are where"""
+    return (copy.deepcopy([hand.cards for hand in r.h]),
+            [[id(card) for card in hand.cards] for hand in r.h],
+            list(r.deck), list(r.discardpile), list(r.cardsLeft),
+            dict(r.progress), r.hints, r.lightning, r.whoseTurn, r.turnNumber,
+            list(r.playHistory), list(r.progressHistory),
+            list(r.DropIndRecord), r.Resign, hashes(r))
+
+def hashes(r):
+    return ([r.state_hash()] + [r.info_hash(i) for i in range(r.nPlayers)])
+
+def rehashed(r):
+    """The hashes of r computed from scratch"""
+    kept = (r.publicHash, r.deckHash, r.handsHash, list(r.nameHashes),
+            list(r.clueHashes))
+    r.rehash()
+    fresh = hashes(r)
+    (r.publicHash, r.deckHash, r.handsHash, r.nameHashes,
+     r.clueHashes) = kept
+    return fresh
+
+random.seed(args.seed)
+seats = [CheatingPlayer(i, logger, 'silent') for i in range(args.n_players)]
+names = ['Cheater' + str(i + 1) for i in range(args.n_players)]
+r = Round(args.game_type, seats, names, 'silent', False, {})
+r.generate_deck_and_deal_hands()
+for i in range(args.moves):
+    r.get_play(seats[r.whoseTurn])
+
+before = state(r)
+for walk in range(args.n_walks):
+    tokens = []
+    for i in range(args.depth):
+        tokens.append(r.apply(random.choice(list(r.legal_actions()))))
+        if hashes(r) != rehashed(r):
+            print('walk ' + str(walk) + ' did not keep the hashes')
+            exit(1)
+    for token in reversed(tokens):
+        r.undo(token)
+    if state(r) != before:
+        print('walk ' + str(walk) + ' did not restore the round')
+        exit(1)
+print('all ' + str(args.n_walks) + ' walks restored the round')
+
+# Two hints of the first player in either order lead to the same state (the
+# other players hint the first player in between)
+fresh = Round(args.game_type, seats, names, 'silent', False, {})
+fresh.generate_deck_and_deal_hands()
+hints = [action for action in fresh.legal_actions() if action[0] == 'hint']
+first, second = hints[0], hints[-1]
+walks = []
+for order in [(first, second), (second, first)]:
+    tokens = [fresh.apply(order[0])]
+    for other in range(1, args.n_players):
+        tokens.append(fresh.apply(('hint', (0, '1'))))
+    tokens.append(fresh.apply(order[1]))
+    walks.append(hashes(fresh))
+    for token in reversed(tokens):
+        fresh.undo(token)
+if walks[0] != walks[1] or fresh.state_hash() in walks[0]:
+    print('hint transposition did not give the same hashes')
+    exit(1)
+print('hint transposition gave the same hashes')
+
+def timed(f, repeat):
+    start = time.time()
+    for i in range(repeat):
+        f()
+    return (time.time() - start) / repeat * 1e6
+
+actions = list(r.legal_actions())
+def apply_undo():
+    for action in actions:
+        r.undo(r.apply(action))
+apply_undo_us = timed(apply_undo, 200) / len(actions)
+deepcopy_us = timed(lambda: copy.deepcopy(r), 50)
+simulation_us = timed(lambda: Simulation(r), 200)
+print('apply + undo: {:.1f} us per action ({} legal actions)'.format(
+    apply_undo_us, len(actions)))
+print('copy.deepcopy: {:.1f} us ({:.0f}x)'.format(
+    deepcopy_us, deepcopy_us / apply_undo_us))
+print('rollout.Simulation: {:.1f} us ({:.0f}x)'.format(
+    simulation_us, simulation_us / apply_undo_us))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+""" Check which cards the card counting of the general encoding player
+restricts.
+
+./test/gencoder_card_count.py
+deal a vanilla game to gencoders, make a card of every player either the last
+copy of a card or one other card, with that last copy known elsewhere, and
+check that card counting only restricts the card of the first player (as the
+original version did; the codes of the encoders depend on it)
+
+./test/gencoder_card_count.py -p 5 -s 3
+the same with other settings
+
+Needs Python 2, like the encoders.
+
+"""
+
+import argparse, logging, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import Round, AIPlayer
+import players
+
+GencoderPlayer, = [c for c in AIPlayer.__subclasses__() if c.get_name() == 'gencoder']
+
+parser = argparse.ArgumentParser(description='check gencoder card counting')
+parser.add_argument('-p', '--n_players', default=4, type=int, help='3 to 5')
+parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+args = parser.parse_args()
+
+logger = logging.getLogger('game_log')
+logger.addHandler(logging.NullHandler())
+
+random.seed(args.seed)
+seats = [GencoderPlayer(i, logger, 'silent') for i in range(args.n_players)]
+names = ['Gencoder' + str(i + 1) for i in range(args.n_players)]
+r = Round('vanilla', seats, names, 'silent', False, {})
+r.generate_deck_and_deal_hands()
+player = seats[0]
+player.Startup(r)
+
+# The last player knows its first card is the only 5r.  The first card of
+# every other player is a 5r or a 5y.
+five, red, yellow = (player.NumberSet.index('5'), player.SuitSet.index('r'),
+                     player.SuitSet.index('y'))
+last = args.n_players - 1
+player.InformationMatrix[:, 0] = False
+player.InformationMatrix[last, 0, red, five] = True
+player.InformationMatrix[:last, 0, [red, yellow], five] = True
+
+while player.CardCountInfoMat(r, 0):
+    pass
+
+failed = False
+for i in range(last):
+    suits = [s for k, s in enumerate(player.SuitSet)
+             if player.InformationMatrix[i, 0, k, five]]
+    expected = ['y'] if i == 0 else ['r', 'y']
+    if suits != expected:
+        print('player {}: first card is a 5 of {}, expected {}'.format(
+              i, suits, expected))
+        failed = True
+
+if failed:
+    sys.exit(1)
+print('only the cards of the first player are restricted')
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+""" Check that sharing the common knowledge between hat players doesn't change
+any decision.
+
+./test/hat_common_knowledge.py
+play games with and without players.hat_player.SHAREDKNOWLEDGE on the same
+seeds, with 4 and with 5 players, and compare all actions.  Without it every
+seat interprets the last action and computes the standard discards itself.
+
+./test/hat_common_knowledge.py -n 1000 -p 4 -t vanilla
+the same for more games, with other settings
+
+"""
+
+import argparse, logging, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import Round, AIPlayer, SUIT_CONTENTS, N_LIGHTNING
+from players import *
+
+HatPlayer, = [c for c in AIPlayer.__subclasses__() if c.get_name() == 'hat']
+hat_player = sys.modules[HatPlayer.__module__]
+
+parser = argparse.ArgumentParser(description='compare shared and per-seat hat players')
+parser.add_argument('-n', '--n_rounds', default=200, type=int, help='positive int')
+parser.add_argument('-p', '--n_players', default=[4, 5], type=int, nargs='+',
+    help='at least 4')
+parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+    help='rainbow, purple, or vanilla')
+parser.add_argument('-s', '--seed', default=0, type=int, help='first seed')
+args = parser.parse_args()
+
+logger = logging.getLogger('game_log')
+logger.addHandler(logging.NullHandler())
+
+def action_names(r):
+    """The actions of the round r, with card names instead of card dicts"""
+    return [(t, v if t == 'hint' else v['name']) for t, v in r.playHistory]
+
+def play_round(seed, nPlayers, shared):
+    """Play one round with the given seed and return all actions"""
+    hat_player.SHAREDKNOWLEDGE = shared
+    random.seed(seed)
+    players = [HatPlayer(i, logger, 'silent') for i in range(nPlayers)]
+    names = ['Hat' + str(i + 1) for i in range(nPlayers)]
+    r = Round(args.game_type, players, names, 'silent', False, {})
+    r.generate_deck_and_deal_hands()
+    while r.gameOverTimer != 0:
+        if r.deck == [] and r.gameOverTimer == None:
+            r.gameOverTimer = r.nPlayers
+        if type(r.gameOverTimer) is int:
+            r.gameOverTimer -= 1
+        if all(x == int(SUIT_CONTENTS[-1]) for x in r.progress.values()):
+            break
+        if r.lightning == N_LIGHTNING:
+            break
+        r.get_play(players[r.whoseTurn])
+    return action_names(r)
+
+changed = 0
+for nPlayers in args.n_players:
+    for seed in range(args.seed, args.seed + args.n_rounds):
+        if play_round(seed, nPlayers, True) != play_round(seed, nPlayers, False):
+            print('seed ' + str(seed) + ' with ' + str(nPlayers) + ' players has changed')
+            changed += 1
+hat_player.SHAREDKNOWLEDGE = True
+
+total = args.n_rounds * len(args.n_players)
+if changed:
+    print(str(changed) + ' of ' + str(total) + ' rounds have changed')
+    exit(1)
+print('all ' + str(total) + ' rounds are unchanged')
+exit(0)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+""" Check that the cached beliefs of the heuristic player follow Round.apply
+and Round.undo.
+
+./test/heuristic_belief.py
+play a few turns of games with heuristic players, then for every legal action:
+apply it, get the belief of the next player, undo it; and check that every
+belief is the one computed from scratch, so a belief got after an action was
+undone and another one applied is not the belief of the first action
+
+./test/heuristic_belief.py -n 100 -p 5 -t vanilla
+the same for more games, with other settings
+
+"""
+
+import argparse, logging, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import Round, AIPlayer
+from players import *
+
+HeuristicsPlayer, = [c for c in AIPlayer.__subclasses__() if c.get_name() == 'heuristic']
+heuristics_player = sys.modules[HeuristicsPlayer.__module__]
+HeuristicsBelief = heuristics_player.HeuristicsBelief
+
+parser = argparse.ArgumentParser(description='check cached heuristic beliefs')
+parser.add_argument('-n', '--n_rounds', default=20, type=int, help='positive int')
+parser.add_argument('-p', '--n_players', default=3, type=int, help='2 to 5')
+parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+    help='rainbow, purple, or vanilla')
+parser.add_argument('-m', '--moves', default=6, type=int,
+    help='turns to play before the check')
+parser.add_argument('-s', '--seed', default=0, type=int, help='first seed')
+args = parser.parse_args()
+
+logger = logging.getLogger('game_log')
+logger.addHandler(logging.NullHandler())
+
+failed = checked = differ = 0
+for i in range(args.n_rounds):
+    random.seed('{}-{}'.format(args.seed, i))
+    players = [HeuristicsPlayer(j, logger, 'silent')
+               for j in range(args.n_players)]
+    names = ['Heuristic' + str(j + 1) for j in range(args.n_players)]
+    r = Round(args.game_type, players, names, 'silent', False, {})
+    r.generate_deck_and_deal_hands()
+    for turn in range(args.moves):
+        r.get_play(players[r.whoseTurn])
+
+    last = None
+    for action in list(r.legal_actions()):
+        token = r.apply(action)
+        player = r.whoseTurn
+        cached = HeuristicsBelief.get(player, r).probabilities
+        fresh = HeuristicsBelief(player, r).probabilities
+        checked += 1
+        if cached.shape != fresh.shape or (abs(cached - fresh) > 1e-12).any():
+            print('round {}, {}: cached belief of player {} is stale'.format(
+                  i, action, player))
+            failed += 1
+        if last is not None and (last.shape != fresh.shape or
+                                 (abs(last - fresh) > 1e-12).any()):
+            differ += 1
+        last = fresh
+        r.undo(token)
+
+print('{} beliefs checked, {} differ from the one before'.format(
+      checked, differ))
+if failed or not differ:
+    print('{} stale beliefs'.format(failed))
+    sys.exit(1)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+""" Check the calibration tracking of the heuristic player.
+
+./test/heuristic_tracking.py
+record known probabilities and outcomes in HeuristicsTrackings, and check the
+bins they fall in (including the edges 0 and 1), merging, and the Brier score
+against values computed by hand
+
+./test/heuristic_tracking.py -b 10
+the same with other settings
+
+"""
+
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import AIPlayer
+from players import *
+
+HeuristicsPlayer, = [c for c in AIPlayer.__subclasses__() if c.get_name() == 'heuristic']
+heuristics_player = sys.modules[HeuristicsPlayer.__module__]
+HeuristicsTracking = heuristics_player.HeuristicsTracking
+
+parser = argparse.ArgumentParser(description='check heuristic calibration tracking')
+parser.add_argument('-b', '--n_bins', default=20, type=int, help='at least 4')
+args = parser.parse_args()
+
+# With red at 1, a 2r is playable and a 3r is not
+progress = {'r': 1, 'y': 0, 'g': 0, 'b': 0, 'w': 0}
+playable = {'name': '2r'}
+unplayable = {'name': '3r'}
+n = args.n_bins
+lowEdge = 1. / n # The lowest probability of the second bin
+failures = []
+
+def check(what, value, expected):
+    if abs(value - expected) > 1e-9:
+        failures.append('{}: {}, expected {}'.format(what, value, expected))
+
+first = HeuristicsTracking(True, n)
+first.record_playable(playable, 0., progress)
+first.record_playable(unplayable, lowEdge, progress)
+first.record_playable(playable, 1., progress)
+second = HeuristicsTracking(True, n)
+second.record_playable(unplayable, 1., progress)
+second.record_playable(playable, 0.5, progress)
+
+check('first bin', first.count[0], 1)
+check('second bin', first.count[1], 1)
+check('last bin', first.count[n - 1], 1) # 1 is in the last bin
+check('decisions', sum(first.count), 3)
+check('Brier score', first.brier_score(), (1 + lowEdge ** 2) / 3.)
+
+merged = HeuristicsTracking(True, n).merge(first).merge(second)
+check('merged decisions', sum(merged.count), 5)
+check('merged last bin', merged.count[n - 1], 2)
+check('merged playable in last bin', merged.playable[n - 1], 1)
+check('merged predicted in last bin', merged.predicted[n - 1], 2.)
+check('merged middle bin', merged.count[n // 2], 1)
+check('merged Brier score', merged.brier_score(),
+      (1 + lowEdge ** 2 + 0 + 1 + 0.25) / 5.)
+
+off = HeuristicsTracking(False, n)
+off.record_playable(playable, 0.5, progress)
+check('decisions when off', sum(off.count), 0)
+if off.brier_score() is not None:
+    failures.append('Brier score without decisions: {}'.format(
+                    off.brier_score()))
+
+for failure in failures:
+    print(failure)
+if failures:
+    sys.exit(1)
+print('binning, merging and Brier score are right')
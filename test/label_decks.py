@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+""" Label decks with the maximum score reachable when every card is visible.
+
+./test/label_decks.py
+play 200 rounds with cheaters (4 players, rainbow) and solve the deck of every
+round with solver.max_score, to count how many losses the deck forced
+
+./test/label_decks.py -n 100000 -a hat -j 8 -c scores.jsonl -o labels.jsonl
+label 100000 decks on 8 processes, with hat players, keeping the maximum
+scores in scores.jsonl (decks already in there are not solved again) and
+writing one JSON line per deck to labels.jsonl
+
+Deck i only depends on the seed and i, so runs with the same seed label the
+same decks for any number of processes.
+"""
+
+import argparse, json, logging, multiprocessing, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import Round, AIPlayer
+from play_hanabi import play_until_end, final_score
+import players
+import solver
+
+parser = argparse.ArgumentParser(description='label decks with maximum scores')
+parser.add_argument('-n', '--n_decks', default=200, type=int, help='positive int')
+parser.add_argument('-p', '--n_players', default=4, type=int, help='2 to 5')
+parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+    help='rainbow, purple, or vanilla')
+parser.add_argument('-a', '--ai', default='cheater', type=str,
+    help='AI that plays every deck (its score is compared to the maximum)')
+parser.add_argument('-m', '--max_nodes', default=100000, type=int,
+    help='states the solver may visit per deck (unsolved decks are unknown)')
+parser.add_argument('-j', '--processes', default=1, type=int,
+    help='size of the process pool')
+parser.add_argument('-c', '--cache', default=None, type=str,
+    help='file in which maximum scores are kept between runs')
+parser.add_argument('-o', '--output', default=None, type=str,
+    help='file to write one JSON line per deck to')
+parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+args = parser.parse_args()
+
+logger = logging.getLogger('game_log')
+logger.addHandler(logging.NullHandler())
+
+ai, = [c for c in AIPlayer.__subclasses__() if c.get_name() == args.ai]
+known = {}
+
+def label(i):
+    """Play deck i with the AI and solve it"""
+    random.seed('{}-{}'.format(args.seed, i))
+    seats = [ai(j, logger, 'silent') for j in range(args.n_players)]
+    names = [args.ai.capitalize() + str(j + 1) for j in range(args.n_players)]
+    r = Round(args.game_type, seats, names, 'silent', False, {})
+    r.generate_deck_and_deal_hands()
+    play_until_end(r, seats)
+    score = final_score(r, 'full')
+    best = known.get(solver.deck_hash(r.startingDeck, args.n_players))
+    if best is None:
+        best = solver.max_score(r.startingDeck, args.n_players, r.suits,
+                                args.max_nodes, lower=score)
+    return i, r.startingDeck, r.suits, score, best
+
+def init(scores):
+    known.update(scores)
+
+cache = solver.ScoreCache(args.cache) if args.cache else None
+scores = cache.scores if cache else {}
+start = time.time()
+if args.processes > 1:
+    pool = multiprocessing.Pool(args.processes, init, (scores,))
+    results = pool.imap(label, range(args.n_decks), chunksize=10)
+else:
+    init(scores)
+    results = (label(i) for i in range(args.n_decks))
+
+output = open(args.output, 'w') if args.output else None
+counts = {'perfect': 0, 'forced': 0, 'mistake': 0, 'unknown': 0}
+for i, deck, suits, score, best in results:
+    if best is None:
+        counts['unknown'] += 1
+    elif best == 5 * len(suits) and score == best:
+        counts['perfect'] += 1
+    elif score == best:
+        counts['forced'] += 1
+    else:
+        counts['mistake'] += 1
+    if cache is not None and best is not None:
+        cache.put(deck, args.n_players, best)
+    if output is not None:
+        output.write(json.dumps({'deck': ' '.join(deck), 'score': score,
+                                 'max': best}) + '\n')
+elapsed = time.time() - start
+if args.processes > 1:
+    pool.close()
+    pool.join()
+if output is not None:
+    output.close()
+
+print('{} decks in {:.1f} s ({:.1f} decks/sec)'.format(
+    args.n_decks, elapsed, args.n_decks / elapsed))
+print('{} won: {perfect}, lost to the deck: {forced}, lost by mistake: '
+      '{mistake}, unknown: {unknown}'.format(args.ai, **counts))
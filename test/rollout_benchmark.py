@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+""" Measure how many rollouts per second rollout.run_rollouts plays.
+
+./test/rollout_benchmark.py
+play a few turns of a game with cheaters, then play rollouts from the point
+of view of the next player with a cheater policy, in one process, in a new
+process pool and in a pool that is kept between calls (checking that the
+scores are the same)
+
+./test/rollout_benchmark.py -n 2000 -p 5 -j 8 -t vanilla
+the same for more rollouts, with other settings
+
+"""
+
+import argparse, copy, logging, multiprocessing, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hanabi_classes import Round, AIPlayer
+from rollout import run_rollouts
+import players
+
+CheatingPlayer, = [c for c in AIPlayer.__subclasses__() if c.get_name() == 'cheater']
+
+parser = argparse.ArgumentParser(description='measure rollouts per second')
+parser.add_argument('-n', '--n_rollouts', default=500, type=int, help='positive int')
+parser.add_argument('-p', '--n_players', default=4, type=int, help='2 to 5')
+parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+    help='rainbow, purple, or vanilla')
+parser.add_argument('-j', '--processes', default=4, type=int,
+    help='size of the process pool')
+parser.add_argument('-m', '--moves', default=10, type=int,
+    help='turns to play before the rollouts')
+parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+args = parser.parse_args()
+
+logger = logging.getLogger('game_log')
+logger.addHandler(logging.NullHandler())
+
+random.seed(args.seed)
+seats = [CheatingPlayer(i, logger, 'silent') for i in range(args.n_players)]
+names = ['Cheater' + str(i + 1) for i in range(args.n_players)]
+r = Round(args.game_type, seats, names, 'silent', False, {})
+r.generate_deck_and_deal_hands()
+for i in range(args.moves):
+    r.get_play(seats[r.whoseTurn])
+
+start = time.time()
+for i in range(20):
+    copy.deepcopy(r)
+print('deepcopy of the round: {:.2f} ms'.format(
+    (time.time() - start) / 20 * 1000))
+
+results = []
+for processes in sorted(set([1, args.processes])):
+    start = time.time()
+    scores = run_rollouts(r, r.whoseTurn, CheatingPlayer, args.n_rollouts,
+                          processes=processes, seed=args.seed)
+    elapsed = time.time() - start
+    results.append(scores)
+    print('{} process(es): {:.0f} rollouts/sec, mean score {:.2f}'.format(
+        processes, len(scores) / elapsed, sum(scores) / float(len(scores))))
+
+pool = multiprocessing.Pool(args.processes)
+try:
+    for i in range(2):
+        start = time.time()
+        scores = run_rollouts(r, r.whoseTurn, CheatingPlayer, args.n_rollouts,
+                              seed=args.seed, pool=pool)
+        elapsed = time.time() - start
+        results.append(scores)
+    print('{} process(es), kept pool: {:.0f} rollouts/sec'.format(
+        args.processes, len(scores) / elapsed))
+finally:
+    pool.close()
+    pool.join()
+
+if any(scores != results[0] for scores in results):
+    print('the scores depend on the pool')
+    sys.exit(1)
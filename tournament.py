@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""Tournament of AIs over a matrix of lineups, numbers of players and game
+types, to fill in tables like the ones in the docstrings of hat_player and
+cheating_player.
+
+Every cell of the matrix (lineup x number of players x game type) is played
+in batches of rounds on one shared process pool.  A free process always gets
+the next batch, and the next batch goes to the unfinished cell whose win rate
+is known least precisely (the widest confidence interval), so cells with a
+win rate near 0% or 100% stop early and the others get the rounds.  A cell is
+finished when its confidence interval is narrow enough, or when it played
+n_max rounds.  Round i of every cell is played with seed '{seed}-{i}' (like
+hanabi_wrapper.py -s seed -c cache), so the lineups of a column play the
+same decks.
+
+Usage:
+    ./tournament.py lineup [lineup ...] [-p n_players ...] [-t game_type ...]
+                    [-l loss_score] [-n n_max] [-w width] [-b batch]
+                    [-j processes] [-s seed]
+  lineup: one AI, which plays every seat (e.g. hat), or one AI per seat
+    separated by commas (e.g. cheater,newest,newest), which is only played
+    with that number of players
+  The table of win rates is printed in markdown when all cells are finished.
+"""
+
+import logging, multiprocessing, random, sys, time
+from math import sqrt
+from hanabi_classes import SUIT_CONTENTS, AIPlayer
+from play_hanabi import play_one_round
+from counters import Counters
+import players
+import heuristics_player
+
+try:
+    import queue
+except ImportError: # Python 2
+    import Queue as queue
+
+# Column headers of the game types (as in the docstrings of the players)
+GAME_TYPE_NAMES = {'vanilla': 'no variant', 'purple': 'purple',
+                   'rainbow': 'rainbow'}
+
+# z of the two sided 95% confidence interval
+Z_95 = 1.96
+
+def make_cells(lineups, playerCounts, gameTypes):
+    """The cells of the matrix, as (lineup, game type) pairs, with lineup a
+    list of AI names (one per seat).  Lineups of more than one AI are only
+    played with their own number of players."""
+    cells = []
+    for lineup in lineups:
+        for n in playerCounts:
+            if len(lineup) == 1:
+                seats = lineup * n
+            elif len(lineup) == n:
+                seats = lineup
+            else:
+                continue
+            for gameType in gameTypes:
+                cells.append((seats, gameType))
+    return cells
+
+def half_width(wins, n, z=Z_95):
+    """Half the width of the confidence interval of a win rate after n rounds
+    (Wilson score interval, which stays wide with 0 or n wins)"""
+    if n == 0:
+        return 1.
+    p = wins / float(n)
+    return z * sqrt(p * (1 - p) / n + z * z / (4. * n * n)) / (1 + z * z / n)
+
+def play_batch(task):
+    """Play rounds start to start + count - 1 of a cell and return the cell,
+    the number of rounds of the batch, their scores, counters and the
+    tracking of the heuristic players (see heuristics_player.merge_trackings),
+    and None (for the error, see failed_batch)"""
+    cell, (seats, gameType), lossScore, start, count, seed = task
+    logger = logging.getLogger('game_log')
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    classes = dict((c.get_name(), c) for c in AIPlayer.__subclasses__())
+    names = [name.capitalize() + str(i + 1) for i, name in enumerate(seats)]
+    scores = []
+    counters = Counters()
+    tracking = heuristics_player.HeuristicsTracking(heuristics_player.TRACKING)
+    for i in range(start, start + count):
+        random.seed('{}-{}'.format(seed, i))
+        seatPlayers = [classes[name](j, logger, 'silent')
+                       for j, name in enumerate(seats)]
+        scores.append(play_one_round(gameType, seatPlayers, names, 'silent',
+                                     lossScore, False, False, {},
+                                     counters=counters))
+        heuristics_player.merge_trackings(seatPlayers, tracking)
+    return cell, count, scores, counters, tracking, None
+
+def failed_batch(task, error):
+    """What play_batch returns for task if it raised error (e.g. because the
+    AIs can't play the cell)"""
+    cell, count = task[0], task[4]
+    return cell, count, None, None, None, '{}: {}'.format(
+        type(error).__name__, error)
+
+def play_batch_safely(task):
+    """play_batch, returning the error instead of raising it, so that a
+    batch that fails still reaches the callback of Pool.apply_async (Python 2
+    has no error_callback)"""
+    try:
+        return play_batch(task)
+    except Exception as e:
+        return failed_batch(task, e)
+
+def run(cells, lossScore='zero', nMax=10000, width=0.01, batch=100,
+        processes=1, seed=0, progress=None):
+    """Play the cells until every one is finished (see the module docstring)
+    and return a dict per cell with its 'scores' (list of int), 'counters'
+    (the Counters of all its batches, merged), 'tracking' (the
+    HeuristicsTracking of its heuristic players, merged) and 'error' (None,
+    or why the AIs couldn't play it).
+
+    width (float): Half width of the 95% confidence interval of the win rate
+      at which a cell is finished.
+    progress (function): Called with the results after every batch."""
+    maxScores = [int(SUIT_CONTENTS[-1]) * (5 if gameType == 'vanilla' else 6)
+                 for seats, gameType in cells]
+    results = [{'scores': [], 'wins': 0, 'pending': 0, 'error': None,
+                'counters': Counters(),
+                'tracking': heuristics_player.HeuristicsTracking(
+                    heuristics_player.TRACKING)} for cell in cells]
+
+    def next_task():
+        """The next batch, for the widest unfinished cell (None if every
+        cell is finished or waiting for its batches)"""
+        best = None
+        for cell, result in enumerate(results):
+            played = len(result['scores'])
+            n = played + result['pending']
+            if result['error'] or n >= nMax:
+                continue
+            if played and half_width(result['wins'], played) <= width:
+                continue
+            # Cells that were never dealt a batch come first.  Rounds that
+            # are still being played count as played, with the win rate so
+            # far.
+            wins = result['wins'] * n / float(played) if played else 0
+            key = (n == 0, half_width(wins, n))
+            if best is None or key > best[0]:
+                best = (key, cell)
+        if best is None:
+            return None
+        cell = best[1]
+        result = results[cell]
+        start = len(result['scores']) + result['pending']
+        count = min(batch, nMax - start)
+        result['pending'] += count
+        return (cell, cells[cell], lossScore, start, count, seed)
+
+    def finish(cell, count, scores, counters, tracking, error):
+        """Count a batch of count rounds of cell as done.  The first error
+        marks the cell as failed; its batches that are still being played
+        are counted down but not added."""
+        result = results[cell]
+        result['pending'] -= count
+        if error and not result['error']:
+            result['error'] = error
+        if result['error']:
+            return
+        result['scores'].extend(scores)
+        result['counters'].merge(counters)
+        result['tracking'].merge(tracking)
+        result['wins'] += sum(score == maxScores[cell] for score in scores)
+        if progress:
+            progress(results)
+
+    if processes <= 1:
+        task = next_task()
+        while task is not None:
+            finish(*play_batch_safely(task))
+            task = next_task()
+        return results
+
+    # Keep every process busy with one batch and one more waiting, and
+    # choose the next batch only when a batch is done, so it is chosen with
+    # the latest results.  Batches of a cell may finish in any order.  A
+    # batch that fails in the pool (e.g. its results can't be pickled) is
+    # passed on by error_callback, so done.get() always returns.
+    pool = multiprocessing.Pool(processes)
+    done = queue.Queue()
+    inFlight = 0
+    try:
+        while True:
+            while inFlight < 2 * processes:
+                task = next_task()
+                if task is None:
+                    break
+                options = {'callback': done.put}
+                if sys.version_info[0] >= 3:
+                    options['error_callback'] = \
+                        lambda error, task=task: done.put(
+                            failed_batch(task, error))
+                pool.apply_async(play_batch_safely, (task,), **options)
+                inFlight += 1
+            if not inFlight:
+                break
+            finish(*done.get())
+            inFlight -= 1
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def markdown_table(cells, results, lossScore='zero'):
+    """Tables of the win rates of the cells (one per lineup), in the format
+    of the docstrings of the players, followed by the details of every
+    cell"""
+    lines = []
+    lineups = []
+    gameTypes = []
+    for seats, gameType in cells:
+        lineup = seats[0] if len(set(seats)) == 1 else ','.join(seats)
+        if lineup not in lineups:
+            lineups.append(lineup)
+        if gameType not in gameTypes:
+            gameTypes.append(gameType)
+    headers = ['% ({})'.format(GAME_TYPE_NAMES[t]) for t in gameTypes]
+    widths = [len(header) + 2 for header in headers]
+    for lineup in lineups:
+        table = {}
+        for (seats, gameType), result in zip(cells, results):
+            name = seats[0] if len(set(seats)) == 1 else ','.join(seats)
+            if name != lineup:
+                continue
+            scores = result['scores']
+            if result['error'] or not scores:
+                value = '-'
+            else:
+                value = '{:.1f}'.format(100. * result['wins'] / len(scores))
+            table.setdefault(len(seats), {})[gameType] = value
+        if len(lineups) > 1:
+            lines.append('')
+            lines.append(lineup)
+        lines.append('Players |' + '|'.join(
+            header.center(w) for header, w in zip(headers, widths)))
+        lines.append('--------+' + '+'.join('-' * w for w in widths))
+        for n in sorted(table):
+            lines.append('{:^8}|'.format(n) + '|'.join(
+                table[n].get(t, '').center(w)
+                for t, w in zip(gameTypes, widths)))
+
+    lines.append('')
+    for (seats, gameType), result in zip(cells, results):
+        scores = result['scores']
+        label = '{} ({} players, {})'.format(','.join(seats), len(seats),
+                                             gameType)
+        if result['error']:
+            lines.append('{}: {}'.format(label, result['error']))
+        elif scores:
+            lines.append('{}: {} rounds, {:.2f}% +/- {:.2f}pp won (95%), '
+                         'average score ({} loss score) {:.2f}'.format(
+                         label, len(scores),
+                         100. * result['wins'] / len(scores),
+                         100 * half_width(result['wins'], len(scores)),
+                         lossScore, sum(scores) / float(len(scores))))
+            info = result['counters'].summary()
+            if info:
+                lines.append('  debug info: {}'.format(info))
+            tracking = result['tracking']
+            if tracking.on and sum(tracking.count):
+                lines.extend('  ' + line
+                             for line in tracking.reliability_table())
+                lines.append('  Brier score: {:.4f} over {} decisions'.format(
+                             tracking.brier_score(), sum(tracking.count)))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    available = [c.get_name() for c in AIPlayer.__subclasses__()]
+    parser = argparse.ArgumentParser(description='Play a tournament of AIs.')
+    parser.add_argument('lineups', metavar='lineup', type=str, nargs='+',
+        help='AI, or one AI per seat separated by commas: ' +
+             ', '.join(available))
+    parser.add_argument('-p', '--n_players', default=[2, 3, 4, 5], type=int,
+        nargs='+', help='numbers of players [default: 2 3 4 5]')
+    parser.add_argument('-t', '--game_types', default=['vanilla', 'purple',
+        'rainbow'], type=str, nargs='+', help='rainbow, purple, or vanilla')
+    parser.add_argument('-l', '--loss_score', default='zero', type=str,
+        help='zero or full')
+    parser.add_argument('-n', '--n_max', default=10000, type=int,
+        help='most rounds to play per cell')
+    parser.add_argument('-w', '--width', default=1., type=float,
+        help='half width (pp) of the 95%% confidence interval of the win rate '
+             'at which a cell is finished')
+    parser.add_argument('-b', '--batch', default=100, type=int,
+        help='rounds per batch')
+    parser.add_argument('-j', '--processes', default=1, type=int,
+        help='size of the process pool')
+    parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+    args = parser.parse_args()
+
+    lineups = [lineup.split(',') for lineup in args.lineups]
+    assert all(name in available for lineup in lineups for name in lineup)
+    assert all(t in GAME_TYPE_NAMES for t in args.game_types)
+    assert args.loss_score in ('zero', 'full')
+    assert args.n_max > 0 and args.batch > 0 and args.width > 0
+
+    cells = make_cells(lineups, args.n_players, args.game_types)
+    assert cells, 'no lineup can be played with these numbers of players'
+
+    def progress(results):
+        sys.stderr.write('\r{} rounds played'.format(
+            sum(len(result['scores']) for result in results)))
+
+    start = time.time()
+    results = run(cells, args.loss_score, args.n_max, args.width / 100.,
+                  args.batch, args.processes, args.seed, progress)
+    sys.stderr.write('\r{} rounds in {:.1f} s\n'.format(
+        sum(len(result['scores']) for result in results), time.time() - start))
+    print(markdown_table(cells, results, args.loss_score))
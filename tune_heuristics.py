@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+"""Search for better Weights of the heuristic player (players/
+heuristics_player.py).
+
+The weights the player reads (TUNED) are a vector of parameters.  Candidate
+vectors are drawn around the current Weights (which are always candidate 0),
+and compared by successive halving: every candidate still in the race plays
+the same rounds (round i with seed '{seed}-{i}', so the comparisons are
+paired), the best 1/eta of them go on, and the survivors play eta times as
+many rounds, until one is left or they played max_rounds.  The rounds of
+every rung are spread over a process pool.
+
+The best candidate won the race on its rounds, so its scores there are
+biased upwards (the winner's curse).  The best candidate and the current
+Weights therefore play holdout rounds (round i with seed
+'{seed}-holdout-{i}'), and those are what the JSON file the best candidate
+is written to reports.  The file can be loaded with hanabi_wrapper.py -w
+(see heuristics_player.load_weights).
+
+Usage:
+    ./tune_heuristics.py [lineup] [-t game_type] [-l loss_score]
+                         [-c n_candidates] [-r rounds] [-e eta]
+                         [-m max_rounds] [-x spread] [-j processes]
+                         [-s seed] [-o output] [--holdout rounds]
+  lineup: one AI per seat, separated by commas (the heuristic seats play
+    with the candidate weights) [default: heuristic,newest,newest; the
+    heuristic player never hints, so with only heuristic players no hints
+    are given and most weights don't matter]
+"""
+
+import copy, json, logging, math, multiprocessing, random, sys, time
+from hanabi_classes import AIPlayer
+from play_hanabi import play_one_round
+import players
+import heuristics_player
+
+# Weights read by the heuristic player (directHintWeight and
+# indirectHintWeight are not used by it, so tuning them would only add noise)
+TUNED = ['directHintOrderWeight', 'directHintInHintOrderWeight',
+         'playThreshold']
+
+# Range of every weight (the probabilities are raised to 1 / weight) and of
+# the play threshold
+WEIGHT_RANGE = (0.1, 10.)
+THRESHOLD_RANGE = (0.3, 0.99)
+
+def to_vector(weights):
+    """The TUNED entries of weights (a dict like Weights) as a list"""
+    vector = []
+    for key in TUNED:
+        value = weights[key]
+        vector.extend(value if isinstance(value, list) else [value])
+    return vector
+
+def from_vector(vector, base):
+    """A copy of the dict base with the TUNED entries taken from vector (as
+    made by to_vector)"""
+    weights = copy.deepcopy(base)
+    i = 0
+    for key in TUNED:
+        if isinstance(base[key], list):
+            weights[key] = list(vector[i:i + len(base[key])])
+            i += len(base[key])
+        else:
+            weights[key] = vector[i]
+            i += 1
+    return weights
+
+def perturb(weights, spread, rng):
+    """Candidate weights around weights: every weight is multiplied by
+    exp(N(0, spread)), and N(0, spread / 5) is added to the play threshold"""
+    vector = to_vector(weights)
+    thresholdIndex = len(vector) - 1 # playThreshold is the last of TUNED
+    for i, value in enumerate(vector):
+        if i == thresholdIndex:
+            value = min(max(value + rng.gauss(0, spread / 5.),
+                            THRESHOLD_RANGE[0]), THRESHOLD_RANGE[1])
+        else:
+            value = min(max(value * math.exp(rng.gauss(0, spread)),
+                            WEIGHT_RANGE[0]), WEIGHT_RANGE[1])
+        vector[i] = round(value, 3)
+    return from_vector(vector, weights)
+
+def play_batch(task):
+    """Play rounds start to start + count - 1 with the heuristic seats of
+    lineup using weights, and return their scores and the tracking of the
+    heuristic seats (see heuristics_player.merge_trackings)"""
+    candidate, weights, lineup, gameType, lossScore, start, count, seed = task
+    logger = logging.getLogger('game_log')
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    classes = dict((c.get_name(), c) for c in AIPlayer.__subclasses__())
+    names = [name.capitalize() + str(i + 1) for i, name in enumerate(lineup)]
+    saved = copy.deepcopy(heuristics_player.Weights)
+    heuristics_player.Weights.update(weights)
+    scores = []
+    tracking = heuristics_player.HeuristicsTracking(heuristics_player.TRACKING)
+    try:
+        for i in range(start, start + count):
+            random.seed('{}-{}'.format(seed, i))
+            seats = [classes[name](j, logger, 'silent')
+                     for j, name in enumerate(lineup)]
+            scores.append(play_one_round(gameType, seats, names, 'silent',
+                                         lossScore, False, False, {}))
+            heuristics_player.merge_trackings(seats, tracking)
+    finally:
+        heuristics_player.Weights.clear()
+        heuristics_player.Weights.update(saved)
+    return candidate, start, scores, tracking
+
+def mean(values):
+    return sum(values) / float(len(values))
+
+def play_rounds(candidates, indices, rounds, scores, lineup, gameType,
+                lossScore, batch=50, pool=None, seed=0, trackings=None):
+    """Let every candidate in indices play the rounds it is missing of the
+    first rounds, and add their scores to scores (one list per candidate)
+    and the trackings of its heuristic seats to trackings (one
+    HeuristicsTracking per candidate, if given)"""
+    tasks = []
+    for c in indices:
+        for start in range(len(scores[c]), rounds, batch):
+            tasks.append((c, candidates[c], lineup, gameType, lossScore,
+                          start, min(batch, rounds - start), seed))
+    if pool:
+        results = pool.imap_unordered(play_batch, tasks)
+    else:
+        results = (play_batch(task) for task in tasks)
+    batches = {}
+    for c, start, batchScores, tracking in results:
+        batches[c, start] = batchScores
+        if trackings is not None:
+            trackings[c].merge(tracking)
+    for c, start in sorted(batches):
+        scores[c].extend(batches[c, start])
+
+def successive_halving(candidates, lineup, gameType, lossScore, rounds, eta,
+                       maxRounds, batch=50, pool=None, seed=0, log=None,
+                       trackings=None):
+    """Race candidates (list of weights) by successive halving (see the
+    module docstring) on pool (a multiprocessing.Pool, or None to play in
+    this process).  Returns the index of the best one and the scores of
+    every candidate (the first rounds of the rungs it was in).  The
+    trackings of the rounds are merged into trackings (see play_rounds)."""
+    scores = [[] for candidate in candidates]
+    alive = list(range(len(candidates)))
+    while True:
+        play_rounds(candidates, alive, rounds, scores, lineup, gameType,
+                    lossScore, batch, pool, seed, trackings)
+        # Best first; ties keep the lower index (the current Weights)
+        alive.sort(key=lambda c: -mean(scores[c]))
+        if log:
+            log('{} rounds: {}'.format(rounds, ', '.join(
+                '#{} {:.3f}'.format(c, mean(scores[c])) for c in alive)))
+        if len(alive) == 1 or rounds >= maxRounds:
+            return alive[0], scores
+        alive = alive[:max(1, len(alive) // eta)]
+        rounds = min(rounds * eta, maxRounds)
+
+def paired_difference(scores, other):
+    """Mean difference of two lists of scores over the rounds both played,
+    and its standard error"""
+    n = min(len(scores), len(other))
+    diffs = [scores[i] - other[i] for i in range(n)]
+    m = mean(diffs)
+    if n < 2:
+        return m, float('nan')
+    var = sum((d - m) ** 2 for d in diffs) / (n - 1)
+    return m, math.sqrt(var / n)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    available = [c.get_name() for c in AIPlayer.__subclasses__()]
+    parser = argparse.ArgumentParser(
+        description='Tune the Weights of the heuristic player.')
+    parser.add_argument('lineup', nargs='?', default='heuristic,newest,newest',
+        type=str, help='one AI per seat, separated by commas: ' +
+                       ', '.join(available))
+    parser.add_argument('-t', '--game_type', default='rainbow', type=str,
+        help='rainbow, purple, or vanilla')
+    parser.add_argument('-l', '--loss_score', default='zero', type=str,
+        help='zero or full')
+    parser.add_argument('-c', '--n_candidates', default=27, type=int,
+        help='candidates, including the current Weights')
+    parser.add_argument('-r', '--rounds', default=100, type=int,
+        help='rounds every candidate plays in the first rung')
+    parser.add_argument('-e', '--eta', default=3, type=int,
+        help='1/eta of the candidates go on to the next rung')
+    parser.add_argument('-m', '--max_rounds', default=10000, type=int,
+        help='most rounds a candidate plays')
+    parser.add_argument('-x', '--spread', default=0.5, type=float,
+        help='standard deviation of the log of the weights of candidates')
+    parser.add_argument('-j', '--processes', default=1, type=int,
+        help='size of the process pool')
+    parser.add_argument('-s', '--seed', default=0, type=int, help='seed')
+    parser.add_argument('-o', '--output', default='weights.json', type=str,
+        help='file to write the best weights to')
+    parser.add_argument('--holdout', default=1000, type=int,
+        help='rounds on other seeds to compare the best and the current '
+             'Weights on')
+    args = parser.parse_args()
+
+    lineup = args.lineup.split(',')
+    assert all(name in available for name in lineup)
+    assert 'heuristic' in lineup
+    assert args.game_type in ('rainbow', 'purple', 'vanilla')
+    assert args.loss_score in ('zero', 'full')
+    assert args.n_candidates > 0 and args.rounds > 0 and args.eta > 1
+    assert args.holdout > 1
+
+    rng = random.Random(args.seed)
+    current = copy.deepcopy(heuristics_player.Weights)
+    candidates = [current] + [perturb(current, args.spread, rng)
+                              for i in range(args.n_candidates - 1)]
+
+    def log(line):
+        sys.stderr.write(line + '\n')
+
+    trackings = [heuristics_player.HeuristicsTracking(
+                     heuristics_player.TRACKING) for candidate in candidates]
+    start = time.time()
+    pool = multiprocessing.Pool(args.processes) if args.processes > 1 \
+           else None
+    try:
+        best, scores = successive_halving(
+            candidates, lineup, args.game_type, args.loss_score, args.rounds,
+            args.eta, args.max_rounds, pool=pool, seed=args.seed, log=log,
+            trackings=trackings)
+        # Compare with the current Weights on all rounds of the best
+        play_rounds(candidates, [0], len(scores[best]), scores, lineup,
+                    args.game_type, args.loss_score, pool=pool,
+                    seed=args.seed, trackings=trackings)
+        # and on fresh rounds
+        holdout = [[] for candidate in candidates]
+        play_rounds(candidates, sorted(set([0, best])), args.holdout,
+                    holdout, lineup, args.game_type, args.loss_score,
+                    pool=pool, seed='{}-holdout'.format(args.seed))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.time() - start
+    raceDifference, raceStdErr = paired_difference(scores[best], scores[0])
+    difference, stdErr = paired_difference(holdout[best], holdout[0])
+
+    result = {'weights': candidates[best],
+              'mean_score': mean(holdout[best]),
+              'current_mean_score': mean(holdout[0]),
+              'rounds': args.holdout,
+              'vs_current': difference, 'vs_current_std_err': stdErr,
+              'race_mean_score': mean(scores[best]),
+              'race_rounds': len(scores[best]),
+              'race_vs_current': raceDifference,
+              'race_vs_current_std_err': raceStdErr,
+              'lineup': lineup, 'game_type': args.game_type,
+              'loss_score': args.loss_score, 'seed': args.seed}
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+    print('{} rounds in {:.1f} s'.format(
+          sum(map(len, scores)) + sum(map(len, holdout)), elapsed))
+    print('best: candidate #{}, average score {:.3f} over {} race rounds, '
+          '{:+.3f} +/- {:.3f} (1 std. err.) against the current Weights on '
+          'the same rounds'.format(best, mean(scores[best]),
+                                   len(scores[best]), raceDifference,
+                                   raceStdErr))
+    print('holdout: average score {:.3f} over {} rounds, {:+.3f} +/- {:.3f} '
+          '(1 std. err.) against the current Weights ({:.3f})'.format(
+          mean(holdout[best]), args.holdout, difference, stdErr,
+          mean(holdout[0])))
+    for key in TUNED:
+        print('  {}: {}'.format(key, candidates[best][key]))
+    if trackings[best].on and sum(trackings[best].count):
+        print('calibration of the best candidate:')
+        for line in trackings[best].reliability_table():
+            print('  ' + line)
+        print('  Brier score: {:.4f} over {} decisions'.format(
+              trackings[best].brier_score(), sum(trackings[best].count)))
+    print('written to ' + args.output)